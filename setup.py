@@ -48,6 +48,9 @@ setup(
         'django-user-agents',
         'geoip2'
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
     test_suite='tests',
     tests_require=[
         'factory-boy',
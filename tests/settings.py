@@ -75,3 +75,50 @@ TRACKING_ANALYZER_MAXMIND_URL = \
     "http://geolite.maxmind.com/download/geoip/database/"
 TRACKING_ANALYZER_MAXMIND_COUNTRIES = "GeoLite2-Country.mmdb.gz"
 TRACKING_ANALYZER_MAXMIND_CITIES = "GeoLite2-City.mmdb.gz"
+TRACKING_ANALYZER_GEOIP_MODE = 'auto'
+TRACKING_ANALYZER_GEOIP_RELOAD_INTERVAL = 60
+TRACKING_ANALYZER_GEOIP_CACHE_SIZE = 10000
+TRACKING_ANALYZER_GEOIP_CACHE_TTL = 60 * 60 * 24
+TRACKING_ANALYZER_GEOIP_CACHE_NEGATIVE_TTL = 60 * 5
+TRACKING_ANALYZER_GEOIP_CACHE_BACKEND = None
+TRACKING_ANALYZER_BUFFER_ENABLED = False
+TRACKING_ANALYZER_BUFFER_FLUSH_SIZE = 500
+TRACKING_ANALYZER_BUFFER_FLUSH_INTERVAL = 5
+TRACKING_ANALYZER_BUFFER_MAX_SIZE = 10000
+TRACKING_ANALYZER_BUFFER_OVERFLOW = 'block'
+TRACKING_ANALYZER_ASYNC_WORKERS = 4
+TRACKING_ANALYZER_WORKERS = 2
+TRACKING_ANALYZER_WORKERS_QUEUE_SIZE = 1000
+TRACKING_ANALYZER_WORKERS_OVERFLOW = 'drop'
+TRACKING_ANALYZER_WORKERS_SHUTDOWN_TIMEOUT = 10
+TRACKING_ANALYZER_DEFER_GEOLOCATION = False
+TRACKING_ANALYZER_USER_AGENT_CACHE_SIZE = 1000
+TRACKING_ANALYZER_SAMPLING_RATE = 1
+TRACKING_ANALYZER_SAMPLING_RATES_BY_CONTENT_TYPE = {}
+TRACKING_ANALYZER_SAMPLING_RATES_BY_DEVICE_TYPE = {}
+TRACKING_ANALYZER_SPOOL_ENABLED = False
+TRACKING_ANALYZER_SPOOL_DIR = None
+TRACKING_ANALYZER_SPOOL_ROTATE_INTERVAL = 60
+TRACKING_ANALYZER_DEDUP_WINDOW = 0
+TRACKING_ANALYZER_DEDUP_CACHE_SIZE = 10000
+TRACKING_ANALYZER_NORMALIZED_STORAGE = False
+TRACKING_ANALYZER_DIMENSIONS_CACHE_SIZE = 10000
+TRACKING_ANALYZER_COMPACT_IP_STORAGE = False
+TRACKING_ANALYZER_PARTITION_INTERVAL = None
+TRACKING_ANALYZER_PARTITIONS_AHEAD = 3
+TRACKING_ANALYZER_PARTITIONS_RETENTION = None
+TRACKING_ANALYZER_RETENTION_DAYS = None
+TRACKING_ANALYZER_RETENTION_DAYS_BY_CONTENT_TYPE = {}
+TRACKING_ANALYZER_ARCHIVE_DIR = None
+TRACKING_ANALYZER_ROLLUPS_ENABLED = False
+TRACKING_ANALYZER_ROLLUPS_LAG = 300
+TRACKING_ANALYZER_ROLLUPS_GAP_TIMEOUT = 24 * 60 * 60
+TRACKING_ANALYZER_MATERIALIZED_VIEWS = False
+TRACKING_ANALYZER_MATERIALIZED_VIEWS_MAX_AGE = 60 * 60
+TRACKING_ANALYZER_SKETCH_PRECISION = 12
+TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED = False
+TRACKING_ANALYZER_HEAVY_HITTERS_CAPACITY = 200
+TRACKING_ANALYZER_HEAVY_HITTERS_INTERVAL = 60
+TRACKING_ANALYZER_HEAVY_HITTERS_WINDOW = 60 * 60
+TRACKING_ANALYZER_ANALYTICS_CACHE_BACKEND = None
+TRACKING_ANALYZER_ANALYTICS_CACHE_TTL = 60
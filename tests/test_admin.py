@@ -1,8 +1,11 @@
 import json
 
+from django.contrib import admin
 from django.contrib.admin import AdminSite
+from django.db import connection
 from django.test import TestCase, RequestFactory
-from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+from django.urls import re_path, reverse, set_urlconf
 from django.utils import timezone
 
 from django_countries import countries
@@ -12,6 +15,12 @@ from tracking_analyzer.models import Tracker
 from .factories import TrackerFactory, UserFactory
 
 
+class BackofficeURLConf:
+    urlpatterns = [
+        re_path(r'^backoffice/', admin.site.urls),
+    ]
+
+
 # pylint: disable=too-many-instance-attributes
 class TrackerAdminTestCase(TestCase):
     def setUp(self):
@@ -32,6 +41,36 @@ class TrackerAdminTestCase(TestCase):
         self.request = RequestFactory().get('/')
         self.request.user = self.user
 
+    def test_details(self):
+        """
+        Test response of the ``TrackerAdmin.details`` method.
+        """
+        self.assertEqual(
+            self.tracker_admin.details(self.tracker_1),
+            '<a href="{0}">Details</a>'.format(reverse(
+                'admin:tracking_analyzer_tracker_change',
+                args=(self.tracker_1.pk,)))
+        )
+
+    def test_urls_urlconf(self):
+        """
+        The reversed URLs are cached per URLconf, as set by the
+        ``request.urlconf`` of a middleware.
+        """
+        self.assertEqual(self.tracker_admin.get_changelist_url(),
+                         '/admin/tracking_analyzer/tracker/')
+
+        set_urlconf(BackofficeURLConf)
+        self.addCleanup(set_urlconf, None)
+
+        self.assertEqual(self.tracker_admin.get_changelist_url(),
+                         '/backoffice/tracking_analyzer/tracker/')
+        self.assertEqual(
+            self.tracker_admin.get_change_url(self.tracker_1.pk),
+            '/backoffice/tracking_analyzer/tracker/{0}/change/'.format(
+                self.tracker_1.pk)
+        )
+
     def test_content_object_link(self):
         """
         Test response of the ``TrackerAdmin.content_object_link`` method.
@@ -290,6 +329,55 @@ class TrackerAdminTestCase(TestCase):
             data
         )
 
+    def test_changelist_view_sample_weight(self):
+        """
+        The analytics datasets count each tracker as many times as its sample
+        weight.
+        """
+        Tracker.objects.update(
+            device_type=Tracker.PC, timestamp=timezone.datetime(2016, 7, 26))
+        Tracker.objects.filter(pk=self.tracker_1.pk).update(sample_weight=10)
+
+        url = reverse('admin:tracking_analyzer_tracker_changelist')
+        request = RequestFactory().get(url)
+        request.user = self.user
+
+        response = self.tracker_admin.changelist_view(request)
+
+        self.assertEqual(
+            json.loads(response.context_data['devices_count']),
+            [{'count': 12, 'device_type': Tracker.PC}]
+        )
+        self.assertEqual(
+            json.loads(response.context_data['requests_count']),
+            [{'date': '2016-07-26T00:00', 'requests': 12}]
+        )
+        self.assertIn(
+            [countries.alpha3(self.tracker_1.ip_country), 10],
+            json.loads(response.context_data['countries_count'])
+        )
+
+    def test_changelist_view_num_queries(self):
+        """
+        The changelist runs as many queries whatever the number of trackers
+        in its page: the tracked objects, their content types and the users
+        are not fetched row by row.
+        """
+        TrackerFactory.create(content_object=UserFactory.create())
+        self.client.login(username=self.user.username, password='testing')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+
+        for _ in range(10):
+            TrackerFactory.create()
+            TrackerFactory.create(content_object=UserFactory.create())
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url)
+
+        self.assertContains(response, '/change/">Details</a>', count=24)
+
     def test_changelist_post_delete(self):
         """
         Tests that the 'changelist' POST action stills working.
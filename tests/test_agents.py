@@ -0,0 +1,84 @@
+import unittest.mock as mock
+
+from django.test import override_settings, SimpleTestCase
+
+from user_agents import parse
+
+from tracking_analyzer.agents import get_device_values, user_agent_cache
+from tracking_analyzer.models import Tracker
+
+
+CHROME = (
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_5) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/49.0.2623.112 Safari/537.36'
+)
+IPHONE = (
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 13_5 like Mac OS X) '
+    'AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.1.1 Mobile/15E148 '
+    'Safari/604.1'
+)
+
+
+class UserAgentCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        user_agent_cache.clear()
+        self.addCleanup(user_agent_cache.clear)
+
+    @mock.patch('tracking_analyzer.agents.parse', side_effect=parse)
+    def test_device_values_cached(self, parse_mock):
+        """
+        Each user agent string is parsed once, then served from the cache.
+        """
+        first = get_device_values(CHROME)
+        second = get_device_values(CHROME)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first['device_type'], Tracker.PC)
+        self.assertEqual(first['browser'], 'Chrome')
+        self.assertEqual(first['browser_version'], '49.0.2623')
+        self.assertEqual(first['system'], 'Mac OS X')
+        self.assertEqual(parse_mock.call_count, 1)
+
+        self.assertEqual(
+            get_device_values(IPHONE)['device_type'],
+            Tracker.MOBILE
+        )
+        self.assertEqual(parse_mock.call_count, 2)
+
+        stats = user_agent_cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['size'], 2)
+
+    def test_cached_values_copied(self):
+        """
+        Changing the returned values does not change the cached ones.
+        """
+        get_device_values(CHROME)['browser'] = 'Changed'
+
+        self.assertEqual(
+            get_device_values(CHROME)['browser'], 'Chrome')
+
+    @override_settings(TRACKING_ANALYZER_USER_AGENT_CACHE_SIZE=1)
+    @mock.patch('tracking_analyzer.agents.parse', side_effect=parse)
+    def test_lru_eviction(self, parse_mock):
+        """
+        When full, the least recently used user agent is evicted.
+        """
+        get_device_values(CHROME)
+        get_device_values(IPHONE)
+        get_device_values(CHROME)
+
+        self.assertEqual(parse_mock.call_count, 3)
+        self.assertEqual(user_agent_cache.stats()['evictions'], 2)
+
+    @override_settings(TRACKING_ANALYZER_USER_AGENT_CACHE_SIZE=0)
+    @mock.patch('tracking_analyzer.agents.parse', side_effect=parse)
+    def test_cache_disabled(self, parse_mock):
+        """
+        With no cache, every call parses the user agent.
+        """
+        get_device_values(CHROME)
+        get_device_values(CHROME)
+
+        self.assertEqual(parse_mock.call_count, 2)
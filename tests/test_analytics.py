@@ -0,0 +1,151 @@
+import json
+import unittest.mock as mock
+
+from django.contrib.admin import AdminSite
+from django.core.cache import caches
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import override_settings, RequestFactory, TestCase
+from django.urls import reverse
+
+from tracking_analyzer.admin import TrackerAdmin
+from tracking_analyzer.analytics import (
+    get_analytics_cache_key, invalidate_analytics)
+from tracking_analyzer.models import Tracker
+from .factories import TrackerFactory, UserFactory
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analytics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analytics',
+    },
+}
+
+
+@override_settings(CACHES=CACHES,
+                   TRACKING_ANALYZER_ANALYTICS_CACHE_BACKEND='analytics')
+class AnalyticsCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = caches['analytics']
+        self.cache.clear()
+
+        TrackerFactory.create(device_type=Tracker.PC, ip_country='ESP')
+        TrackerFactory.create(device_type=Tracker.MOBILE, ip_country='NLD')
+
+        self.tracker_admin = TrackerAdmin(Tracker, AdminSite())
+        self.url = reverse('admin:tracking_analyzer_tracker_changelist')
+        self.user = UserFactory.create(is_staff=True, is_superuser=True)
+
+    def get_response(self, **params):
+        request = RequestFactory().get(self.url, params)
+        request.user = self.user
+
+        return self.tracker_admin.changelist_view(request)
+
+    def test_cache_key(self):
+        """
+        The page, the ordering and the order of the parameters don't change
+        the cache key, but the filters do.
+        """
+        key = get_analytics_cache_key(
+            self.cache,
+            QueryDict('device_type__exact=pc&ip_country__exact=ES'))
+
+        self.assertEqual(key, get_analytics_cache_key(
+            self.cache,
+            QueryDict('ip_country__exact=ES&p=2&o=1&device_type__exact=pc')))
+        self.assertNotEqual(key, get_analytics_cache_key(
+            self.cache, QueryDict('device_type__exact=pc')))
+
+    def test_cached_analytics(self):
+        """
+        The analytics of a filter combination are computed once, and read
+        from the cache by the following requests.
+        """
+        response = self.get_response()
+
+        with mock.patch.object(
+                TrackerAdmin, 'get_analytics') as get_analytics_mock:
+            cached_response = self.get_response(o='1')
+
+        get_analytics_mock.assert_not_called()
+        self.assertEqual(cached_response.context_data['countries_count'],
+                         response.context_data['countries_count'])
+        self.assertEqual(cached_response.context_data['devices_count'],
+                         response.context_data['devices_count'])
+
+        with mock.patch.object(TrackerAdmin, 'get_analytics',
+                               return_value={}) as get_analytics_mock:
+            self.get_response(device_type__exact=Tracker.PC)
+
+        get_analytics_mock.assert_called_once()
+
+    def test_requests_count_not_cached(self):
+        """
+        The requests time line of the current page is not cached.
+        """
+        self.get_response()
+        TrackerFactory.create(device_type=Tracker.PC, ip_country='ESP')
+
+        requests_count = json.loads(
+            self.get_response().context_data['requests_count'])
+        self.assertEqual(
+            sum(item['requests'] for item in requests_count), 3)
+
+    def test_invalidate_analytics(self):
+        """
+        Invalidating the analytics starts a new generation of cache keys.
+        """
+        key = get_analytics_cache_key(self.cache, QueryDict())
+        invalidate_analytics()
+
+        self.assertNotEqual(
+            get_analytics_cache_key(self.cache, QueryDict()), key)
+
+    def test_invalidate_analytics_lost_generation(self):
+        """
+        The generation is started over if the cache lost it.
+        """
+        self.cache.clear()
+        invalidate_analytics()
+
+        self.assertIsNotNone(get_analytics_cache_key(self.cache, QueryDict()))
+
+    def test_delete_invalidates_analytics(self):
+        """
+        Deleting trackers from the admin or pruning them invalidates the
+        cached analytics.
+        """
+        self.get_response()
+        request = RequestFactory().post(self.url)
+        request.user = self.user
+
+        self.tracker_admin.delete_queryset(
+            request, Tracker.objects.filter(device_type=Tracker.PC))
+        self.assertEqual(
+            json.loads(self.get_response().context_data['devices_count']),
+            [{'device_type': Tracker.MOBILE, 'count': 1}])
+
+        with mock.patch(
+                'tracking_analyzer.management.commands.prune_trackers.'
+                'invalidate_analytics') as invalidate_mock:
+            call_command('prune_trackers', days=30, stdout=mock.Mock())
+
+        invalidate_mock.assert_called_once_with()
+
+    @override_settings(TRACKING_ANALYZER_ANALYTICS_CACHE_BACKEND=None)
+    def test_cache_disabled(self):
+        """
+        Without cache backend, the analytics are computed on every request.
+        """
+        self.get_response()
+
+        with mock.patch.object(TrackerAdmin, 'get_analytics',
+                               return_value={}) as get_analytics_mock:
+            self.get_response()
+
+        get_analytics_mock.assert_called_once()
@@ -0,0 +1,161 @@
+import unittest.mock as mock
+
+from django.test import override_settings, TestCase
+from django.utils import timezone
+
+from tracking_analyzer.buffer import tracker_buffer
+from tracking_analyzer.geoip import geoip_cache
+from tracking_analyzer.models import Tracker
+from .models import Post
+from .utils import build_mock_request
+
+
+@override_settings(
+    TRACKING_ANALYZER_BUFFER_ENABLED=True,
+    TRACKING_ANALYZER_BUFFER_FLUSH_SIZE=3,
+    TRACKING_ANALYZER_BUFFER_MAX_SIZE=5
+)
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class TrackerBufferTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+        geoip_cache.clear()
+        tracker_buffer.clear()
+        tracker_buffer.dropped = 0
+        self.addCleanup(tracker_buffer.clear)
+
+    def get_values(self, **kwargs):
+        values = Tracker.objects.get_values_from_request(
+            self.request, self.post)
+        values.update(kwargs)
+
+        return values
+
+    def test_create_from_request_buffered(self):
+        """
+        With the buffer enabled, ``create_from_request`` does not hit the
+        database until the buffer is flushed.
+        """
+        tracker = Tracker.objects.create_from_request(self.request, self.post)
+
+        self.assertIsNone(tracker)
+        self.assertEqual(len(tracker_buffer), 1)
+        self.assertFalse(Tracker.objects.exists())
+
+        self.assertEqual(tracker_buffer.flush(), 1)
+
+        tracker = Tracker.objects.get()
+        self.assertEqual(tracker.content_object, self.post)
+        self.assertEqual(tracker.user, self.request.user)
+        self.assertEqual(tracker.browser, 'Chrome')
+        self.assertEqual(len(tracker_buffer), 0)
+
+    def test_flush_keeps_timestamp(self):
+        """
+        Buffered trackers keep the time of the request, not the time of the
+        flush.
+        """
+        timestamp = timezone.now() - timezone.timedelta(minutes=5)
+        tracker_buffer.append(self.get_values(timestamp=timestamp))
+        tracker_buffer.flush()
+
+        self.assertEqual(Tracker.objects.get().timestamp, timestamp)
+
+    def test_flush_on_size(self):
+        """
+        The buffer is flushed with a single query when it reaches the flush
+        size.
+        """
+        tracker_buffer.append(self.get_values())
+        tracker_buffer.append(self.get_values())
+        self.assertEqual(Tracker.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            tracker_buffer.append(self.get_values())
+
+        self.assertEqual(Tracker.objects.count(), 3)
+        self.assertEqual(len(tracker_buffer), 0)
+
+    @override_settings(TRACKING_ANALYZER_BUFFER_FLUSH_INTERVAL=0)
+    def test_flush_on_age(self):
+        """
+        The buffer is flushed when the oldest event is too old.
+        """
+        tracker_buffer.append(self.get_values())
+
+        self.assertEqual(Tracker.objects.count(), 1)
+
+    @override_settings(
+        TRACKING_ANALYZER_BUFFER_FLUSH_SIZE=100,
+        TRACKING_ANALYZER_BUFFER_OVERFLOW='drop_newest'
+    )
+    def test_overflow_drop_newest(self):
+        """
+        With the ``'drop_newest'`` policy, new events are discarded when the
+        buffer is full.
+        """
+        for object_id in range(7):
+            tracker_buffer.append(self.get_values(object_id=object_id))
+
+        self.assertEqual(len(tracker_buffer), 5)
+        self.assertEqual(tracker_buffer.dropped, 2)
+
+        tracker_buffer.flush()
+        self.assertEqual(
+            sorted(Tracker.objects.values_list('object_id', flat=True)),
+            [0, 1, 2, 3, 4]
+        )
+
+    @override_settings(
+        TRACKING_ANALYZER_BUFFER_FLUSH_SIZE=100,
+        TRACKING_ANALYZER_BUFFER_OVERFLOW='drop_oldest'
+    )
+    def test_overflow_drop_oldest(self):
+        """
+        With the ``'drop_oldest'`` policy, the oldest events are discarded when
+        the buffer is full.
+        """
+        for object_id in range(7):
+            tracker_buffer.append(self.get_values(object_id=object_id))
+
+        self.assertEqual(len(tracker_buffer), 5)
+        self.assertEqual(tracker_buffer.dropped, 2)
+
+        tracker_buffer.flush()
+        self.assertEqual(
+            sorted(Tracker.objects.values_list('object_id', flat=True)),
+            [2, 3, 4, 5, 6]
+        )
+
+    @override_settings(
+        TRACKING_ANALYZER_BUFFER_FLUSH_SIZE=100,
+        TRACKING_ANALYZER_BUFFER_OVERFLOW='block'
+    )
+    def test_overflow_block(self):
+        """
+        With the ``'block'`` policy, the caller flushes the buffer when it is
+        full, so nothing is lost.
+        """
+        for object_id in range(7):
+            tracker_buffer.append(self.get_values(object_id=object_id))
+
+        self.assertEqual(Tracker.objects.count(), 5)
+        self.assertEqual(len(tracker_buffer), 2)
+        self.assertEqual(tracker_buffer.dropped, 0)
+
+    @mock.patch('tracking_analyzer.buffer.logger')
+    def test_flush_failure(self, logger_mock):
+        """
+        If the events can't be saved, they are logged and counted as dropped.
+        """
+        tracker_buffer.append(self.get_values(device_type=None))
+
+        self.assertEqual(tracker_buffer.flush(), 0)
+        self.assertEqual(tracker_buffer.dropped, 1)
+        self.assertTrue(logger_mock.exception.called)
@@ -0,0 +1,76 @@
+import unittest.mock as mock
+
+from django.test import SimpleTestCase
+
+from tracking_analyzer.cache import LRUCache
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def test_get_set(self):
+        """
+        Cached values are returned and the hits and misses are counted.
+        """
+        cache = LRUCache(maxsize=10)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('b', 'default'), 'default')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['size'], 1)
+
+    def test_lru_eviction(self):
+        """
+        When full, the least recently used entry is evicted.
+        """
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    @mock.patch('tracking_analyzer.cache.time.monotonic')
+    def test_ttl_expiration(self, monotonic_mock):
+        """
+        Entries expire after their time to live.
+        """
+        monotonic_mock.return_value = 100
+        cache = LRUCache(maxsize=10, ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=30)
+
+        monotonic_mock.return_value = 115
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_disabled(self):
+        """
+        A cache with no room does not store anything.
+        """
+        cache = LRUCache(maxsize=0)
+        cache.set('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_clear(self):
+        """
+        ``clear`` empties the cache and resets the counters.
+        """
+        cache = LRUCache(maxsize=10)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.clear()
+
+        self.assertEqual(
+            cache.stats(),
+            {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0, 'maxsize': 10}
+        )
@@ -0,0 +1,140 @@
+import unittest.mock as mock
+
+from django.test import override_settings, TestCase
+
+from tracking_analyzer.buffer import tracker_buffer
+from tracking_analyzer.dedup import hit_coalescer
+from tracking_analyzer.models import Tracker
+from tracking_analyzer.utils import get_requests_count
+from .models import Post
+from .utils import build_mock_request
+
+
+@override_settings(TRACKING_ANALYZER_DEDUP_WINDOW=10)
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class HitCoalescerTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+        hit_coalescer.clear()
+        self.addCleanup(hit_coalescer.clear)
+
+    def track(self, request=None):
+        return Tracker.objects.create_from_request(
+            request or self.request, self.post)
+
+    def test_repeated_hits_coalesced(self):
+        """
+        Repeated hits within the window are counted in the first tracker.
+        """
+        tracker = self.track()
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.track())
+        self.track()
+
+        tracker.refresh_from_db()
+        self.assertEqual(Tracker.objects.count(), 1)
+        self.assertEqual(tracker.hits, 3)
+
+    def test_different_visitors_not_coalesced(self):
+        """
+        Hits from another address or device get their own tracker.
+        """
+        self.track()
+
+        request = build_mock_request('/testing/')
+        request.META['REMOTE_ADDR'] = '208.67.222.220'
+        self.track(request)
+
+        request = build_mock_request(
+            '/testing/', user_agent='Mozilla/5.0 (iPhone; CPU iPhone OS 13_5 '
+                                    'like Mac OS X)')
+        self.track(request)
+
+        self.assertEqual(Tracker.objects.count(), 3)
+        self.assertEqual(
+            set(Tracker.objects.values_list('hits', flat=True)), {1})
+
+    @mock.patch('tracking_analyzer.cache.time.monotonic')
+    def test_window_expired(self, monotonic_mock):
+        """
+        Hits after the window get a new tracker.
+        """
+        monotonic_mock.return_value = 100
+        self.track()
+
+        monotonic_mock.return_value = 110
+        self.track()
+
+        self.assertEqual(Tracker.objects.count(), 2)
+
+    @override_settings(TRACKING_ANALYZER_DEDUP_WINDOW=0)
+    def test_dedup_disabled(self):
+        """
+        With no window, every hit gets its own tracker.
+        """
+        self.track()
+        self.track()
+
+        self.assertEqual(Tracker.objects.count(), 2)
+
+    @override_settings(
+        TRACKING_ANALYZER_BUFFER_ENABLED=True,
+        TRACKING_ANALYZER_BUFFER_FLUSH_SIZE=100
+    )
+    def test_buffered_hits_coalesced(self):
+        """
+        Repeated hits are counted in the buffered event while it is not saved
+        yet, and get a new tracker afterwards.
+        """
+        tracker_buffer.clear()
+        self.addCleanup(tracker_buffer.clear)
+
+        self.track()
+        self.track()
+        self.assertEqual(len(tracker_buffer), 1)
+
+        tracker_buffer.flush()
+        self.track()
+        tracker_buffer.flush()
+
+        self.assertEqual(
+            sorted(Tracker.objects.values_list('hits', flat=True)), [1, 2])
+
+    @override_settings(
+        TRACKING_ANALYZER_BUFFER_ENABLED=True,
+        TRACKING_ANALYZER_BUFFER_MAX_SIZE=1,
+        TRACKING_ANALYZER_BUFFER_OVERFLOW='drop_newest'
+    )
+    def test_dropped_hits_not_coalesced(self):
+        """
+        Events dropped by a full buffer are not remembered, so the repeated
+        hits are not counted in them.
+        """
+        tracker_buffer.clear()
+        self.addCleanup(tracker_buffer.clear)
+        dropped = tracker_buffer.dropped
+        tracker_buffer.append({})
+
+        self.track()
+        self.track()
+
+        self.assertEqual(tracker_buffer.dropped - dropped, 2)
+
+    def test_requests_count_hits(self):
+        """
+        ``get_requests_count`` adds up the hits of the trackers, times their
+        sample weight.
+        """
+        tracker = self.track()
+        self.track()
+        Tracker.objects.filter(pk=tracker.pk).update(sample_weight=10)
+
+        self.assertEqual(
+            get_requests_count(Tracker.objects.all())[0]['requests'], 20)
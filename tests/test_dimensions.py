@@ -0,0 +1,182 @@
+import unittest.mock as mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.test import override_settings, TestCase
+
+from tracking_analyzer.buffer import tracker_buffer
+from tracking_analyzer.dimensions import dimension_cache
+from tracking_analyzer.models import (
+    AgentDimension, ReferrerDimension, Tracker)
+from .models import Post
+from .utils import build_mock_request
+
+
+@override_settings(TRACKING_ANALYZER_NORMALIZED_STORAGE=True)
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class NormalizedStorageTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.request.META['HTTP_REFERER'] = 'http://www.google.com/'
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+        dimension_cache.clear()
+        self.addCleanup(dimension_cache.clear)
+
+    def track(self, request=None):
+        return Tracker.objects.create_from_request(
+            request or self.request, self.post)
+
+    def test_strings_stored_once(self):
+        """
+        Each distinct user agent and referrer is stored once, and the trackers
+        reference it.
+        """
+        tracker = self.track()
+        self.track()
+
+        self.assertEqual(AgentDimension.objects.count(), 1)
+        self.assertEqual(ReferrerDimension.objects.count(), 1)
+        self.assertEqual(
+            set(Tracker.objects.values_list('agent_dimension', flat=True)),
+            {tracker.agent_dimension_id}
+        )
+
+        # The wide columns are left empty.
+        self.assertEqual(
+            set(Tracker._base_manager.values_list('browser', 'referrer')),
+            {('', '')}
+        )
+
+        # The returned instance still has its strings.
+        self.assertEqual(tracker.browser, 'Chrome')
+        self.assertEqual(tracker.referrer, 'http://www.google.com/')
+
+    def test_instances_read_strings(self):
+        """
+        Trackers read from the database get their strings from the dimension
+        tables, from the cache after the first time.
+        """
+        self.track()
+        dimension_cache.clear()
+
+        with self.assertNumQueries(3):
+            tracker = Tracker.objects.get()
+        self.assertEqual(tracker.browser, 'Chrome')
+        self.assertEqual(tracker.system, 'Mac OS X')
+        self.assertEqual(tracker.referrer, 'http://www.google.com/')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Tracker.objects.get().browser, 'Chrome')
+
+    def test_queries_by_field_name(self):
+        """
+        The user agent and referrer fields can still be used by name in
+        queries.
+        """
+        self.track()
+        request = build_mock_request(
+            '/testing/', user_agent='Mozilla/5.0 (iPhone; CPU iPhone OS 13_5 '
+                                    'like Mac OS X)')
+        self.track(request)
+
+        self.assertEqual(Tracker.objects.filter(browser='Chrome').count(), 1)
+        self.assertEqual(
+            Tracker.objects.exclude(referrer__startswith='http://').count(),
+            1
+        )
+        self.assertEqual(
+            Tracker.objects.filter(
+                Q(browser='Chrome') | Q(system='iOS')).count(),
+            2
+        )
+        self.assertEqual(
+            list(Tracker.objects.order_by('-browser').values_list(
+                'browser', flat=True)),
+            ['Mobile Safari UI/WKWebView', 'Chrome']
+        )
+        self.assertEqual(
+            list(Tracker.objects.order_by('browser').values('browser')),
+            [{'browser': 'Chrome'}, {'browser': 'Mobile Safari UI/WKWebView'}]
+        )
+
+    @override_settings(
+        TRACKING_ANALYZER_BUFFER_ENABLED=True,
+        TRACKING_ANALYZER_BUFFER_FLUSH_SIZE=100
+    )
+    def test_buffered_trackers_normalized(self):
+        """
+        Trackers saved in bulk are normalized too.
+        """
+        tracker_buffer.clear()
+        self.addCleanup(tracker_buffer.clear)
+
+        self.track()
+        self.track()
+        tracker_buffer.flush()
+
+        self.assertEqual(AgentDimension.objects.count(), 1)
+        self.assertEqual(
+            Tracker.objects.filter(
+                agent_dimension__isnull=False,
+                referrer_dimension__isnull=False
+            ).count(),
+            2
+        )
+
+
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class NormalizeTrackersTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+        dimension_cache.clear()
+        self.addCleanup(dimension_cache.clear)
+
+    def test_normalize_and_reverse(self):
+        """
+        The command moves the strings of the existing trackers to the
+        dimension tables, and back.
+        """
+        for _ in range(3):
+            Tracker.objects.create_from_request(self.request, self.post)
+
+        with override_settings(TRACKING_ANALYZER_NORMALIZED_STORAGE=True):
+            call_command(
+                'normalize_trackers', chunk_size=2, stdout=mock.Mock())
+
+            self.assertEqual(AgentDimension.objects.count(), 1)
+            self.assertFalse(
+                Tracker.objects.filter(agent_dimension__isnull=True).exists())
+            self.assertEqual(
+                Tracker.objects.filter(browser='Chrome').count(), 3)
+
+        self.assertFalse(Tracker.objects.filter(browser='Chrome').exists())
+
+        call_command('normalize_trackers', reverse=True, stdout=mock.Mock())
+
+        self.assertFalse(
+            Tracker.objects.filter(agent_dimension__isnull=False).exists())
+        self.assertEqual(Tracker.objects.filter(browser='Chrome').count(), 3)
+
+    def test_setting_mismatch(self):
+        """
+        The command refuses to run against the configured storage layout.
+        """
+        with self.assertRaises(CommandError):
+            call_command('normalize_trackers', stdout=mock.Mock())
+
+        with override_settings(TRACKING_ANALYZER_NORMALIZED_STORAGE=True):
+            with self.assertRaises(CommandError):
+                call_command(
+                    'normalize_trackers', reverse=True, stdout=mock.Mock())
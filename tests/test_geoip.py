@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+import unittest.mock as mock
+
+from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
+from django.core.cache import caches
+from django.test import override_settings, SimpleTestCase
+
+from geoip2.errors import GeoIP2Error
+
+from tracking_analyzer.geoip import (
+    geoip_cache, geoip_reader, geolocate, GeoIPReader
+)
+
+
+class GeoIPReaderTestCase(SimpleTestCase):
+    def setUp(self):
+        self.geoip_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.geoip_dir)
+
+        self.city_dataset = os.path.join(
+            self.geoip_dir, 'GeoLite2-City.mmdb')
+        with open(self.city_dataset, 'wb') as dataset:
+            dataset.write(b'first')
+
+        self.reader = GeoIPReader()
+
+        override = override_settings(GEOIP_PATH=self.geoip_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
+    def test_geoip_opened_once(self, mock_geoip2):
+        """
+        The datasets are opened once and the same ``GeoIP2`` instance is used
+        for every lookup.
+        """
+        self.reader.city('208.67.222.222')
+        self.reader.city('208.67.222.220')
+
+        self.assertEqual(mock_geoip2.call_count, 1)
+        self.assertEqual(mock_geoip2().city.call_count, 2)
+
+    @override_settings(TRACKING_ANALYZER_GEOIP_MODE='memory')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
+    def test_geoip_mode(self, mock_geoip2):
+        """
+        The datasets are opened in the configured mode.
+        """
+        self.reader.get_geoip()
+
+        mock_geoip2.assert_called_once_with(cache=GeoIP2.MODE_MEMORY)
+
+    @override_settings(TRACKING_ANALYZER_GEOIP_MODE='wrong')
+    def test_geoip_wrong_mode(self):
+        """
+        An unknown mode raises a ``GeoIP2Exception``.
+        """
+        self.assertRaisesMessage(
+            GeoIP2Exception,
+            'Invalid `TRACKING_ANALYZER_GEOIP_MODE` setting: wrong',
+            self.reader.get_geoip
+        )
+
+    @override_settings(TRACKING_ANALYZER_GEOIP_RELOAD_INTERVAL=0)
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
+    def test_geoip_hot_reload(self, mock_geoip2):
+        """
+        A new ``GeoIP2`` instance is swapped in when the datasets are replaced
+        on disk, but not when they are left untouched.
+        """
+        mock_geoip2.side_effect = [mock.Mock(), mock.Mock()]
+
+        first = self.reader.get_geoip()
+        self.assertIs(self.reader.get_geoip(), first)
+
+        # Replace the dataset, as `install_geoip_dataset` does.
+        replacement = os.path.join(self.geoip_dir, 'replacement')
+        with open(replacement, 'wb') as dataset:
+            dataset.write(b'second dataset')
+        os.replace(replacement, self.city_dataset)
+
+        second = self.reader.get_geoip()
+        self.assertIsNot(second, first)
+        self.assertIs(self.reader.get_geoip(), second)
+
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
+    def test_geoip_reload_forced(self, mock_geoip2):
+        """
+        ``reload`` makes the next lookup reopen the datasets, even before the
+        reload interval is over.
+        """
+        self.reader.get_geoip()
+        self.reader.reload()
+        self.reader.get_geoip()
+
+        self.assertEqual(mock_geoip2.call_count, 2)
+
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
+    def test_geoip_open_failure_retried(self, mock_geoip2):
+        """
+        If the datasets can't be opened, the next lookup tries again.
+        """
+        mock_geoip2.side_effect = [GeoIP2Exception, mock.Mock()]
+
+        self.assertRaises(GeoIP2Exception, self.reader.get_geoip)
+        self.assertIsNotNone(self.reader.get_geoip())
+
+
+class GeolocateTestCase(SimpleTestCase):
+    def setUp(self):
+        geoip_reader.close()
+        geoip_cache.clear()
+        self.addCleanup(geoip_reader.close)
+        self.addCleanup(geoip_cache.clear)
+
+        patcher = mock.patch('tracking_analyzer.geoip.GeoIP2')
+        self.mock_geoip2 = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mock_geoip2()._country = None
+        self.mock_geoip2()._city.metadata().build_epoch = 1500000000
+        self.mock_geoip2().city.return_value = {
+            'country_code': 'US',
+            'region': 'CA',
+            'city': 'San Francisco',
+            'latitude': 37.7697,
+            'longitude': -122.3933,
+        }
+
+    def test_geolocate_cached(self):
+        """
+        Each address is looked up once, then served from the cache.
+        """
+        expected = {
+            'country_code': 'US', 'region': 'CA', 'city': 'San Francisco'}
+
+        self.assertEqual(geolocate('208.67.222.222'), expected)
+        self.assertEqual(geolocate('208.67.222.222'), expected)
+
+        self.assertEqual(self.mock_geoip2().city.call_count, 1)
+        self.assertEqual(geoip_cache.stats()['hits'], 1)
+        self.assertEqual(geoip_cache.stats()['misses'], 1)
+
+    def test_geolocate_negative_cache(self):
+        """
+        Failed lookups are cached too.
+        """
+        self.mock_geoip2().city.side_effect = GeoIP2Error
+
+        self.assertEqual(geolocate('127.0.0.1'), {})
+        self.assertEqual(geolocate('127.0.0.1'), {})
+
+        self.assertEqual(self.mock_geoip2().city.call_count, 1)
+
+    @override_settings(TRACKING_ANALYZER_GEOIP_CACHE_SIZE=0)
+    def test_geolocate_cache_disabled(self):
+        """
+        With no cache, every call looks the address up.
+        """
+        geolocate('208.67.222.222')
+        geolocate('208.67.222.222')
+
+        self.assertEqual(self.mock_geoip2().city.call_count, 2)
+
+    @override_settings(TRACKING_ANALYZER_GEOIP_CACHE_BACKEND='default')
+    def test_geolocate_shared_cache(self):
+        """
+        Results are stored in the shared Django cache and read from it when
+        missing in the in-process cache.
+        """
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+        geolocate('208.67.222.222')
+        self.assertEqual(
+            caches['default'].get(
+                'tracking_analyzer:geoip:1500000000:208.67.222.222')['city'],
+            'San Francisco'
+        )
+
+        # Another process would start with an empty in-process cache.
+        geoip_cache.clear()
+        geolocate('208.67.222.222')
+
+        self.assertEqual(self.mock_geoip2().city.call_count, 1)
+
+    @override_settings(TRACKING_ANALYZER_GEOIP_CACHE_BACKEND='default')
+    def test_geolocate_shared_cache_new_datasets(self):
+        """
+        The results of outdated datasets are not read from the shared cache
+        by the processes that opened the new ones.
+        """
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+        geolocate('208.67.222.222')
+
+        # Another process opens an updated build of the datasets.
+        geoip_reader.close()
+        geoip_cache.clear()
+        self.mock_geoip2()._city.metadata().build_epoch = 1600000000
+        geolocate('208.67.222.222')
+
+        self.assertEqual(self.mock_geoip2().city.call_count, 2)
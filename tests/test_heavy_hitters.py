@@ -0,0 +1,192 @@
+import unittest.mock as mock
+
+from django.contrib.admin import AdminSite
+from django.contrib.contenttypes.models import ContentType
+from django.test import override_settings, RequestFactory, SimpleTestCase, \
+    TestCase
+from django.urls import reverse
+
+from tracking_analyzer.admin import TrackerAdmin
+from tracking_analyzer.heavy_hitters import (
+    get_top_objects, get_top_referrers, heavy_hitters, SpaceSaving)
+from tracking_analyzer.models import HeavyHitterSummary, Tracker
+from .factories import PostFactory, UserFactory
+
+
+class SpaceSavingTestCase(SimpleTestCase):
+    def test_add(self):
+        """
+        A new key takes over the smallest counter when all are taken, and
+        its count is overestimated by at most the count it took over.
+        """
+        summary = SpaceSaving(2)
+        summary.add('a', 3)
+        summary.add('b')
+        summary.add('c')
+
+        self.assertEqual(summary.top(5), [('a', 3, 0), ('c', 2, 1)])
+
+    def test_frequent_keys(self):
+        """
+        Keys counted more than ``total / capacity`` times are never lost,
+        whatever the number of distinct keys.
+        """
+        summary = SpaceSaving(10)
+        for index in range(1000):
+            summary.add('frequent' if index % 5 == 0 else str(index))
+
+        self.assertEqual(len(summary.counters), 10)
+        key, count, error = summary.top(1)[0]
+        self.assertEqual(key, 'frequent')
+        self.assertLessEqual(count - error, 200)
+        self.assertGreaterEqual(count, 200)
+
+    def test_merge(self):
+        """
+        Merged summaries add up their counts, the keys missing in a full
+        summary counting as its smallest count.
+        """
+        first, second = SpaceSaving(2), SpaceSaving(2)
+        first.add('a', 5)
+        first.add('b', 2)
+        second.add('a', 1)
+        first.merge(second)
+
+        self.assertEqual(first.top(5), [('a', 6, 0), ('b', 2, 0)])
+
+        third = SpaceSaving(2)
+        third.add('c', 4)
+        third.add('d', 3)
+        first.merge(third)
+
+        self.assertEqual(first.top(5), [('a', 9, 3), ('c', 6, 2)])
+
+    def test_json(self):
+        """
+        Summaries are stored as JSON.
+        """
+        summary = SpaceSaving(2)
+        summary.add('a', 3)
+
+        self.assertEqual(
+            SpaceSaving.from_json(2, summary.to_json()).top(1), [('a', 3, 0)])
+
+
+@override_settings(TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED=True)
+class HeavyHittersTestCase(TestCase):
+    def setUp(self):
+        self.posts = PostFactory.create_batch(2)
+        self.content_type = ContentType.objects.get_for_model(self.posts[0])
+        self.addCleanup(heavy_hitters.clear)
+
+        # No background thread flushing into the test database.
+        self.start_patcher = mock.patch.object(heavy_hitters, '_start')
+        self.start_patcher.start()
+        self.addCleanup(mock.patch.stopall)
+
+    def add(self, post, referrer='', sample_weight=1):
+        heavy_hitters.add({
+            'content_type_id': self.content_type.pk,
+            'object_id': post.pk,
+            'referrer': referrer,
+            'sample_weight': sample_weight,
+        })
+
+    def test_flush(self):
+        """
+        Summaries are saved by stream, period and process, and the ones of
+        the past periods forgotten.
+        """
+        with mock.patch('time.time', return_value=120):
+            self.add(self.posts[0], 'http://example.com/')
+        with mock.patch('time.time', return_value=185):
+            self.add(self.posts[1])
+            heavy_hitters.flush()
+
+        self.assertEqual(
+            list(HeavyHitterSummary.objects.order_by(
+                'start', 'stream').values_list('stream', flat=True)),
+            ['objects', 'referrers', 'objects']
+        )
+        self.assertEqual(len(heavy_hitters._summaries), 1)
+
+    def test_flush_thread(self):
+        """
+        Summaries are saved every interval by a background thread, started
+        by the first request counted.
+        """
+        self.start_patcher.stop()
+        self.addCleanup(setattr, heavy_hitters, '_thread', None)
+        with mock.patch('threading.Thread') as thread_mock:
+            self.add(self.posts[0])
+            self.add(self.posts[1])
+
+        thread_mock.assert_called_once_with(
+            target=heavy_hitters._run, name='tracking-analyzer-heavy-hitters',
+            daemon=True)
+        thread_mock.return_value.start.assert_called_once_with()
+        self.assertFalse(HeavyHitterSummary.objects.exists())
+
+        with mock.patch('time.sleep', side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                heavy_hitters._run()
+
+        self.assertTrue(HeavyHitterSummary.objects.exists())
+
+    @override_settings(TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED=False)
+    def test_disabled(self):
+        """
+        Nothing is counted unless enabled.
+        """
+        self.add(self.posts[0])
+
+        self.assertEqual(heavy_hitters._summaries, {})
+
+    def test_top(self):
+        """
+        The top objects and referrers merge the summaries of every process.
+        """
+        self.add(self.posts[0], 'http://example.com/', sample_weight=10)
+        self.add(self.posts[1], 'http://example.org/')
+        heavy_hitters.flush()
+        # The current period summaries of another process.
+        HeavyHitterSummary.objects.update(process='other')
+        heavy_hitters.clear()
+        self.add(self.posts[1], 'http://example.org/')
+        heavy_hitters.flush()
+
+        self.assertEqual(get_top_objects(), [
+            (self.posts[0], 10, 0), (self.posts[1], 2, 0)])
+        self.assertEqual(get_top_referrers(1), [
+            ('http://example.com/', 10, 0)])
+
+    def test_ingest(self):
+        """
+        Tracked requests are counted, even the ones not saved yet.
+        """
+        Tracker.objects.save_values({
+            'content_type_id': self.content_type.pk,
+            'object_id': self.posts[0].pk,
+        })
+        heavy_hitters.flush()
+
+        self.assertEqual(get_top_objects(), [(self.posts[0], 1, 0)])
+
+    def test_changelist_view(self):
+        """
+        The admin changelist shows the most requested objects.
+        """
+        self.add(self.posts[0], 'http://example.com/')
+        heavy_hitters.flush()
+
+        request = RequestFactory().get(
+            reverse('admin:tracking_analyzer_tracker_changelist'))
+        request.user = UserFactory.create(is_staff=True, is_superuser=True)
+        response = TrackerAdmin(Tracker, AdminSite()).changelist_view(request)
+
+        self.assertEqual(response.context_data['top_objects'][0]['label'],
+                         str(self.posts[0]))
+        self.assertEqual(
+            response.context_data['top_referrers'],
+            [{'label': 'http://example.com/', 'requests': 1, 'error': 0}]
+        )
@@ -0,0 +1,323 @@
+import datetime
+import unittest.mock as mock
+from unittest import skipUnless
+
+from django.contrib.admin import AdminSite
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.ddl_references import Statement
+from django.db.migrations import AddField, AddIndex
+from django.db.migrations.loader import MigrationLoader
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase)
+from django.utils import timezone
+
+from tracking_analyzer.admin import TrackerAdmin
+from tracking_analyzer.indexes import (
+    BRIN_INDEX, BTREE_INDEX, TimestampIndexes)
+from tracking_analyzer.models import Tracker
+from tracking_analyzer.operations import (
+    AddForeignKeyConcurrently, AddIndexConcurrently)
+from tracking_analyzer.utils import get_requests_count
+from .factories import TrackerFactory, UserFactory
+
+
+class TrackerIndexesTestCase(TestCase):
+    def setUp(self):
+        self.tracker = TrackerFactory.create()
+        self.tracker_admin = TrackerAdmin(Tracker, AdminSite())
+
+        if connection.vendor == 'postgresql':
+            # With a few rows, a sequential scan is always cheaper.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def get_changelist_plan(self, query_string=''):
+        """
+        Returns the query plan of the admin changelist page.
+        """
+        request = RequestFactory().get('/' + query_string)
+        request.user = UserFactory.create(is_staff=True, is_superuser=True)
+        changelist = self.tracker_admin.get_changelist_instance(request)
+
+        return changelist.queryset[:100].explain()
+
+    def test_changelist_uses_timestamp_index(self):
+        """
+        The unfiltered changelist is read in order from the ``timestamp``
+        index.
+        """
+        self.assertIn('tracker_timestamp_idx', self.get_changelist_plan())
+
+    def test_changelist_filters_use_indexes(self):
+        """
+        Each changelist filter has its own index.
+        """
+        filters = {
+            'tracker_device_type_idx': '?device_type__exact=pc',
+            'tracker_ip_country_idx': '?ip_country__exact=NL',
+            'tracker_ip_city_idx': '?ip_city__exact=Amsterdam',
+            'tracker_ip_address_idx': '?ip_address__exact=208.67.222.222',
+            'tracker_object_idx': '?content_type__id__exact={0}'
+                                  '&object_id__exact={1}'.format(
+                                      self.tracker.content_type_id,
+                                      self.tracker.object_id),
+        }
+
+        for index, query_string in filters.items():
+            with self.subTest(index=index):
+                self.assertIn(index, self.get_changelist_plan(query_string))
+
+    def test_requests_count_uses_timestamp_index(self):
+        """
+        ``get_requests_count`` over a date range is answered from the
+        ``timestamp`` index.
+        """
+        now = timezone.now()
+        queryset = get_requests_count(
+            Tracker.objects.all(), now - datetime.timedelta(days=1), now)
+
+        self.assertIn('tracker_timestamp_idx', queryset.explain())
+
+    def test_requests_count_half_open_range(self):
+        """
+        ``get_requests_count`` counts the requests from ``start`` and up to,
+        but not including, ``end``.
+        """
+        start = self.tracker.timestamp
+        end = start + datetime.timedelta(minutes=1)
+        TrackerFactory.create(timestamp=end)
+
+        self.assertEqual(
+            sum(item['requests']
+                for item in get_requests_count(Tracker.objects, start, end)),
+            1
+        )
+
+    def test_date_filters_half_open_range(self):
+        """
+        The admin date filters select half-open ranges of ``timestamp``, so
+        they use its indexes.
+        """
+        for query_string in ('?timestamp__year=2016&timestamp__month=7',
+                             '?timestamp__gte=2016-07-01'
+                             '&timestamp__lt=2016-07-08'):
+            with self.subTest(query_string=query_string):
+                request = RequestFactory().get('/' + query_string)
+                request.user = UserFactory.create(
+                    is_staff=True, is_superuser=True)
+                sql = str(self.tracker_admin.get_changelist_instance(
+                    request).queryset.query)
+
+                self.assertIn('"timestamp" >= ', sql)
+                self.assertIn('"timestamp" < ', sql)
+                self.assertNotIn('BETWEEN', sql)
+
+    def test_object_lookup_uses_object_index(self):
+        """
+        The trackers of an object are looked up in the object index.
+        """
+        queryset = Tracker.objects.filter(
+            content_type=self.tracker.content_type,
+            object_id=self.tracker.object_id
+        ).order_by('-timestamp')
+
+        self.assertIn('tracker_object_idx', queryset.explain())
+
+
+class TrackerMigrationsTestCase(SimpleTestCase):
+    def test_indexes_built_concurrently(self):
+        """
+        The migrations adding columns to the trackers table don't index them
+        along, but build their indexes concurrently.
+        """
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+
+        for (app_label, name), migration in loader.disk_migrations.items():
+            if app_label != 'tracking_analyzer':
+                continue
+
+            for operation in migration.operations:
+                if getattr(operation, 'model_name', None) != 'tracker':
+                    continue
+
+                with self.subTest(migration=name, operation=operation):
+                    if isinstance(operation, AddField):
+                        self.assertFalse(operation.field.db_index)
+                    if isinstance(operation, AddField) and \
+                            operation.field.remote_field:
+                        self.assertIsInstance(
+                            operation, AddForeignKeyConcurrently)
+                        self.assertFalse(migration.atomic)
+                    if isinstance(operation, AddIndex):
+                        self.assertIsInstance(
+                            operation, AddIndexConcurrently)
+                        self.assertFalse(migration.atomic)
+
+
+class AddForeignKeyConcurrentlyTestCase(SimpleTestCase):
+    def test_database_forwards(self):
+        """
+        On PostgreSQL, the column is added without its constraint, which is
+        then added ``NOT VALID`` and validated in separate statements.
+        """
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        from_state = loader.project_state(
+            ('tracking_analyzer', '0006_tracker_hits'))
+        to_state = loader.project_state(
+            ('tracking_analyzer', '0007_dimensions'))
+        operation = next(
+            operation for operation in loader.get_migration(
+                'tracking_analyzer', '0007_dimensions').operations
+            if getattr(operation, 'name', None) == 'agent_dimension')
+
+        editor = mock.Mock()
+        editor.connection.vendor = 'postgresql'
+        editor.connection.alias = 'default'
+        editor.add_field.side_effect = \
+            lambda model, field: self.assertFalse(field.db_constraint)
+        editor._create_fk_sql.return_value = Statement(
+            'ALTER TABLE %(table)s ADD CONSTRAINT %(name)s FOREIGN KEY',
+            table='"tracking_analyzer_tracker"', name='"tracker_fk"')
+
+        operation.database_forwards(
+            'tracking_analyzer', editor, from_state, to_state)
+
+        editor.add_field.assert_called_once()
+        self.assertEqual(editor.execute.call_args_list, [
+            mock.call('ALTER TABLE "tracking_analyzer_tracker" ADD '
+                      'CONSTRAINT "tracker_fk" FOREIGN KEY NOT VALID'),
+            mock.call('ALTER TABLE "tracking_analyzer_tracker" VALIDATE '
+                      'CONSTRAINT "tracker_fk"'),
+        ])
+
+
+class TimestampIndexesTestCase(SimpleTestCase):
+    def setUp(self):
+        self.indexes = TimestampIndexes()
+        self.indexes.execute = mock.Mock(return_value=[])
+        self.indexes.get_indexes = mock.Mock(
+            return_value={BTREE_INDEX: True})
+        self.indexes.is_partitioned = mock.Mock(return_value=False)
+
+    def get_statements(self):
+        return [call[0][0] for call in self.indexes.execute.call_args_list]
+
+    def test_create_brin(self):
+        """
+        The BRIN index is created concurrently, only if missing.
+        """
+        self.assertTrue(self.indexes.create(BRIN_INDEX))
+
+        self.indexes.get_indexes.return_value[BRIN_INDEX] = True
+        self.assertFalse(self.indexes.create(BRIN_INDEX))
+
+        self.assertEqual(self.get_statements(), [
+            'CREATE INDEX CONCURRENTLY "tracker_timestamp_brin" ON '
+            '"tracking_analyzer_tracker" USING brin ("timestamp")'])
+
+    def test_create_invalid(self):
+        """
+        An index left invalid by an interrupted build is built again.
+        """
+        self.indexes.get_indexes.return_value[BRIN_INDEX] = False
+
+        self.assertTrue(self.indexes.create(BRIN_INDEX))
+        self.assertEqual(
+            self.get_statements()[0],
+            'DROP INDEX CONCURRENTLY "tracker_timestamp_brin"')
+
+    def test_partitioned(self):
+        """
+        Indexes of partitioned tables can't be built or dropped
+        concurrently.
+        """
+        self.indexes.is_partitioned.return_value = True
+
+        self.indexes.create(BRIN_INDEX)
+        self.indexes.drop(BTREE_INDEX)
+
+        self.assertEqual(self.get_statements(), [
+            'CREATE INDEX "tracker_timestamp_brin" ON '
+            '"tracking_analyzer_tracker" USING brin ("timestamp")',
+            'DROP INDEX "tracker_timestamp_idx"'])
+
+    def test_drop(self):
+        """
+        Indexes are only dropped if they exist.
+        """
+        self.assertFalse(self.indexes.drop(BRIN_INDEX))
+        self.assertTrue(self.indexes.drop(BTREE_INDEX))
+
+        self.assertEqual(self.get_statements(), [
+            'DROP INDEX CONCURRENTLY "tracker_timestamp_idx"'])
+
+    def test_btree_index(self):
+        """
+        The B-tree index is created back as declared in the model.
+        """
+        self.assertEqual(
+            self.indexes.get_btree_index().fields,
+            ['timestamp', 'hits', 'sample_weight'])
+
+
+class BrinIndexCommandTestCase(TestCase):
+    def test_postgresql_only(self):
+        """
+        The command refuses to run on databases without BRIN indexes.
+        """
+        if connection.vendor == 'postgresql':
+            self.skipTest('BRIN indexes are available.')
+
+        with self.assertRaises(CommandError):
+            call_command('brin_index', stdout=mock.Mock())
+
+    @mock.patch('tracking_analyzer.management.commands.brin_index.'
+                'TimestampIndexes')
+    def test_replace_btree(self, indexes_mock):
+        """
+        The B-tree index is dropped once the BRIN one is built, and built
+        back before dropping the BRIN one.
+        """
+        indexes = indexes_mock.return_value
+        indexes.connection.vendor = 'postgresql'
+        indexes.create.return_value = indexes.drop.return_value = True
+
+        call_command('brin_index', replace_btree=True, stdout=mock.Mock())
+        self.assertEqual(indexes.method_calls, [
+            mock.call.create(BRIN_INDEX), mock.call.drop(BTREE_INDEX)])
+
+        indexes.reset_mock()
+        stdout = mock.Mock()
+        call_command('brin_index', drop=True, stdout=stdout)
+
+        self.assertEqual(indexes.method_calls, [
+            mock.call.create(BTREE_INDEX), mock.call.drop(BRIN_INDEX)])
+        stdout.write.assert_called_with('tracker_timestamp_brin: dropped.\n')
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'BRIN indexes are only available on PostgreSQL.')
+class PostgreSQLBrinIndexTestCase(TransactionTestCase):
+    def setUp(self):
+        # Indexes are built concurrently, out of a transaction.
+        self.indexes = TimestampIndexes()
+        self.addCleanup(self.indexes.drop, BRIN_INDEX)
+        self.addCleanup(self.indexes.create, BTREE_INDEX)
+
+    def test_replace_btree(self):
+        """
+        The BRIN index replaces the B-tree one, and the other way around,
+        running the command twice changing nothing.
+        """
+        for _ in range(2):
+            call_command('brin_index', replace_btree=True, stdout=mock.Mock())
+            self.assertEqual(self.indexes.get_indexes().get(BRIN_INDEX), True)
+            self.assertNotIn(BTREE_INDEX, self.indexes.get_indexes())
+
+        for _ in range(2):
+            call_command('brin_index', drop=True, stdout=mock.Mock())
+            self.assertEqual(
+                self.indexes.get_indexes().get(BTREE_INDEX), True)
+            self.assertNotIn(BRIN_INDEX, self.indexes.get_indexes())
@@ -0,0 +1,182 @@
+import unittest.mock as mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings, SimpleTestCase, TestCase
+
+from tracking_analyzer.ips import (
+    get_ip_prefix, get_ip_range, pack_ip, unpack_ip)
+from tracking_analyzer.loader import format_csv_value, load_trackers
+from tracking_analyzer.models import Tracker
+from .models import Post
+from .utils import build_mock_request
+
+
+class PackIPTestCase(SimpleTestCase):
+    def test_pack_ip(self):
+        """
+        Both address families are packed in 16 bytes, and unpacked back.
+        """
+        for address in ('208.67.222.222', '2001:db8::1', '::1'):
+            packed = pack_ip(address)
+            self.assertEqual(len(packed), 16)
+            self.assertEqual(unpack_ip(packed), address)
+
+        self.assertLess(pack_ip('10.0.0.255'), pack_ip('10.0.1.0'))
+
+    def test_ip_prefix(self):
+        """
+        IPv4 addresses are grouped in /24 networks, IPv6 ones in /48.
+        """
+        self.assertEqual(get_ip_prefix('208.67.222.222'), '208.67.222.0')
+        self.assertEqual(
+            get_ip_prefix('2001:db8:1:2::1'), '2001:db8:1::')
+
+    def test_ip_range(self):
+        """
+        A network spans from its network address to its broadcast one.
+        """
+        self.assertEqual(
+            get_ip_range('10.1.2.3/16'),
+            (pack_ip('10.1.0.0'), pack_ip('10.1.255.255'))
+        )
+
+    def test_binary_csv_value(self):
+        """
+        Binary values are hex encoded for ``COPY``.
+        """
+        self.assertEqual(format_csv_value(b'\x0a\xff'), '"\\x0aff"')
+
+    def test_indexable_column(self):
+        """
+        The packed addresses are stored in fixed-width columns that can be
+        indexed, instead of BLOBs on MySQL and Oracle.
+        """
+        field = Tracker._meta.get_field('ip_packed')
+        connection = mock.Mock()
+
+        for vendor, db_type in (('mysql', 'varbinary(16)'),
+                                ('oracle', 'RAW(16)')):
+            with self.subTest(vendor=vendor):
+                connection.vendor = vendor
+                self.assertEqual(field.db_type(connection), db_type)
+
+
+@override_settings(TRACKING_ANALYZER_COMPACT_IP_STORAGE=True)
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class CompactIPStorageTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+    def track(self, ip_address):
+        self.request.META['REMOTE_ADDR'] = ip_address
+        return Tracker.objects.create_from_request(self.request, self.post)
+
+    def test_addresses_packed(self):
+        """
+        Addresses are saved in the packed columns and read back as usual.
+        """
+        tracker = self.track('208.67.222.222')
+        self.assertEqual(tracker.ip_address, '208.67.222.222')
+
+        self.assertEqual(
+            list(Tracker._base_manager.values_list(
+                'ip_address', 'ip_packed', 'ip_prefix')),
+            [(None, '208.67.222.222', '208.67.222.0')]
+        )
+        self.assertEqual(Tracker.objects.get().ip_address, '208.67.222.222')
+
+    def test_bulk_addresses_packed(self):
+        """
+        Trackers saved in bulk are compacted too.
+        """
+        load_trackers([
+            Tracker(content_object=self.post, ip_address='208.67.222.222')])
+
+        self.assertEqual(
+            Tracker._base_manager.get().ip_prefix, '208.67.222.0')
+
+    def test_queries(self):
+        """
+        Addresses can be queried by address, prefix and network.
+        """
+        self.track('208.67.222.222')
+        self.track('208.67.222.220')
+        self.track('208.67.1.1')
+        self.track('2001:db8::1')
+
+        self.assertEqual(
+            Tracker.objects.filter(ip_address='208.67.222.220').count(), 1)
+        self.assertEqual(
+            Tracker.objects.filter(
+                ip_address__in=['208.67.1.1', '2001:db8::1']).count(),
+            2
+        )
+        self.assertEqual(
+            Tracker.objects.filter(ip_prefix='208.67.222.0').count(), 2)
+        self.assertEqual(
+            Tracker.objects.filter(
+                ip_packed__in_network='208.67.0.0/16').count(),
+            3
+        )
+        self.assertEqual(
+            Tracker.objects.filter(
+                ip_packed__in_network='2001:db8::/32').count(),
+            1
+        )
+        self.assertEqual(
+            list(Tracker.objects.order_by('ip_address').values_list(
+                'ip_address', flat=True)),
+            ['208.67.1.1', '208.67.222.220', '208.67.222.222', '2001:db8::1']
+        )
+
+
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class CompactIPAddressesTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+    def test_compact_and_reverse(self):
+        """
+        The command moves the addresses of the existing trackers to the packed
+        columns, and back.
+        """
+        for _ in range(3):
+            Tracker.objects.create_from_request(self.request, self.post)
+
+        with override_settings(TRACKING_ANALYZER_COMPACT_IP_STORAGE=True):
+            call_command(
+                'compact_ip_addresses', chunk_size=2, stdout=mock.Mock())
+
+            self.assertEqual(
+                Tracker.objects.filter(
+                    ip_packed__in_network='208.67.222.0/24').count(),
+                3
+            )
+            self.assertFalse(
+                Tracker._base_manager.filter(
+                    ip_address__isnull=False).exists())
+
+        call_command('compact_ip_addresses', reverse=True, stdout=mock.Mock())
+
+        self.assertEqual(
+            set(Tracker.objects.values_list('ip_address', 'ip_packed')),
+            {('208.67.222.222', None)}
+        )
+
+    def test_setting_mismatch(self):
+        """
+        The command refuses to run against the configured storage layout.
+        """
+        with self.assertRaises(CommandError):
+            call_command('compact_ip_addresses', stdout=mock.Mock())
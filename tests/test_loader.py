@@ -0,0 +1,96 @@
+import csv
+import unittest.mock as mock
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from tracking_analyzer.loader import load_trackers
+from tracking_analyzer.models import Tracker
+from .factories import PostFactory, TrackerFactory
+
+
+class LoadTrackersTestCase(TestCase):
+    def setUp(self):
+        post = PostFactory.create()
+        self.trackers = TrackerFactory.build_batch(
+            5, content_object=post, user=post.user)
+
+    def test_load_trackers_bulk_create(self):
+        """
+        Databases without ``COPY`` support fall back to ``bulk_create``, one
+        query per batch.
+        """
+        with self.assertNumQueries(3):
+            self.assertEqual(load_trackers(self.trackers, batch_size=2), 5)
+
+        self.assertEqual(Tracker.objects.count(), 5)
+
+    def test_load_trackers_copy(self):
+        """
+        On PostgreSQL, each batch is sent with ``COPY`` as CSV, quoting every
+        value but ``NULL`` ones, so they are told apart from empty strings.
+        """
+        self.trackers[0].ip_address = None
+        self.trackers[0].ip_region = ''
+        cursor = mock.MagicMock()
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(connection, 'cursor', return_value=cursor):
+            self.assertEqual(load_trackers(self.trackers, batch_size=3), 5)
+
+        copy_expert = cursor.__enter__.return_value.copy_expert
+        self.assertEqual(copy_expert.call_count, 2)
+        self.assertFalse(Tracker.objects.exists())
+
+        sql, data = copy_expert.call_args_list[0][0]
+        self.assertTrue(sql.startswith(
+            'COPY "tracking_analyzer_tracker" ("content_type_id", '
+            '"object_id", "timestamp", "ip_address", "ip_packed", '
+            '"ip_prefix", "ip_country", "ip_region",'
+        ))
+        self.assertTrue(sql.endswith('FROM STDIN WITH (FORMAT csv)'))
+        self.assertNotIn('"id"', sql)
+
+        lines = data.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn(',,"NL","",', lines[0])
+
+        row = next(csv.reader(lines[1:]))
+        self.assertEqual(row[0], str(self.trackers[1].content_type_id))
+        self.assertEqual(row[1], str(self.trackers[1].object_id))
+        self.assertEqual(row[3], self.trackers[1].ip_address)
+        self.assertEqual(row[-3], '1')
+        self.assertTrue(lines[1].endswith(',"1",,'))
+
+    @skipUnless(connection.vendor == 'postgresql',
+                '``COPY`` is only available on PostgreSQL.')
+    def test_load_trackers_copy_postgresql(self):
+        """
+        The trackers sent with ``COPY`` are saved as they were, telling
+        ``NULL`` values and empty strings apart.
+        """
+        self.trackers[0].ip_address = None
+        self.trackers[0].ip_region = ''
+        fields = ('object_id', 'timestamp', 'ip_address', 'ip_region',
+                  'referrer', 'browser', 'hits', 'sample_weight')
+
+        self.assertEqual(load_trackers(self.trackers, batch_size=3), 5)
+
+        self.assertEqual(
+            list(Tracker.objects.order_by('pk').values_list(*fields)),
+            [tuple(getattr(tracker, field) for field in fields)
+             for tracker in self.trackers]
+        )
+
+    def test_load_trackers_copy_disabled(self):
+        """
+        ``use_copy=False`` always uses ``bulk_create``.
+        """
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch('tracking_analyzer.loader.copy_trackers') as \
+                copy_mock:
+            load_trackers(self.trackers, use_copy=False)
+
+        self.assertFalse(copy_mock.called)
+        self.assertEqual(Tracker.objects.count(), 5)
@@ -1,9 +1,24 @@
+import csv
+import gzip
+import os
+import shutil
+import tempfile
 import unittest.mock as mock
 from urllib.error import HTTPError, URLError
 
 from django.conf import settings
 from django.core.management import call_command, CommandError
 from django.test import override_settings, TestCase
+from django.utils import timezone
+
+from tracking_analyzer.management.commands.archive_trackers import (
+    Command as ArchiveTrackersCommand
+)
+from tracking_analyzer.management.commands.install_geoip_dataset import (
+    Command as InstallGeoIPDatasetCommand
+)
+from tracking_analyzer.models import Checkpoint, Tracker
+from .factories import PostFactory, TrackerFactory, UserFactory
 
 
 class InstallGeoIPDatasetTestCase(TestCase):
@@ -253,3 +268,403 @@ class InstallGeoIPDatasetTestCase(TestCase):
             'Unable to download MaxMind dataset.',
             call_command, 'install_geoip_dataset'
         )
+
+    @mock.patch('tracking_analyzer.management.commands.install_geoip_dataset.'
+                'geoip_reader')
+    def test_uncompress_dataset_replaces_dataset(self, reader_mock):
+        """
+        ``uncompress_dataset`` replaces the installed dataset with the
+        downloaded one and makes the GeoIP reader reload it.
+        """
+        geoip_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, geoip_dir)
+
+        dataset = os.path.join(geoip_dir, 'GeoLite2-City.mmdb')
+        with open(dataset, 'wb') as installed:
+            installed.write(b'old dataset')
+        with gzip.open(dataset + '.gz', 'wb') as downloaded:
+            downloaded.write(b'new dataset')
+
+        target = InstallGeoIPDatasetCommand().uncompress_dataset(
+            dataset + '.gz')
+
+        self.assertEqual(target, dataset)
+        with open(dataset, 'rb') as installed:
+            self.assertEqual(installed.read(), b'new dataset')
+        self.assertEqual(
+            sorted(os.listdir(geoip_dir)),
+            ['GeoLite2-City.mmdb', 'GeoLite2-City.mmdb.gz']
+        )
+        self.assertTrue(reader_mock.reload.called)
+
+
+@mock.patch(
+    'tracking_analyzer.management.commands.geolocate_trackers.geolocate')
+class GeolocateTrackersTestCase(TestCase):
+    def setUp(self):
+        self.pending_1 = TrackerFactory.create(
+            ip_address='208.67.222.222', ip_country='', ip_region='',
+            ip_city='')
+        self.pending_2 = TrackerFactory.create(
+            ip_address='208.67.222.222', ip_country='', ip_region='',
+            ip_city='')
+        self.pending_3 = TrackerFactory.create(
+            ip_address='208.67.222.220', ip_country='', ip_region='',
+            ip_city='')
+        self.located = TrackerFactory.create(
+            ip_address='208.67.222.220', ip_country='NL',
+            ip_region='Noord-Holland', ip_city='Amsterdam')
+        self.no_address = TrackerFactory.create(
+            ip_address=None, ip_country='', ip_region='', ip_city='')
+
+    def test_geolocate_pending_trackers(self, geolocate_mock):
+        """
+        Trackers without geographical info are geolocated, looking up each
+        address once per chunk.
+        """
+        geolocate_mock.return_value = {
+            'country_code': 'US',
+            'region': 'CA',
+            'city': 'San Francisco'
+        }
+
+        call_command('geolocate_trackers', stdout=mock.Mock())
+
+        self.assertEqual(geolocate_mock.call_count, 2)
+        for tracker in (self.pending_1, self.pending_2, self.pending_3):
+            tracker.refresh_from_db()
+            self.assertEqual(tracker.ip_country, 'US')
+            self.assertEqual(tracker.ip_region, 'CA')
+            self.assertEqual(tracker.ip_city, 'San Francisco')
+
+        self.located.refresh_from_db()
+        self.assertEqual(self.located.ip_country, 'NL')
+        self.assertEqual(
+            Tracker.objects.get(pk=self.no_address.pk).ip_country, '')
+
+    def test_geolocate_all_trackers(self, geolocate_mock):
+        """
+        With ``--all``, already geolocated trackers are geolocated again.
+        """
+        geolocate_mock.return_value = {
+            'country_code': 'US',
+            'region': 'CA',
+            'city': 'San Francisco'
+        }
+
+        call_command(
+            'geolocate_trackers', all=True, chunk_size=2,
+            stdout=mock.Mock())
+
+        self.located.refresh_from_db()
+        self.assertEqual(self.located.ip_country, 'US')
+        self.assertEqual(
+            Tracker.objects.filter(ip_city='San Francisco').count(), 4)
+
+    def test_geolocate_unknown_address(self, geolocate_mock):
+        """
+        Trackers whose address can't be geolocated are left untouched.
+        """
+        geolocate_mock.return_value = {}
+
+        call_command('geolocate_trackers', stdout=mock.Mock())
+
+        self.pending_1.refresh_from_db()
+        self.assertEqual(self.pending_1.ip_country, '')
+
+
+class LoadTrackersTestCase(TestCase):
+    def setUp(self):
+        self.post = PostFactory.create()
+
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+
+        self.path = os.path.join(data_dir, 'trackers.csv.gz')
+        with gzip.open(self.path, 'wt', newline='') as data:
+            writer = csv.writer(data)
+            writer.writerow([
+                'id', 'content_type', 'object_id', 'timestamp', 'ip_address',
+                'ip_country', 'device_type', 'browser', 'user',
+                'sample_weight'
+            ])
+            writer.writerow([
+                '10', 'tests.post', self.post.pk, '2016-07-26 23:00:00',
+                '208.67.222.222', 'NL', 'pc', 'Firefox',
+                self.post.user.username, '1'
+            ])
+            writer.writerow([
+                '11', 'tests.post', self.post.pk, '2016-07-26 23:10:00', '',
+                '', 'bot', '', 'unknown_user', '100'
+            ])
+
+    def test_load_trackers(self):
+        """
+        Trackers are loaded from CSV files, resolving content types and users
+        and converting each value to the type of its field.
+        """
+        call_command('load_trackers', self.path, stdout=mock.Mock())
+
+        first, second = Tracker.objects.order_by('timestamp')
+
+        self.assertEqual(first.content_object, self.post)
+        self.assertEqual(first.user, self.post.user)
+        self.assertEqual(
+            first.timestamp, timezone.datetime(2016, 7, 26, 23, 0))
+        self.assertEqual(first.ip_address, '208.67.222.222')
+        self.assertEqual(first.ip_country, 'NL')
+        self.assertEqual(first.browser, 'Firefox')
+
+        self.assertIsNone(second.user)
+        self.assertIsNone(second.ip_address)
+        self.assertEqual(second.device_type, Tracker.BOT)
+        self.assertEqual(second.sample_weight, 100)
+
+    def test_load_trackers_unknown_content_type(self):
+        """
+        Rows of unknown content types make the whole load fail.
+        """
+        path = os.path.join(os.path.dirname(self.path), 'wrong.csv')
+        with open(path, 'w', newline='') as data:
+            data.write('content_type,object_id\ntests.wrong,1\n')
+
+        self.assertRaisesMessage(
+            CommandError,
+            'Unknown content type: tests.wrong',
+            call_command, 'load_trackers', self.path, path,
+            stdout=mock.Mock()
+        )
+        self.assertFalse(Tracker.objects.exists())
+
+    def test_load_trackers_benchmark(self):
+        """
+        The benchmark reports the loading speed without keeping the loaded
+        trackers.
+        """
+        stdout = mock.Mock()
+        call_command(
+            'load_trackers', self.path, benchmark=True, stdout=stdout)
+
+        output = ''.join(call[0][0] for call in stdout.write.call_args_list)
+        self.assertIn('COPY is only available on PostgreSQL.', output)
+        self.assertIn('ORM: 2 trackers in', output)
+        self.assertFalse(Tracker.objects.exists())
+
+
+class PruneTrackersTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.expired = [
+            TrackerFactory.create(timestamp=now - timezone.timedelta(days=40))
+            for _ in range(5)
+        ]
+        self.kept = TrackerFactory.create(
+            timestamp=now - timezone.timedelta(days=10))
+
+    def prune(self, **options):
+        options.setdefault('batch_size', 2)
+        call_command(
+            'prune_trackers', sleep=0, stdout=mock.Mock(), **options)
+
+    def test_prune_expired_trackers(self):
+        """
+        The trackers older than the retention are deleted, in batches.
+        """
+        with mock.patch('tracking_analyzer.management.commands.'
+                        'prune_trackers.time.sleep') as sleep_mock:
+            self.prune(days=30)
+
+        self.assertEqual(list(Tracker.objects.all()), [self.kept])
+        self.assertEqual(sleep_mock.call_count, 3)
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_prune_without_retention(self):
+        """
+        With no retention, every tracker is kept.
+        """
+        self.prune()
+
+        self.assertEqual(Tracker.objects.count(), 6)
+
+    def test_prune_by_content_type(self):
+        """
+        The content types with their own retention are pruned separately.
+        """
+        other = TrackerFactory.create(
+            content_object=UserFactory.create(),
+            timestamp=timezone.now() - timezone.timedelta(days=40)
+        )
+
+        with override_settings(
+                TRACKING_ANALYZER_RETENTION_DAYS_BY_CONTENT_TYPE={
+                    'tests.post': None}):
+            self.prune(days=30)
+
+        self.assertFalse(Tracker.objects.filter(pk=other.pk).exists())
+        self.assertEqual(Tracker.objects.count(), 6)
+
+        with override_settings(
+                TRACKING_ANALYZER_RETENTION_DAYS_BY_CONTENT_TYPE={
+                    'tests.post': 30}):
+            self.prune()
+
+        self.assertEqual(list(Tracker.objects.all()), [self.kept])
+
+    def test_prune_unknown_content_type(self):
+        """
+        The content types of the retention setting must exist.
+        """
+        with override_settings(
+                TRACKING_ANALYZER_RETENTION_DAYS_BY_CONTENT_TYPE={
+                    'tests.unknown': 30}):
+            with self.assertRaisesMessage(
+                    CommandError, 'Unknown content type: tests.unknown'):
+                self.prune()
+
+    def test_prune_resumes(self):
+        """
+        An interrupted run resumes from its checkpoint.
+        """
+        Checkpoint.objects.create(
+            name='prune_trackers:*', position=self.expired[2].pk)
+
+        self.prune(days=30)
+
+        self.assertEqual(
+            list(Tracker.objects.all()),
+            self.expired[:2] + [self.kept]
+        )
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_prune_out_of_order_ids(self):
+        """
+        Trackers loaded late, with newer ids than more recent ones, are
+        pruned too.
+        """
+        backfilled = TrackerFactory.create(
+            timestamp=timezone.now() - timezone.timedelta(days=60))
+
+        self.prune(days=30)
+
+        self.assertFalse(Tracker.objects.filter(pk=backfilled.pk).exists())
+        self.assertEqual(list(Tracker.objects.all()), [self.kept])
+
+
+class ArchiveTrackersTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        now = timezone.now()
+        self.expired = [
+            TrackerFactory.create(timestamp=now - timezone.timedelta(days=40)),
+            TrackerFactory.create(timestamp=now - timezone.timedelta(days=40)),
+            TrackerFactory.create(timestamp=now - timezone.timedelta(days=41)),
+        ]
+        self.kept = TrackerFactory.create(
+            timestamp=now - timezone.timedelta(days=10))
+
+    def archive(self, **options):
+        options.setdefault('format', 'csv')
+        call_command(
+            'archive_trackers', directory=self.directory, days=30,
+            chunk_size=1, stdout=mock.Mock(), **options)
+
+    def get_archives(self):
+        return sorted(
+            os.path.join(path, name)
+            for path, _, names in os.walk(self.directory)
+            for name in names
+        )
+
+    def test_archive_trackers(self):
+        """
+        The expired trackers are archived to a file per day, and kept in the
+        database.
+        """
+        self.archive()
+
+        archives = self.get_archives()
+        self.assertEqual(len(archives), 2)
+        self.assertIn(
+            'day={0}'.format(self.expired[2].timestamp.date().isoformat()),
+            archives[0]
+        )
+        self.assertTrue(archives[1].endswith('trackers-{0}-{1}.csv.gz'.format(
+            self.expired[0].pk, self.expired[1].pk)))
+
+        with gzip.open(archives[1], 'rt') as data:
+            rows = list(csv.DictReader(data))
+        self.assertEqual(rows[0]['content_type'], 'tests.post')
+        self.assertEqual(rows[0]['user'], self.expired[0].user.username)
+        self.assertEqual(rows[1]['ip_address'], self.expired[1].ip_address)
+
+        self.assertEqual(Tracker.objects.count(), 4)
+
+    def test_archive_and_delete(self):
+        """
+        The archived trackers are deleted with ``--delete``, and can be loaded
+        back from the archives.
+        """
+        self.archive(delete=True)
+
+        self.assertEqual(list(Tracker.objects.all()), [self.kept])
+
+        call_command('load_trackers', *self.get_archives(), stdout=mock.Mock())
+
+        self.assertEqual(Tracker.objects.count(), 4)
+        loaded = Tracker.objects.get(timestamp=self.expired[0].timestamp,
+                                     ip_address=self.expired[0].ip_address)
+        self.assertEqual(loaded.user, self.expired[0].user)
+        self.assertEqual(loaded.content_object, self.expired[0].content_object)
+
+    def test_archive_late_commit(self):
+        """
+        Trackers of an archived day and ids range committed after they were
+        read are not deleted.
+        """
+        timestamp = self.expired[0].timestamp
+        late = TrackerFactory.create(timestamp=timestamp)
+        TrackerFactory.create(timestamp=timestamp)
+        # Not committed yet.
+        Tracker.objects.filter(pk=late.pk)._raw_delete('default')
+
+        archive_day = ArchiveTrackersCommand.archive_day
+
+        def archive_and_commit(command, day, *args):
+            ids = archive_day(command, day, *args)
+            if day == timestamp.date():
+                late.save(force_insert=True)
+            return ids
+
+        with mock.patch.object(ArchiveTrackersCommand, 'archive_day',
+                               archive_and_commit):
+            self.archive(delete=True)
+
+        self.assertEqual(
+            set(Tracker.objects.all()), {self.kept, late})
+
+    def test_archive_not_verified(self):
+        """
+        Trackers are not deleted if their archive doesn't match the database.
+        """
+        with mock.patch('tracking_analyzer.archive.CSVArchiveWriter.count',
+                        return_value=0):
+            self.archive(delete=True)
+
+        self.assertEqual(self.get_archives(), [])
+        self.assertEqual(Tracker.objects.count(), 4)
+
+    def test_archive_settings(self):
+        """
+        The command requires a directory and pyarrow for Parquet archives.
+        """
+        with self.assertRaisesMessage(
+                CommandError,
+                '`TRACKING_ANALYZER_ARCHIVE_DIR` setting is not set.'):
+            call_command('archive_trackers', days=30, stdout=mock.Mock())
+
+        with mock.patch('tracking_analyzer.archive.pyarrow', None):
+            with self.assertRaisesMessage(
+                    CommandError, 'Parquet archives require pyarrow'):
+                self.archive(format='parquet')
@@ -0,0 +1,204 @@
+import datetime
+import unittest.mock as mock
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings, TestCase
+
+from tracking_analyzer.matviews import MaterializedViews
+from tracking_analyzer.models import Checkpoint
+from tracking_analyzer.utils import get_dimension_count
+from .factories import TrackerFactory
+
+
+class MaterializedViewsTestCase(TestCase):
+    def setUp(self):
+        self.views = MaterializedViews()
+        self.views.execute = mock.Mock(return_value=[])
+
+    def get_statements(self):
+        return [call[0][0] for call in self.views.execute.call_args_list]
+
+    def test_select_sql(self):
+        """
+        Views add up the daily requests of each object and field value.
+        """
+        self.assertEqual(
+            self.views.get_select_sql('ip_country'),
+            'SELECT "timestamp"::date AS "day", "content_type_id", '
+            '"object_id", "ip_country", SUM("hits" * "sample_weight") AS '
+            '"requests" FROM "tracking_analyzer_tracker" GROUP BY 1, 2, 3, 4'
+        )
+
+    def test_create(self):
+        """
+        The missing views are created, with a unique index.
+        """
+        self.views.execute.return_value = [
+            ('tracking_analyzer_tracker_daily_objects',),
+            ('tracking_analyzer_tracker_daily_countries',),
+        ]
+
+        self.assertEqual(self.views.create(),
+                         ['tracking_analyzer_tracker_daily_devices'])
+        self.assertEqual(
+            self.get_statements()[-1],
+            'CREATE UNIQUE INDEX "tracking_analyzer_tracker_daily_devices_key"'
+            ' ON "tracking_analyzer_tracker_daily_devices" ("day", '
+            '"content_type_id", "object_id", "device_type")'
+        )
+
+    def test_refresh(self):
+        """
+        Views are refreshed concurrently, and the time of the refresh saved.
+        """
+        self.views.refresh(exclude=['tracking_analyzer_tracker_daily_objects'])
+
+        self.assertEqual(self.get_statements(), [
+            'REFRESH MATERIALIZED VIEW CONCURRENTLY '
+            '"tracking_analyzer_tracker_daily_countries"',
+            'REFRESH MATERIALIZED VIEW CONCURRENTLY '
+            '"tracking_analyzer_tracker_daily_devices"',
+        ])
+        self.assertIsNotNone(self.views.get_refreshed())
+
+        self.views.drop()
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_is_fresh(self):
+        """
+        Views are read up to ``max_age`` seconds after their last refresh,
+        only on PostgreSQL.
+        """
+        self.views.set_refreshed()
+        self.assertFalse(self.views.is_fresh())
+
+        self.views.connection = mock.Mock(vendor='postgresql',
+                                          alias='default')
+        self.assertTrue(self.views.is_fresh())
+
+        Checkpoint.objects.update(position=0)
+        self.assertFalse(self.views.is_fresh())
+
+    def test_dimension_count(self):
+        """
+        The requests are read from the view of the field, in whole days.
+        """
+        self.views.get_dimension_count(
+            'device_type', datetime.datetime(2016, 7, 26),
+            object_id=1, content_type_id=2)
+
+        self.views.execute.assert_called_once_with(
+            'SELECT "device_type", SUM("requests") FROM '
+            '"tracking_analyzer_tracker_daily_devices" WHERE "day" >= %s AND '
+            '"content_type_id" = %s AND "object_id" = %s GROUP BY 1 '
+            'ORDER BY 1',
+            [datetime.date(2016, 7, 26), 2, 1]
+        )
+
+
+@override_settings(TRACKING_ANALYZER_MATERIALIZED_VIEWS=True)
+@mock.patch('tracking_analyzer.utils.MaterializedViews.is_fresh',
+            mock.Mock(return_value=True))
+@mock.patch('tracking_analyzer.utils.MaterializedViews.get_dimension_count',
+            mock.Mock(return_value=[('NL', 5)]))
+class ReadMaterializedViewsTestCase(TestCase):
+    def setUp(self):
+        self.day = datetime.datetime(2016, 7, 26)
+        TrackerFactory.create(
+            ip_country='ES', timestamp=self.day + datetime.timedelta(hours=1))
+
+    def test_dimension_count(self):
+        """
+        The requests of whole days are read from the views when fresh.
+        """
+        self.assertEqual(
+            get_dimension_count(
+                'ip_country', self.day, self.day + datetime.timedelta(days=1)),
+            [{'ip_country': 'NL', 'requests': 5}]
+        )
+
+    def test_dimension_count_trackers(self):
+        """
+        Other time ranges and fields are read from the trackers.
+        """
+        self.assertEqual(
+            get_dimension_count('ip_country', self.day,
+                                self.day + datetime.timedelta(hours=2)),
+            [{'ip_country': 'ES', 'requests': 1}]
+        )
+        self.assertEqual(
+            get_dimension_count('browser', self.day),
+            [{'browser': 'Firefox', 'requests': 1}]
+        )
+
+
+class RefreshMaterializedViewsTestCase(TestCase):
+    def test_views_disabled(self):
+        """
+        The command requires the materialized views to be enabled.
+        """
+        with self.assertRaises(CommandError):
+            call_command('refresh_materialized_views', stdout=mock.Mock())
+
+    @override_settings(TRACKING_ANALYZER_MATERIALIZED_VIEWS=True)
+    def test_postgresql_only(self):
+        """
+        The command refuses to run on databases without materialized views.
+        """
+        with self.assertRaises(CommandError):
+            call_command('refresh_materialized_views', stdout=mock.Mock())
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Materialized views are only available on PostgreSQL.')
+@override_settings(TRACKING_ANALYZER_MATERIALIZED_VIEWS=True)
+class PostgreSQLMaterializedViewsTestCase(TestCase):
+    def setUp(self):
+        self.day = datetime.datetime(2016, 7, 26)
+        self.tracker = TrackerFactory.create(
+            ip_country='ES', timestamp=self.day + datetime.timedelta(hours=1))
+
+    def test_refresh_materialized_views(self):
+        """
+        The views count the daily requests, and are refreshed concurrently
+        with the new trackers.
+        """
+        call_command('refresh_materialized_views', stdout=mock.Mock())
+        TrackerFactory.create(
+            content_object=self.tracker.content_object, ip_country='ES',
+            timestamp=self.day + datetime.timedelta(hours=2))
+        TrackerFactory.create(
+            ip_country='NL', timestamp=self.day - datetime.timedelta(hours=1))
+        call_command('refresh_materialized_views', stdout=mock.Mock())
+
+        self.assertEqual(
+            MaterializedViews().get_dimension_count(
+                'ip_country', self.day, self.day + datetime.timedelta(days=1)),
+            [('ES', 2)]
+        )
+        self.assertEqual(
+            get_dimension_count('ip_country', self.day),
+            [{'ip_country': 'ES', 'requests': 2}]
+        )
+
+    @override_settings(TRACKING_ANALYZER_PARTITION_INTERVAL='month')
+    def test_partition_trackers(self):
+        """
+        Partitioning the trackers table creates the views again on the
+        partitioned table.
+        """
+        if connection.pg_version < 110000:
+            self.skipTest('Partitioning requires PostgreSQL 11 or later.')
+
+        call_command('refresh_materialized_views', stdout=mock.Mock())
+        call_command('partition_trackers', convert=True, stdout=mock.Mock())
+
+        views = MaterializedViews()
+        self.assertTrue(views.is_fresh())
+        for (definition,) in views.execute(
+                'SELECT definition FROM pg_matviews WHERE matviewname '
+                'LIKE %s', ['tracking_analyzer_tracker_daily_%']):
+            self.assertNotIn('_legacy', definition)
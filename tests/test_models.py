@@ -1,11 +1,21 @@
+import asyncio
+import threading
+import time
 import unittest.mock as mock
 
+from asgiref.sync import async_to_sync
+
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.gis.geoip2 import GeoIP2Exception
-from django.test import TestCase
+from django.test import override_settings, TestCase
+from django.utils import timezone
 
 from geoip2.errors import GeoIP2Error
 
+from tracking_analyzer.agents import user_agent_cache
+from tracking_analyzer.geoip import geoip_cache, geoip_reader
+from tracking_analyzer.manager import RequestRecord, TrackerManager
 from tracking_analyzer.models import Tracker
 from .models import Post
 from .utils import build_mock_request
@@ -28,7 +38,16 @@ class TrackerTestCase(TestCase):
 
         self.request = build_mock_request('/testing/')
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+        # Make sure each test gets its own (mocked) `GeoIP2` instance and no
+        # cached geolocation nor user agent results.
+        geoip_reader.close()
+        geoip_cache.clear()
+        user_agent_cache.clear()
+        self.addCleanup(geoip_reader.close)
+        self.addCleanup(geoip_cache.clear)
+        self.addCleanup(user_agent_cache.clear)
+
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     def test_create_from_request_manager(self, mock_geoip2):
         """
         Tests the ``create_from_request`` method from the custom
@@ -56,7 +75,7 @@ class TrackerTestCase(TestCase):
         self.assertEqual(tracker.object_id, self.post.pk)
         self.assertEqual(tracker.user, self.request.user)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     def test_create_from_request_manager_null_data(self, mock_geoip2):
         """
         Tests the ``create_from_request`` method from the custom
@@ -84,6 +103,21 @@ class TrackerTestCase(TestCase):
         self.assertEqual(tracker.object_id, self.post.pk)
         self.assertEqual(tracker.user, self.request.user)
 
+    @override_settings(TRACKING_ANALYZER_DEFER_GEOLOCATION=True)
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
+    def test_create_from_request_deferred_geolocation(self, mock_geoip2):
+        """
+        With deferred geolocation, the IP address is stored but it is not
+        geolocated.
+        """
+        tracker = Tracker.objects.create_from_request(self.request, self.post)
+
+        self.assertEqual(tracker.ip_address, '208.67.222.222')
+        self.assertEqual(tracker.ip_country, '')
+        self.assertEqual(tracker.ip_region, '')
+        self.assertEqual(tracker.ip_city, '')
+        self.assertFalse(mock_geoip2.called)
+
     def test_create_from_request_manager_wrong_request(self):
         """
         Tests sanity checks for ``HTTPRequest`` object in the custom manager
@@ -108,7 +142,7 @@ class TrackerTestCase(TestCase):
             self.request, 'NOT_A_MODEL'
         )
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     def test_create_from_request_missing_geoip_data(self, mock_geoip2):
         """
         If GeoIP data is not available, or the ``GeoIP2.city`` function fails,
@@ -131,7 +165,7 @@ class TrackerTestCase(TestCase):
         # And `GeoIP2` should have been never called.
         self.assertFalse(mock_geoip2().city.called)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     def test_create_from_request_django_geoip_exception(self, mock_geoip2):
         """
         Tests Django ``contrib.gis.geoip2.GeoIP2Exception`` handling.
@@ -146,7 +180,7 @@ class TrackerTestCase(TestCase):
         self.assertEqual(tracker.ip_region, '')
         self.assertEqual(tracker.ip_city, '')
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     def test_create_from_request_geoip2_exception(self, mock_geoip2):
         """
         Tests Django ``geoip2.GeoIP2Error`` handling.
@@ -161,7 +195,7 @@ class TrackerTestCase(TestCase):
         self.assertEqual(tracker.ip_region, '')
         self.assertEqual(tracker.ip_city, '')
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     @mock.patch(
         'user_agents.parsers.UserAgent.is_pc', new_callable=mock.PropertyMock)
     def test_create_from_request_is_pc(self, agent_mock, geoip2_mock):
@@ -181,7 +215,7 @@ class TrackerTestCase(TestCase):
 
         self.assertEqual(tracker.device_type, Tracker.PC)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     @mock.patch(
         'user_agents.parsers.UserAgent.is_mobile',
         new_callable=mock.PropertyMock)
@@ -202,7 +236,7 @@ class TrackerTestCase(TestCase):
 
         self.assertEqual(tracker.device_type, Tracker.MOBILE)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     @mock.patch(
         'user_agents.parsers.UserAgent.is_tablet',
         new_callable=mock.PropertyMock)
@@ -223,7 +257,7 @@ class TrackerTestCase(TestCase):
 
         self.assertEqual(tracker.device_type, Tracker.TABLET)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     @mock.patch(
         'user_agents.parsers.UserAgent.is_pc', new_callable=mock.PropertyMock)
     @mock.patch(
@@ -246,7 +280,7 @@ class TrackerTestCase(TestCase):
 
         self.assertEqual(tracker.device_type, Tracker.BOT)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     @mock.patch(
         'user_agents.parsers.UserAgent.is_pc', new_callable=mock.PropertyMock)
     @mock.patch(
@@ -280,7 +314,7 @@ class TrackerTestCase(TestCase):
 
         self.assertEqual(tracker.device_type, Tracker.UNKNOWN)
 
-    @mock.patch('tracking_analyzer.manager.GeoIP2')
+    @mock.patch('tracking_analyzer.geoip.GeoIP2')
     def test_create_from_request_wrong_user_agent(self, mock_geoip2):
         """
         Tests the ``create_from_request`` method with a wrong user agent.
@@ -310,3 +344,204 @@ class TrackerTestCase(TestCase):
         self.assertEqual(tracker.ip_city, 'San Francisco')
         self.assertEqual(tracker.object_id, self.post.pk)
         self.assertEqual(tracker.user, self.request.user)
+
+
+class AsyncTrackerTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+    @mock.patch('tracking_analyzer.manager.geolocate')
+    def test_acreate_from_request(self, geolocate_mock):
+        """
+        Tests the ``acreate_from_request`` method from the custom
+        ``TrackerManager`` in a successful execution.
+        """
+        geolocate_mock.return_value = {
+            'country_code': 'US',
+            'region': 'CA',
+            'city': 'San Francisco'
+        }
+
+        tracker = async_to_sync(Tracker.objects.acreate_from_request)(
+            self.request, self.post)
+
+        tracker.refresh_from_db()
+        self.assertEqual(tracker.browser, 'Chrome')
+        self.assertEqual(tracker.device_type, Tracker.PC)
+        self.assertEqual(tracker.ip_address, '208.67.222.222')
+        self.assertEqual(tracker.ip_country, 'US')
+        self.assertEqual(tracker.ip_city, 'San Francisco')
+        self.assertEqual(tracker.content_object, self.post)
+        self.assertEqual(tracker.user, self.request.user)
+
+    @mock.patch('tracking_analyzer.manager.geolocate')
+    def test_acreate_from_request_does_not_block_event_loop(
+        self, geolocate_mock
+    ):
+        """
+        A slow geolocation does not block the event loop: other coroutines
+        keep running while the request is being tracked, and the lookup runs
+        outside the event loop thread.
+        """
+        lookup_threads = []
+
+        def slow_geolocate(ip_address):
+            lookup_threads.append(threading.current_thread())
+            time.sleep(0.3)
+            return {}
+
+        geolocate_mock.side_effect = slow_geolocate
+        ticks = []
+
+        async def ticker(done):
+            while not done.is_set():
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def track():
+            done = asyncio.Event()
+            ticking = asyncio.ensure_future(ticker(done))
+            tracker = await Tracker.objects.acreate_from_request(
+                self.request, self.post)
+            done.set()
+            await ticking
+
+            return tracker, threading.current_thread()
+
+        tracker, loop_thread = async_to_sync(track)()
+
+        self.assertIsNotNone(tracker.pk)
+        self.assertNotEqual(lookup_threads, [loop_thread])
+        self.assertTrue(
+            lookup_threads[0].name.startswith('tracking-analyzer-async'))
+        # The loop kept ticking every ~10ms during the 300ms lookup.
+        self.assertGreater(len(ticks), 10)
+
+    @mock.patch('tracking_analyzer.manager.heavy_hitters')
+    @mock.patch('tracking_analyzer.manager.geolocate', return_value={})
+    def test_acreate_from_request_heavy_hitters(
+        self, geolocate_mock, heavy_hitters_mock
+    ):
+        """
+        Requests saved with the asynchronous ORM are counted in the heavy
+        hitters too.
+        """
+        async def acreate(**values):
+            return Tracker(**values)
+
+        with mock.patch.object(
+                TrackerManager, 'acreate', side_effect=acreate, create=True):
+            tracker = async_to_sync(Tracker.objects.acreate_from_request)(
+                self.request, self.post)
+
+        heavy_hitters_mock.add.assert_called_once_with(mock.ANY)
+        self.assertEqual(
+            heavy_hitters_mock.add.call_args[0][0]['object_id'], self.post.pk)
+        self.assertEqual(tracker.content_object, self.post)
+
+    def test_acreate_from_request_wrong_request(self):
+        """
+        Tests sanity checks for ``HTTPRequest`` object in the asynchronous
+        manager method.
+        """
+        self.assertRaisesMessage(
+            AssertionError,
+            '`request` object is not an `HTTPRequest`',
+            async_to_sync(Tracker.objects.acreate_from_request),
+            'NOT_A_REQUEST', self.post
+        )
+
+
+class BulkCreateFromRequestsTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.user = self.request.user
+        self.post_1 = Post.objects.create(
+            user=self.user, title='Post 1', body='The first post.')
+        self.post_2 = Post.objects.create(
+            user=self.user, title='Post 2', body='The second post.')
+
+        self.record = RequestRecord(
+            ip_address='208.67.222.220',
+            user_agent='Mozilla/5.0 (iPhone; CPU iPhone OS 13_5 like Mac OS X)'
+                       ' AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.1'
+                       '.1 Mobile/15E148 Safari/604.1',
+            referrer='https://www.maykinmedia.nl/',
+            user_id=None,
+            timestamp=timezone.now() - timezone.timedelta(days=1)
+        )
+
+    @mock.patch('tracking_analyzer.manager.geolocate')
+    def test_bulk_create_from_requests(self, geolocate_mock):
+        """
+        Requests and request records are saved in batches, geolocating each
+        address once per batch.
+        """
+        geolocate_mock.return_value = {
+            'country_code': 'US',
+            'region': 'CA',
+            'city': 'San Francisco'
+        }
+        items = [
+            (self.request, self.post_1),
+            (self.record, self.post_2),
+            (self.request, self.post_2),
+            (self.record, self.user),
+            (self.record, self.post_1),
+        ]
+
+        # One query per content type and one per batch.
+        ContentType.objects.clear_cache()
+        with self.assertNumQueries(4):
+            created = Tracker.objects.bulk_create_from_requests(
+                iter(items), batch_size=3)
+
+        self.assertEqual(created, 5)
+        self.assertEqual(Tracker.objects.count(), 5)
+        # Two distinct addresses in the first batch, one in the second.
+        self.assertEqual(geolocate_mock.call_count, 3)
+
+        tracker = Tracker.objects.filter(device_type=Tracker.MOBILE).first()
+        self.assertEqual(tracker.timestamp, self.record.timestamp)
+        self.assertEqual(tracker.ip_address, '208.67.222.220')
+        self.assertEqual(tracker.ip_city, 'San Francisco')
+        self.assertEqual(tracker.referrer, 'https://www.maykinmedia.nl/')
+        self.assertEqual(tracker.system, 'iOS')
+        self.assertIsNone(tracker.user)
+
+        tracker = Tracker.objects.filter(device_type=Tracker.PC).first()
+        self.assertEqual(tracker.ip_address, '208.67.222.222')
+        self.assertEqual(tracker.browser, 'Chrome')
+        self.assertEqual(tracker.user, self.user)
+
+        self.assertEqual(
+            sorted(
+                str(tracker.content_object)
+                for tracker in Tracker.objects.all()
+            ),
+            ['Post 1', 'Post 1', 'Post 2', 'Post 2', 'test_user']
+        )
+
+    def test_bulk_create_from_requests_empty(self):
+        """
+        Nothing is saved for no requests.
+        """
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                Tracker.objects.bulk_create_from_requests([]), 0)
+
+    def test_bulk_create_from_requests_wrong_request(self):
+        """
+        Tests sanity checks for the requests in the bulk manager method.
+        """
+        self.assertRaisesMessage(
+            AssertionError,
+            '`request` object is not an `HTTPRequest` nor a `RequestRecord`',
+            Tracker.objects.bulk_create_from_requests,
+            [('NOT_A_REQUEST', self.post_1)]
+        )
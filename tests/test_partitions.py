@@ -0,0 +1,323 @@
+import datetime
+import unittest.mock as mock
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.test import override_settings, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from tracking_analyzer.matviews import MaterializedViews
+from tracking_analyzer.models import Tracker
+from tracking_analyzer.partitions import (
+    get_next_period, get_period_start, parse_bound, TrackerPartitions)
+from .factories import TrackerFactory
+
+
+UTC = datetime.timezone.utc
+
+
+class PeriodsTestCase(SimpleTestCase):
+    def test_period_start(self):
+        """
+        Periods start at midnight UTC of the first day of the month, or of
+        the day.
+        """
+        value = datetime.datetime(
+            2016, 7, 15, 1, 30, tzinfo=datetime.timezone(
+                datetime.timedelta(hours=2)))
+
+        self.assertEqual(
+            get_period_start(value, 'month'),
+            datetime.datetime(2016, 7, 1, tzinfo=UTC)
+        )
+        self.assertEqual(
+            get_period_start(value, 'day'),
+            datetime.datetime(2016, 7, 14, tzinfo=UTC)
+        )
+
+    def test_next_period(self):
+        """
+        Periods are moved forward and backwards across years.
+        """
+        start = datetime.datetime(2016, 12, 1, tzinfo=UTC)
+
+        self.assertEqual(
+            get_next_period(start, 'month'),
+            datetime.datetime(2017, 1, 1, tzinfo=UTC)
+        )
+        self.assertEqual(
+            get_next_period(start, 'month', -12),
+            datetime.datetime(2015, 12, 1, tzinfo=UTC)
+        )
+        self.assertEqual(
+            get_next_period(start, 'day', -1),
+            datetime.datetime(2016, 11, 30, tzinfo=UTC)
+        )
+
+    def test_parse_bound(self):
+        """
+        Partition bounds are parsed as aware datetimes.
+        """
+        self.assertIsNone(parse_bound('MINVALUE'))
+        self.assertEqual(
+            parse_bound("'2016-07-01 00:00:00+00'"),
+            datetime.datetime(2016, 7, 1, tzinfo=UTC)
+        )
+
+
+@override_settings(TRACKING_ANALYZER_PARTITION_INTERVAL='month')
+@mock.patch('tracking_analyzer.partitions.timezone.now', mock.Mock(
+    return_value=datetime.datetime(2016, 7, 15, tzinfo=UTC)))
+class TrackerPartitionsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.partitions = TrackerPartitions()
+        self.partitions.execute = mock.Mock(return_value=[])
+        self.partitions.get_partitions = mock.Mock(return_value=[
+            ('tracking_analyzer_tracker_legacy', None,
+             datetime.datetime(2016, 8, 1, tzinfo=UTC)),
+            ('tracking_analyzer_tracker_p201608',
+             datetime.datetime(2016, 8, 1, tzinfo=UTC),
+             datetime.datetime(2016, 9, 1, tzinfo=UTC)),
+            ('tracking_analyzer_tracker_default', None, None),
+        ])
+
+    @mock.patch('tracking_analyzer.partitions.transaction')
+    def test_create_partitions(self, transaction_mock):
+        """
+        The partitions of the periods not covered yet are created, with the
+        trackers of their range moved out of the default partition.
+        """
+        self.assertEqual(
+            self.partitions.create_partitions(3),
+            ['tracking_analyzer_tracker_p201609',
+             'tracking_analyzer_tracker_p201610']
+        )
+
+        period = [datetime.datetime(2016, 10, 1, tzinfo=UTC),
+                  datetime.datetime(2016, 11, 1, tzinfo=UTC)]
+        self.assertEqual(self.partitions.execute.call_args_list[3:], [
+            mock.call('CREATE TABLE "tracking_analyzer_tracker_p201610" '
+                      '(LIKE "tracking_analyzer_tracker" INCLUDING DEFAULTS)'),
+            mock.call('WITH moved AS (DELETE FROM '
+                      '"tracking_analyzer_tracker_default" WHERE "timestamp" '
+                      '>= %s AND "timestamp" < %s RETURNING *) INSERT INTO '
+                      '"tracking_analyzer_tracker_p201610" SELECT * FROM '
+                      'moved', period),
+            mock.call('ALTER TABLE "tracking_analyzer_tracker" ATTACH '
+                      'PARTITION "tracking_analyzer_tracker_p201610" FOR '
+                      'VALUES FROM (%s) TO (%s)', period),
+        ])
+        self.assertEqual(transaction_mock.atomic.call_count, 2)
+
+    def test_expire_partitions(self):
+        """
+        The partitions older than the retention are detached, and dropped if
+        asked to.
+        """
+        self.assertEqual(self.partitions.expire_partitions(1), [])
+
+        self.partitions.get_partitions.return_value[1] = (
+            'tracking_analyzer_tracker_p201605',
+            datetime.datetime(2016, 5, 1, tzinfo=UTC),
+            datetime.datetime(2016, 6, 1, tzinfo=UTC)
+        )
+        self.assertEqual(
+            self.partitions.expire_partitions(1, drop=True),
+            ['tracking_analyzer_tracker_p201605']
+        )
+        self.assertEqual(
+            [call[0][0] for call in self.partitions.execute.call_args_list],
+            ['ALTER TABLE "tracking_analyzer_tracker" DETACH PARTITION '
+             '"tracking_analyzer_tracker_p201605"',
+             'DROP TABLE "tracking_analyzer_tracker_p201605"']
+        )
+
+    @mock.patch('tracking_analyzer.partitions.MaterializedViews')
+    @mock.patch('tracking_analyzer.partitions.transaction')
+    def test_convert(self, transaction_mock, views_mock):
+        """
+        The existing rows are checked against the range of their partition
+        before locking the table, so attaching it doesn't scan them.
+        """
+        def execute(sql, params=None):
+            if 'VALIDATE CONSTRAINT' in sql:
+                # The table is not locked yet.
+                self.assertFalse(transaction_mock.atomic.called)
+
+            return [] if 'pg_indexes' in sql else [[None]]
+
+        self.partitions.execute.side_effect = execute
+        self.partitions.get_index_sql = mock.Mock(return_value=[])
+
+        views_mock.return_value.get_existing_views.return_value = set()
+
+        with mock.patch.object(
+                self.partitions, 'connection') as connection_mock:
+            connection_mock.ops.quote_name = connection.ops.quote_name
+            self.assertEqual(self.partitions.convert(), [])
+
+        statements = [
+            call[0][0] for call in self.partitions.execute.call_args_list]
+        check = statements.index(
+            'ALTER TABLE "tracking_analyzer_tracker" ADD CONSTRAINT '
+            '"tracking_analyzer_tracker_legacy_bound" CHECK ("timestamp" < '
+            '%s) NOT VALID')
+
+        self.assertEqual(
+            statements[check + 1],
+            'ALTER TABLE "tracking_analyzer_tracker" VALIDATE CONSTRAINT '
+            '"tracking_analyzer_tracker_legacy_bound"')
+        self.assertEqual(
+            self.partitions.execute.call_args_list[check][0][1],
+            [datetime.datetime(2016, 8, 1, tzinfo=UTC)])
+        transaction_mock.atomic.assert_called_once_with(
+            using=connection_mock.alias)
+        views_mock.return_value.drop.assert_not_called()
+
+    @mock.patch('tracking_analyzer.partitions.MaterializedViews')
+    @mock.patch('tracking_analyzer.partitions.transaction')
+    def test_convert_materialized_views(self, transaction_mock, views_mock):
+        """
+        The materialized views are dropped with the table locked, not to read
+        the legacy partition only, and created again once it is unlocked.
+        """
+        atomic = transaction_mock.atomic.return_value
+        views = views_mock.return_value
+        views.get_view_name.side_effect = MaterializedViews().get_view_name
+        views.get_existing_views.return_value = {
+            'tracking_analyzer_tracker_daily_countries', 'other_view'}
+
+        def drop():
+            self.assertTrue(atomic.__enter__.called)
+            self.assertFalse(atomic.__exit__.called)
+
+        def create():
+            self.assertTrue(atomic.__exit__.called)
+            return ['tracking_analyzer_tracker_daily_countries']
+
+        views.drop.side_effect = drop
+        views.create.side_effect = create
+        self.partitions.execute.side_effect = \
+            lambda sql, params=None: [] if 'pg_indexes' in sql else [[None]]
+        self.partitions.get_index_sql = mock.Mock(return_value=[])
+
+        with mock.patch.object(
+                self.partitions, 'connection') as connection_mock:
+            connection_mock.ops.quote_name = connection.ops.quote_name
+            self.assertEqual(self.partitions.convert(),
+                             ['tracking_analyzer_tracker_daily_countries'])
+
+        views.drop.assert_called_once_with()
+        views.set_refreshed.assert_called_once_with()
+
+    def test_index_sql(self):
+        """
+        The indexes and foreign keys of the model are created again on the
+        partitioned table.
+        """
+        editor = connection.schema_editor()
+        # SQLite declares the foreign keys with the columns.
+        editor.sql_create_fk = BaseDatabaseSchemaEditor.sql_create_fk
+
+        statements = ' '.join(
+            str(statement)
+            for statement in self.partitions.get_index_sql(editor))
+
+        self.assertIn('"tracker_object_idx"', statements)
+        self.assertIn('"ip_packed"', statements)
+        self.assertIn('REFERENCES "django_content_type"', statements)
+
+
+class PartitionTrackersTestCase(TestCase):
+    def test_partitioning_disabled(self):
+        """
+        The command requires the partitioning interval.
+        """
+        with self.assertRaises(CommandError):
+            call_command('partition_trackers', stdout=mock.Mock())
+
+    @override_settings(TRACKING_ANALYZER_PARTITION_INTERVAL='day')
+    def test_postgresql_only(self):
+        """
+        The command refuses to run on databases without partitioning.
+        """
+        with self.assertRaises(CommandError):
+            call_command('partition_trackers', stdout=mock.Mock())
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Partitioning is only available on PostgreSQL.')
+@override_settings(TRACKING_ANALYZER_PARTITION_INTERVAL='month')
+class PostgreSQLPartitionsTestCase(TestCase):
+    def setUp(self):
+        if connection.pg_version < 110000:
+            self.skipTest('Partitioning requires PostgreSQL 11 or later.')
+
+        self.tracker = TrackerFactory.create()
+        self.partitions = TrackerPartitions()
+        self.partitions.convert()
+
+    def get_partition(self, tracker):
+        """
+        Returns the name of the partition a tracker is stored in.
+        """
+        return self.partitions.execute(
+            'SELECT tableoid::regclass::text FROM '
+            '"tracking_analyzer_tracker" WHERE "id" = %s', [tracker.pk]
+        )[0][0]
+
+    def test_convert(self):
+        """
+        The existing trackers are kept in the legacy partition, without the
+        constraint checking its range, and the table is read as usual.
+        """
+        self.assertTrue(self.partitions.is_partitioned())
+        self.assertEqual(
+            [name for name, _, _ in self.partitions.get_partitions()],
+            ['tracking_analyzer_tracker_default',
+             'tracking_analyzer_tracker_legacy']
+        )
+        self.assertEqual(self.get_partition(self.tracker),
+                         'tracking_analyzer_tracker_legacy')
+        self.assertFalse(self.partitions.execute(
+            'SELECT conname FROM pg_constraint WHERE conname = %s',
+            ['tracking_analyzer_tracker_legacy_bound']))
+
+        tracker = TrackerFactory.create()
+        self.assertEqual(
+            set(Tracker.objects.values_list('pk', flat=True)),
+            {self.tracker.pk, tracker.pk}
+        )
+
+    def test_create_partitions(self):
+        """
+        The trackers saved in the default partition are moved into the
+        partition of their period when it is created.
+        """
+        start = get_next_period(
+            get_period_start(timezone.now(), 'month'), 'month', 2)
+        tracker = TrackerFactory.create(timestamp=timezone.make_naive(
+            start + datetime.timedelta(days=10)))
+        self.assertEqual(self.get_partition(tracker),
+                         'tracking_analyzer_tracker_default')
+
+        self.assertIn(self.partitions.get_partition_name(start),
+                      self.partitions.create_partitions(3))
+        self.assertEqual(self.get_partition(tracker),
+                         self.partitions.get_partition_name(start))
+        self.assertEqual(Tracker.objects.count(), 2)
+
+    def test_expire_partitions(self):
+        """
+        Partitions older than the retention are dropped with their trackers.
+        """
+        with mock.patch('tracking_analyzer.partitions.timezone.now',
+                        return_value=timezone.now() + datetime.timedelta(
+                            days=95)):
+            self.assertIn('tracking_analyzer_tracker_legacy',
+                          self.partitions.expire_partitions(1, drop=True))
+
+        self.assertFalse(Tracker.objects.filter(pk=self.tracker.pk).exists())
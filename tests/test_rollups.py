@@ -0,0 +1,377 @@
+import datetime
+import json
+import unittest.mock as mock
+
+from django.contrib.admin import AdminSite
+from django.core.management import call_command, CommandError
+from django.db import transaction
+from django.test import override_settings, RequestFactory, SimpleTestCase, \
+    TestCase
+from django.urls import reverse
+
+from tracking_analyzer.admin import TrackerAdmin
+from tracking_analyzer.models import (
+    Checkpoint, CheckpointGap, Tracker, TrackerRollup)
+from tracking_analyzer.rollups import (
+    get_bucket, get_bucket_start, get_high_water_mark, get_rollup_requests,
+    split_gap, update_rollups)
+from tracking_analyzer.utils import get_dimension_count, get_requests_count
+from .factories import PostFactory, TrackerFactory, UserFactory
+
+
+UTC = datetime.timezone.utc
+
+
+class BucketsTestCase(SimpleTestCase):
+    def test_bucket_start(self):
+        """
+        Buckets start at whole minutes, hours and days, in UTC.
+        """
+        value = datetime.datetime(
+            2016, 7, 26, 1, 15, 30, tzinfo=datetime.timezone(
+                datetime.timedelta(hours=2)))
+
+        self.assertEqual(
+            get_bucket_start(value, 'minute'),
+            datetime.datetime(2016, 7, 25, 23, 15, tzinfo=UTC)
+        )
+        self.assertEqual(
+            get_bucket_start(value, 'hour'),
+            datetime.datetime(2016, 7, 25, 23, tzinfo=UTC)
+        )
+        self.assertEqual(
+            get_bucket_start(value, 'day'),
+            datetime.datetime(2016, 7, 25, tzinfo=UTC)
+        )
+
+    def test_bucket(self):
+        """
+        The coarsest bucket matching both ends of a time range is used.
+        """
+        day = datetime.datetime(2016, 7, 26)
+
+        self.assertEqual(get_bucket(), 'day')
+        self.assertEqual(get_bucket(day, day + datetime.timedelta(days=1)),
+                         'day')
+        self.assertEqual(get_bucket(day, day + datetime.timedelta(hours=1)),
+                         'hour')
+        self.assertEqual(get_bucket(day + datetime.timedelta(minutes=1)),
+                         'minute')
+        self.assertIsNone(get_bucket(end=day + datetime.timedelta(seconds=1)))
+
+    def test_split_gap(self):
+        """
+        The ids read are taken out of a gap.
+        """
+        self.assertEqual(split_gap(1, 10, [1, 4, 5, 8]),
+                         [(2, 3), (6, 7), (9, 10)])
+        self.assertEqual(split_gap(1, 3, [1, 2, 3]), [])
+
+
+class UpdateRollupsTestCase(TestCase):
+    def setUp(self):
+        self.day = datetime.datetime(2016, 7, 26)
+        post = PostFactory.create()
+        self.trackers = [
+            TrackerFactory.create(
+                content_object=post, device_type=Tracker.PC, ip_country='NL',
+                sample_weight=2,
+                timestamp=self.day + datetime.timedelta(hours=10, seconds=30)),
+            TrackerFactory.create(
+                content_object=post, device_type=Tracker.MOBILE,
+                ip_country='ES', hits=3,
+                timestamp=self.day + datetime.timedelta(hours=10, seconds=50)),
+            TrackerFactory.create(
+                content_object=post, device_type=Tracker.PC, ip_country='NL',
+                timestamp=self.day + datetime.timedelta(hours=11)),
+        ]
+
+    def get_requests(self, bucket, field, value, timestamp):
+        """
+        Returns the requests of a rollup row.
+        """
+        return TrackerRollup.objects.get(
+            bucket=bucket, dimension=field, value=value,
+            timestamp=timestamp).requests
+
+    def test_update_rollups(self):
+        """
+        The requests of the trackers are counted in every bucket and field,
+        up to the high-water mark.
+        """
+        self.assertEqual(update_rollups(lag=0), 3)
+
+        self.assertEqual(get_high_water_mark(), self.trackers[2].pk)
+        self.assertEqual(
+            self.get_requests('minute', 'device_type', Tracker.PC,
+                              self.day + datetime.timedelta(hours=10)),
+            2
+        )
+        self.assertEqual(
+            self.get_requests('day', 'device_type', Tracker.PC, self.day), 3)
+        self.assertEqual(
+            self.get_requests('hour', 'ip_country', 'ES',
+                              self.day + datetime.timedelta(hours=10)),
+            3
+        )
+        self.assertEqual(
+            self.get_requests('day', 'browser', 'Firefox', self.day), 6)
+
+    def test_late_trackers(self):
+        """
+        Trackers saved after a run are counted once in the next one, even in
+        old buckets.
+        """
+        update_rollups(lag=0)
+        TrackerFactory.create(
+            content_object=self.trackers[0].content_object,
+            device_type=Tracker.PC,
+            timestamp=self.day + datetime.timedelta(hours=10, seconds=5))
+
+        self.assertEqual(update_rollups(lag=0), 1)
+        self.assertEqual(update_rollups(lag=0), 0)
+        self.assertEqual(
+            self.get_requests('minute', 'device_type', Tracker.PC,
+                              self.day + datetime.timedelta(hours=10)),
+            3
+        )
+
+    def test_lag(self):
+        """
+        Reading stops at the first tracker saved in the last ``lag`` seconds.
+        """
+        recent = TrackerFactory.create()
+        TrackerFactory.create(timestamp=self.day)
+
+        self.assertEqual(update_rollups(lag=60, batch_size=2), 3)
+        self.assertEqual(get_high_water_mark(), recent.pk - 1)
+
+    def test_late_commit(self):
+        """
+        Trackers committed after the high-water mark passed their ids are
+        read from the trackers, then counted by the next run.
+        """
+        late = self.trackers[1]
+        # Not committed yet.
+        Tracker.objects.filter(pk=late.pk)._raw_delete('default')
+
+        self.assertEqual(update_rollups(lag=0), 2)
+        self.assertEqual(get_high_water_mark(), self.trackers[2].pk)
+        self.assertTrue(CheckpointGap.objects.filter(
+            start__lte=late.pk, end__gte=late.pk).exists())
+
+        late.save(force_insert=True)
+        self.assertEqual(get_rollup_requests('ip_country', self.day)['ES'], 3)
+
+        self.assertEqual(update_rollups(lag=0), 1)
+        self.assertEqual(update_rollups(lag=0), 0)
+        self.assertFalse(CheckpointGap.objects.filter(
+            start__lte=late.pk, end__gte=late.pk).exists())
+        self.assertEqual(
+            self.get_requests('hour', 'ip_country', 'ES',
+                              self.day + datetime.timedelta(hours=10)),
+            3
+        )
+
+    def run_overlapping(self):
+        """
+        Runs ``update_rollups``, with another run starting and ending right
+        before the first batch transaction.
+        """
+        atomic = transaction.atomic
+        overlapped = []
+
+        def overlapping_atomic(*args, **kwargs):
+            if not overlapped:
+                overlapped.append(0)
+                overlapped[0] = update_rollups(lag=0)
+            return atomic(*args, **kwargs)
+
+        with mock.patch('tracking_analyzer.rollups.transaction.atomic',
+                        overlapping_atomic):
+            read = update_rollups(lag=0)
+
+        return overlapped[0] + read
+
+    def test_overlapping_runs(self):
+        """
+        Trackers read by overlapping runs are counted once.
+        """
+        Checkpoint.objects.create(name='rollups')
+
+        self.assertEqual(self.run_overlapping(), 3)
+        self.assertEqual(
+            self.get_requests('hour', 'ip_country', 'ES',
+                              self.day + datetime.timedelta(hours=10)),
+            3
+        )
+
+    def test_overlapping_runs_gaps(self):
+        """
+        Trackers committed late and read by overlapping runs are counted
+        once.
+        """
+        late = self.trackers[1]
+        Tracker.objects.filter(pk=late.pk)._raw_delete('default')
+        update_rollups(lag=0)
+        late.save(force_insert=True)
+
+        self.assertEqual(self.run_overlapping(), 1)
+        self.assertEqual(
+            self.get_requests('hour', 'ip_country', 'ES',
+                              self.day + datetime.timedelta(hours=10)),
+            3
+        )
+
+    @override_settings(TRACKING_ANALYZER_ROLLUPS_GAP_TIMEOUT=0)
+    def test_gap_timeout(self):
+        """
+        The ids passed by are forgotten after the gap timeout.
+        """
+        Tracker.objects.filter(pk=self.trackers[1].pk)._raw_delete('default')
+        update_rollups(lag=0)
+        update_rollups(lag=0)
+
+        self.assertFalse(CheckpointGap.objects.exists())
+
+    @override_settings(TRACKING_ANALYZER_DEDUP_WINDOW=600)
+    def test_lag_shorter_than_dedup_window(self):
+        """
+        Trackers may not be read while they can still get hits.
+        """
+        with self.assertRaisesMessage(ValueError, 'must be longer'):
+            update_rollups(lag=300)
+        with self.assertRaisesMessage(CommandError, 'must be longer'):
+            call_command('update_rollups', lag=600, stdout=mock.Mock())
+
+        self.assertEqual(update_rollups(lag=601), 3)
+
+    def test_update_rollups_command(self):
+        """
+        The command counts the trackers older than the given lag.
+        """
+        stdout = mock.Mock()
+        call_command('update_rollups', lag=0, stdout=stdout)
+
+        stdout.write.assert_called_once_with('3 trackers rolled up.\n')
+        self.assertTrue(Checkpoint.objects.filter(name='rollups').exists())
+
+
+@override_settings(TRACKING_ANALYZER_ROLLUPS_ENABLED=True)
+class ReadRollupsTestCase(TestCase):
+    def setUp(self):
+        self.day = datetime.datetime(2016, 7, 26)
+        self.tracker = TrackerFactory.create(
+            device_type=Tracker.PC, ip_country='NL',
+            timestamp=self.day + datetime.timedelta(hours=10))
+        update_rollups(lag=0)
+
+        # The rolled up trackers are read from the rollups alone.
+        Tracker.objects.all()._raw_delete('default')
+
+        TrackerFactory.create(
+            device_type=Tracker.PC, ip_country='ES',
+            timestamp=self.day + datetime.timedelta(hours=10, seconds=10))
+        TrackerFactory.create(
+            device_type=Tracker.MOBILE, ip_country='ES',
+            timestamp=self.day + datetime.timedelta(days=1))
+
+    def test_dimension_count(self):
+        """
+        The rollups and the trackers after the high-water mark are added up
+        for time ranges of whole buckets.
+        """
+        self.assertEqual(
+            sorted(get_dimension_count(
+                'device_type', self.day,
+                self.day + datetime.timedelta(days=1)),
+                key=lambda item: item['device_type']),
+            [{'device_type': Tracker.PC, 'requests': 2}]
+        )
+        self.assertEqual(
+            get_dimension_count(
+                'ip_country', end=self.day + datetime.timedelta(hours=11),
+                content_type_id=self.tracker.content_type_id,
+                object_id=self.tracker.object_id),
+            [{'ip_country': 'NL', 'requests': 1}]
+        )
+
+    def test_dimension_count_unaligned(self):
+        """
+        Time ranges out of the bucket boundaries are read from the trackers.
+        """
+        self.assertEqual(
+            get_dimension_count(
+                'device_type', self.day + datetime.timedelta(seconds=1)),
+            [{'device_type': Tracker.MOBILE, 'requests': 1},
+             {'device_type': Tracker.PC, 'requests': 1}]
+        )
+
+    def test_requests_count(self):
+        """
+        The requests per minute of all the trackers are read from the
+        rollups.
+        """
+        self.assertEqual(
+            get_requests_count(
+                Tracker.objects.all(), self.day,
+                self.day + datetime.timedelta(days=1)),
+            [{'date': self.day.date(), 'hour': 10, 'minute': 0,
+              'requests': 2}]
+        )
+
+    def test_changelist_view(self):
+        """
+        The admin analytics are read from the rollups when the trackers are
+        only filtered by date.
+        """
+        request = RequestFactory().get(
+            reverse('admin:tracking_analyzer_tracker_changelist'),
+            {'timestamp__year': '2016', 'timestamp__month': '7',
+             'timestamp__day': '26'}
+        )
+        request.user = UserFactory.create(is_staff=True, is_superuser=True)
+
+        response = TrackerAdmin(Tracker, AdminSite()).changelist_view(request)
+
+        self.assertEqual(
+            json.loads(response.context_data['devices_count']),
+            [{'device_type': Tracker.PC, 'count': 2}]
+        )
+        self.assertEqual(
+            json.loads(response.context_data['countries_count']),
+            [['ESP', 1], ['NLD', 1]]
+        )
+
+    def test_rollup_filters(self):
+        """
+        Only the date and tracked object filters of the changelist can be
+        answered from the rollups.
+        """
+        tracker_admin = TrackerAdmin(Tracker, AdminSite())
+        factory = RequestFactory()
+
+        self.assertEqual(
+            tracker_admin.get_rollup_filters(factory.get('/', {
+                'timestamp__gte': '2016-07-26', 'timestamp__lt': '2016-07-27',
+                'object_id__exact': '1', 'o': '1'})),
+            {'start': self.day, 'end': self.day + datetime.timedelta(days=1),
+             'object_id': '1'}
+        )
+        self.assertEqual(
+            tracker_admin.get_rollup_filters(factory.get('/', {
+                'timestamp__year': '2016', 'timestamp__month': '12'})),
+            {'start': datetime.datetime(2016, 12, 1),
+             'end': datetime.datetime(2017, 1, 1)}
+        )
+        self.assertEqual(
+            tracker_admin.get_rollup_filters(factory.get('/', {
+                'timestamp__year': '2016', 'timestamp__month': '7',
+                'timestamp__gte': '2016-07-26', 'timestamp__lt': '2016-08-02'
+            })),
+            {'start': self.day, 'end': datetime.datetime(2016, 8, 1)}
+        )
+        self.assertIsNone(tracker_admin.get_rollup_filters(
+            factory.get('/', {'device_type__exact': 'pc'})))
+        self.assertIsNone(tracker_admin.get_rollup_filters(
+            factory.get('/', {'timestamp__gte': 'yesterday'})))
@@ -0,0 +1,135 @@
+import unittest.mock as mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import override_settings, TestCase
+
+from tracking_analyzer.manager import RequestRecord
+from tracking_analyzer.models import Tracker
+from tracking_analyzer.sampling import get_sample_weight, get_sampling_rate
+from tracking_analyzer.utils import get_requests_count
+from .models import Post
+from .utils import build_mock_request
+
+
+class SamplingTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+        self.content_type_id = ContentType.objects.get_for_model(Post).pk
+
+        patcher = mock.patch(
+            'tracking_analyzer.manager.geolocate', return_value={})
+        self.geolocate_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(
+        TRACKING_ANALYZER_SAMPLING_RATE=0.5,
+        TRACKING_ANALYZER_SAMPLING_RATES_BY_CONTENT_TYPE={'tests.post': 0.1},
+        TRACKING_ANALYZER_SAMPLING_RATES_BY_DEVICE_TYPE={'bot': 0.01}
+    )
+    def test_sampling_rate_precedence(self):
+        """
+        Device type rates take precedence over content type rates, which take
+        precedence over the global rate.
+        """
+        self.assertEqual(
+            get_sampling_rate(self.content_type_id, Tracker.BOT), 0.01)
+        self.assertEqual(
+            get_sampling_rate(self.content_type_id, Tracker.PC), 0.1)
+        self.assertEqual(
+            get_sampling_rate(
+                ContentType.objects.get_for_model(Tracker).pk, Tracker.PC),
+            0.5
+        )
+
+    @mock.patch('tracking_analyzer.sampling.random.random')
+    def test_sample_weight(self, random_mock):
+        """
+        Requests are kept with a probability of one in their weight, which is
+        the inverse of the sampling rate.
+        """
+        with override_settings(TRACKING_ANALYZER_SAMPLING_RATE=0.25):
+            random_mock.return_value = 0.2
+            self.assertEqual(
+                get_sample_weight(self.content_type_id, Tracker.PC), 4)
+
+            random_mock.return_value = 0.3
+            self.assertIsNone(
+                get_sample_weight(self.content_type_id, Tracker.PC))
+
+        with override_settings(TRACKING_ANALYZER_SAMPLING_RATE=0):
+            self.assertIsNone(
+                get_sample_weight(self.content_type_id, Tracker.PC))
+
+        self.assertEqual(
+            get_sample_weight(self.content_type_id, Tracker.PC), 1)
+
+    @override_settings(TRACKING_ANALYZER_SAMPLING_RATE=0.1)
+    @mock.patch('tracking_analyzer.sampling.random.random')
+    def test_create_from_request_sampled(self, random_mock):
+        """
+        Tracked requests store their sample weight, and requests left out of
+        the sample are neither geolocated nor saved.
+        """
+        random_mock.return_value = 0.05
+        tracker = Tracker.objects.create_from_request(self.request, self.post)
+        self.assertEqual(tracker.sample_weight, 10)
+
+        random_mock.return_value = 0.5
+        self.assertIsNone(
+            Tracker.objects.create_from_request(self.request, self.post))
+
+        self.assertEqual(Tracker.objects.count(), 1)
+        self.assertEqual(self.geolocate_mock.call_count, 1)
+
+    @override_settings(
+        TRACKING_ANALYZER_SAMPLING_RATES_BY_DEVICE_TYPE={'pc': 0})
+    def test_create_from_record_sampled(self):
+        """
+        Requests processed in the background are sampled too.
+        """
+        record = RequestRecord.from_request(self.request)
+
+        self.assertIsNone(Tracker.objects.create_from_record(
+            record, self.content_type_id, self.post.pk))
+        self.assertFalse(Tracker.objects.exists())
+
+    @override_settings(TRACKING_ANALYZER_SAMPLING_RATE=0.5)
+    @mock.patch('tracking_analyzer.sampling.random.random')
+    def test_bulk_create_from_requests_sampled(self, random_mock):
+        """
+        Only the requests kept in the sample are saved in bulk.
+        """
+        random_mock.side_effect = [0.1, 0.9, 0.2, 0.8]
+        items = [(self.request, self.post)] * 4
+
+        self.assertEqual(
+            Tracker.objects.bulk_create_from_requests(items), 2)
+        self.assertEqual(
+            list(Tracker.objects.values_list('sample_weight', flat=True)),
+            [2, 2]
+        )
+
+    def test_requests_count_weighted(self):
+        """
+        ``get_requests_count`` adds up the sample weights of the trackers.
+        """
+        Tracker.objects.create_from_request(self.request, self.post)
+        tracker = Tracker.objects.create_from_request(self.request, self.post)
+        tracker.sample_weight = 100
+        tracker.save()
+
+        self.assertEqual(
+            [item['requests'] for item in get_requests_count(
+                Tracker.objects.filter(timestamp=tracker.timestamp))],
+            [100]
+        )
+        self.assertEqual(
+            sum(item['requests']
+                for item in get_requests_count(Tracker.objects.all())),
+            101
+        )
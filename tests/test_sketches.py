@@ -0,0 +1,215 @@
+import datetime
+import unittest.mock as mock
+
+from django.core.management import call_command
+from django.test import override_settings, SimpleTestCase, TestCase
+
+from tracking_analyzer.models import Tracker, VisitorSketch
+from tracking_analyzer.sketches import (
+    get_visitor_key, HyperLogLog, update_visitor_sketches)
+from tracking_analyzer.utils import get_unique_visitors
+from .factories import PostFactory, TrackerFactory, UserFactory
+
+
+class HyperLogLogTestCase(SimpleTestCase):
+    def test_count(self):
+        """
+        Estimates stay within a few standard errors of the real count.
+        """
+        for total in (10, 1000, 50000):
+            with self.subTest(total=total):
+                sketch = HyperLogLog()
+                for value in range(total):
+                    sketch.add(str(value))
+
+                self.assertLessEqual(
+                    abs(sketch.count() - total), 3 * sketch.error * total + 1)
+
+    def test_repeated_values(self):
+        """
+        Adding a value twice doesn't change the sketch.
+        """
+        sketch = HyperLogLog()
+        sketch.add('visitor')
+        registers = bytes(sketch.registers)
+        sketch.add('visitor')
+
+        self.assertEqual(bytes(sketch.registers), registers)
+        self.assertEqual(sketch.count(), 1)
+
+    def test_merge(self):
+        """
+        Merged sketches count the distinct values of all of them.
+        """
+        first, second = HyperLogLog(), HyperLogLog()
+        for value in range(100):
+            first.add(str(value))
+            second.add(str(value + 50))
+        first.merge(second)
+
+        self.assertAlmostEqual(first.count(), 150, delta=10)
+
+        with self.assertRaises(AssertionError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_small_precision(self):
+        """
+        Sketches of less than 128 registers use the constants of the
+        HyperLogLog paper for the bias correction.
+        """
+        for precision, alpha in ((4, 0.673), (5, 0.697), (6, 0.709)):
+            with self.subTest(precision=precision):
+                size = 1 << precision
+                sketch = HyperLogLog(precision, bytes([10] * size))
+
+                self.assertEqual(sketch.count(), round(alpha * size * 1024))
+
+    def test_fold(self):
+        """
+        Folded sketches are the sketches of the same values with a lower
+        precision, and are merged with them.
+        """
+        sketch, lower = HyperLogLog(precision=12), HyperLogLog(precision=8)
+        for value in range(5000):
+            sketch.add(str(value))
+            lower.add(str(value))
+
+        self.assertEqual(sketch.fold(8).registers, lower.registers)
+        self.assertEqual(sketch.fold(12).registers, sketch.registers)
+
+        for value in range(5000, 6000):
+            lower.add(str(value))
+        merged = HyperLogLog.union([sketch, lower])
+
+        self.assertEqual(merged.precision, 8)
+        self.assertEqual(merged.registers, lower.registers)
+        self.assertEqual(HyperLogLog.union([]).precision, 12)
+
+    def test_bytes(self):
+        """
+        Sketches are stored compressed, and read back with their precision.
+        """
+        sketch = HyperLogLog(precision=14)
+        sketch.add('visitor')
+        data = sketch.to_bytes()
+
+        self.assertLess(len(data), 100)
+        self.assertEqual(HyperLogLog.from_bytes(data).precision, 14)
+        self.assertEqual(HyperLogLog.from_bytes(data).count(), 1)
+
+    @override_settings(TRACKING_ANALYZER_SKETCH_PRECISION=10)
+    def test_precision(self):
+        """
+        The precision comes from the settings, and sets the error.
+        """
+        self.assertEqual(len(HyperLogLog().registers), 1024)
+        self.assertAlmostEqual(HyperLogLog().error, 0.0325)
+
+    def test_visitor_key(self):
+        """
+        Visitors are their user if authenticated, or else their IP address.
+        """
+        self.assertEqual(get_visitor_key(1, '10.0.0.1'), 'user:1')
+        self.assertEqual(get_visitor_key(None, '10.0.0.1'), 'ip:10.0.0.1')
+        self.assertIsNone(get_visitor_key(None, None))
+
+
+class VisitorSketchesTestCase(TestCase):
+    def setUp(self):
+        self.day = datetime.datetime(2016, 7, 26, 10)
+        self.post = PostFactory.create()
+        self.user = UserFactory.create()
+        for ip_address in ('10.0.0.1', '10.0.0.1', '10.0.0.2'):
+            TrackerFactory.create(
+                content_object=self.post, user=None, ip_address=ip_address,
+                timestamp=self.day)
+        TrackerFactory.create(
+            content_object=self.post, user=self.user, timestamp=self.day)
+        TrackerFactory.create(
+            content_object=self.post, user=self.user,
+            timestamp=self.day + datetime.timedelta(days=1))
+        self.other = TrackerFactory.create(
+            user=None, ip_address='10.0.0.9', timestamp=self.day)
+
+    def test_update_visitor_sketches(self):
+        """
+        A sketch of the visitors of each object and day is stored.
+        """
+        self.assertEqual(update_visitor_sketches(lag=0, batch_size=4), 6)
+
+        self.assertEqual(VisitorSketch.objects.count(), 3)
+        self.assertEqual(
+            VisitorSketch.objects.filter(
+                object_id=self.post.pk, day=self.day.date()).merge().count(),
+            3
+        )
+
+    def test_precision_change(self):
+        """
+        Sketches stored with another precision are merged with the new ones
+        to the lowest precision.
+        """
+        update_visitor_sketches(lag=0)
+        TrackerFactory.create(
+            content_object=self.post, user=None, ip_address='10.0.0.3',
+            timestamp=self.day)
+
+        with override_settings(TRACKING_ANALYZER_SKETCH_PRECISION=10):
+            update_visitor_sketches(lag=0)
+            sketch = VisitorSketch.objects.filter(
+                object_id=self.post.pk).merge()
+
+        self.assertEqual(sketch.precision, 10)
+        self.assertEqual(sketch.count(), 4)
+        self.assertEqual(VisitorSketch.objects.merge().count(), 5)
+
+    def test_unique_visitors(self):
+        """
+        Sketches are merged across days and objects.
+        """
+        update_visitor_sketches(lag=0)
+
+        self.assertEqual(get_unique_visitors(), 4)
+        self.assertEqual(
+            get_unique_visitors(self.day.date(), object_id=self.post.pk), 3)
+        self.assertEqual(
+            get_unique_visitors(self.day.date() + datetime.timedelta(days=1)),
+            1
+        )
+
+    def test_late_trackers(self):
+        """
+        Trackers saved after a run are added to the sketches of their day.
+        """
+        update_visitor_sketches(lag=0)
+        TrackerFactory.create(
+            content_object=self.post, user=None, ip_address='10.0.0.3',
+            timestamp=self.day)
+
+        stdout = mock.Mock()
+        call_command('update_visitor_sketches', lag=0, stdout=stdout)
+
+        stdout.write.assert_called_once_with('1 trackers read.\n')
+        self.assertEqual(
+            get_unique_visitors(self.day.date(), object_id=self.post.pk), 4)
+
+    def test_late_commit(self):
+        """
+        Trackers committed after a run passed their ids are read by the next
+        one.
+        """
+        late = TrackerFactory.create(
+            content_object=self.post, user=None, ip_address='10.0.0.3',
+            timestamp=self.day)
+        TrackerFactory.create(
+            content_object=self.post, user=None, ip_address='10.0.0.1',
+            timestamp=self.day)
+        # Not committed yet.
+        Tracker.objects.filter(pk=late.pk)._raw_delete('default')
+        update_visitor_sketches(lag=0)
+
+        late.save(force_insert=True)
+
+        self.assertEqual(update_visitor_sketches(lag=0), 1)
+        self.assertEqual(
+            get_unique_visitors(self.day.date(), object_id=self.post.pk), 4)
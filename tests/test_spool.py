@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import unittest.mock as mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import override_settings, TestCase
+
+from tracking_analyzer.models import Checkpoint, Tracker
+from tracking_analyzer.spool import tracker_spool
+from .models import Post
+from .utils import build_mock_request
+
+
+@mock.patch('tracking_analyzer.manager.geolocate', mock.Mock(return_value={}))
+class TrackerSpoolTestCase(TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+
+        override = override_settings(
+            TRACKING_ANALYZER_SPOOL_ENABLED=True,
+            TRACKING_ANALYZER_SPOOL_DIR=self.spool_dir,
+            TRACKING_ANALYZER_SPOOL_ROTATE_INTERVAL=60
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        tracker_spool.close()
+        self.addCleanup(tracker_spool.close)
+
+        self.request = build_mock_request('/testing/')
+        self.request.META['HTTP_REFERER'] = 'https://www.maykinmedia.nl/'
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+        patcher = mock.patch('tracking_analyzer.spool.time.time')
+        self.time_mock = patcher.start()
+        self.time_mock.return_value = 6000
+        self.addCleanup(patcher.stop)
+
+    def track(self, count=1):
+        for _ in range(count):
+            self.assertIsNone(
+                Tracker.objects.create_from_request(self.request, self.post))
+
+    def load(self, **options):
+        call_command('load_tracker_spool', stdout=mock.Mock(), **options)
+
+    def test_create_from_request_spooled(self):
+        """
+        With the spool enabled, requests are appended to a file of the
+        current time bucket and the database is left untouched.
+        """
+        self.track(2)
+
+        self.assertFalse(Tracker.objects.exists())
+        self.assertEqual(len(tracker_spool.get_files()), 1)
+
+        path, finished = tracker_spool.get_files()[0]
+        self.assertTrue(os.path.basename(path).startswith('6000-'))
+        self.assertFalse(finished)
+
+        rows, position = tracker_spool.read(path, 0, 10)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(position, os.path.getsize(path))
+        record, content_type_id, object_id = rows[0]
+        self.assertEqual(record.ip_address, '208.67.222.222')
+        self.assertEqual(record.referrer, 'https://www.maykinmedia.nl/')
+        self.assertEqual(record.user_id, self.request.user.pk)
+        self.assertEqual(
+            content_type_id, ContentType.objects.get_for_model(Post).pk)
+        self.assertEqual(object_id, self.post.pk)
+
+    def test_spool_rotation(self):
+        """
+        A new file is started on each rotation interval.
+        """
+        self.track()
+        self.time_mock.return_value = 6065
+        self.track()
+
+        self.assertEqual(
+            [os.path.basename(path).split('-')[0]
+             for path, _ in tracker_spool.get_files()],
+            ['6000', '6060']
+        )
+
+    def test_read_partial_line(self):
+        """
+        A trailing line still being written is not read.
+        """
+        self.track()
+        path, _ = tracker_spool.get_files()[0]
+        size = os.path.getsize(path)
+        with open(path, 'a') as spool:
+            spool.write('["208.67.222.220","Mozilla')
+
+        rows, position = tracker_spool.read(path, 0, 10)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(position, size)
+
+    def test_load_spool(self):
+        """
+        The loader saves the spooled requests and keeps the current files,
+        with a checkpoint, until they are finished.
+        """
+        self.track(3)
+        self.load(batch_size=2)
+
+        self.assertEqual(Tracker.objects.count(), 3)
+        tracker = Tracker.objects.first()
+        self.assertEqual(tracker.content_object, self.post)
+        self.assertEqual(tracker.user, self.request.user)
+        self.assertEqual(tracker.browser, 'Chrome')
+
+        path, _ = tracker_spool.get_files()[0]
+        self.assertEqual(
+            Checkpoint.objects.get(name=os.path.basename(path)).position,
+            os.path.getsize(path)
+        )
+
+        # Loading again does not duplicate anything, only new requests are
+        # saved.
+        self.track()
+        self.load()
+        self.assertEqual(Tracker.objects.count(), 4)
+
+        # Once its time bucket is over, the file is removed after loading.
+        self.time_mock.return_value = 6125
+        self.load()
+
+        self.assertEqual(Tracker.objects.count(), 4)
+        self.assertEqual(tracker_spool.get_files(), [])
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_load_spool_interrupted(self):
+        """
+        If a batch fails, the batches already saved are not loaded again on
+        the next run.
+        """
+        self.track(3)
+        create_batch = Tracker.objects.create_batch
+        calls = []
+
+        def failing_batch(batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError
+            return create_batch(batch)
+
+        with mock.patch.object(
+                Tracker.objects, 'create_batch', side_effect=failing_batch):
+            self.assertRaises(RuntimeError, self.load, batch_size=2)
+
+        self.assertEqual(Tracker.objects.count(), 2)
+
+        self.load(batch_size=2)
+        self.assertEqual(Tracker.objects.count(), 3)
@@ -0,0 +1,183 @@
+import threading
+import unittest.mock as mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import override_settings, TestCase
+
+from tracking_analyzer.manager import RequestRecord
+from tracking_analyzer.models import Tracker
+from tracking_analyzer.workers import TrackerWorkerPool
+from .models import Post
+from .utils import build_mock_request
+
+
+@override_settings(
+    TRACKING_ANALYZER_WORKERS=1,
+    TRACKING_ANALYZER_WORKERS_QUEUE_SIZE=1
+)
+class TrackerWorkerPoolTestCase(TestCase):
+    def setUp(self):
+        self.pool = TrackerWorkerPool()
+        self.addCleanup(self.pool.shutdown)
+
+        self.done = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def blocking_task(self):
+        self.started.set()
+        self.release.wait(5)
+        self.done.append('blocking')
+
+    def fill_pool(self):
+        """
+        Keeps the only worker busy and fills the queue.
+        """
+        self.pool.submit(self.blocking_task)
+        self.started.wait(5)
+        self.pool.submit(self.done.append, 'queued')
+
+    def test_submit_runs_in_background(self):
+        """
+        Submitted tasks run in the workers threads.
+        """
+        threads = []
+        self.pool.submit(lambda: threads.append(threading.current_thread()))
+        self.pool.join()
+
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(threads[0].name, 'tracking-analyzer-worker-0')
+
+    def test_shutdown_drains_queue(self):
+        """
+        Queued tasks are run before the workers stop.
+        """
+        self.fill_pool()
+        self.release.set()
+        self.pool.shutdown()
+
+        self.assertEqual(self.done, ['blocking', 'queued'])
+
+    def test_shutdown_full_queue(self):
+        """
+        Shutting down with a full queue doesn't wait for room in it. The
+        workers still stop once the queued tasks are done.
+        """
+        self.fill_pool()
+        threads = list(self.pool._threads)
+        self.pool.shutdown(timeout=0.1)
+
+        self.assertTrue(threads[0].is_alive())
+        self.release.set()
+        threads[0].join(5)
+
+        self.assertFalse(threads[0].is_alive())
+        self.assertEqual(self.done, ['blocking', 'queued'])
+
+    @override_settings(TRACKING_ANALYZER_WORKERS_OVERFLOW='drop')
+    def test_overflow_drop(self):
+        """
+        With the ``'drop'`` policy, tasks are discarded when the queue is full.
+        """
+        self.fill_pool()
+
+        self.assertFalse(self.pool.submit(self.done.append, 'dropped'))
+        self.assertEqual(self.pool.dropped, 1)
+
+        self.release.set()
+        self.pool.shutdown()
+        self.assertEqual(self.done, ['blocking', 'queued'])
+
+    @override_settings(TRACKING_ANALYZER_WORKERS_OVERFLOW='run')
+    def test_overflow_run(self):
+        """
+        With the ``'run'`` policy, tasks run in the caller thread when the
+        queue is full.
+        """
+        self.fill_pool()
+
+        self.assertTrue(self.pool.submit(self.done.append, 'inline'))
+        self.assertEqual(self.done, ['inline'])
+
+        self.release.set()
+        self.pool.shutdown()
+        self.assertEqual(self.done, ['inline', 'blocking', 'queued'])
+
+    @override_settings(TRACKING_ANALYZER_WORKERS_QUEUE_SIZE=10)
+    @mock.patch('tracking_analyzer.workers.logger')
+    def test_task_failure(self, logger_mock):
+        """
+        A failing task is logged and does not stop the worker.
+        """
+        self.pool.submit(lambda: 1 / 0)
+        self.pool.submit(self.done.append, 'after')
+        self.pool.join()
+
+        self.assertTrue(logger_mock.exception.called)
+        self.assertEqual(self.done, ['after'])
+
+
+class EnqueueFromRequestTestCase(TestCase):
+    def setUp(self):
+        self.request = build_mock_request('/testing/')
+        self.request.META['HTTP_REFERER'] = 'https://www.maykinmedia.nl/'
+        self.post = Post.objects.create(
+            user=self.request.user,
+            title='Testing post',
+            body='This is just a testing post.'
+        )
+
+    @mock.patch('tracking_analyzer.manager.geolocate')
+    @mock.patch('tracking_analyzer.manager.worker_pool')
+    def test_enqueue_from_request(self, pool_mock, geolocate_mock):
+        """
+        ``enqueue_from_request`` only collects the raw request data and leaves
+        the rest of the work to the background workers.
+        """
+        pool_mock.submit.return_value = True
+        geolocate_mock.return_value = {
+            'country_code': 'US',
+            'region': 'CA',
+            'city': 'San Francisco'
+        }
+
+        self.assertTrue(
+            Tracker.objects.enqueue_from_request(self.request, self.post))
+        self.assertFalse(Tracker.objects.exists())
+        self.assertFalse(geolocate_mock.called)
+
+        function, record, content_type_id, object_id = \
+            pool_mock.submit.call_args[0]
+        self.assertIsInstance(record, RequestRecord)
+        self.assertEqual(record.ip_address, '208.67.222.222')
+        self.assertEqual(
+            record.user_agent, self.request.META['HTTP_USER_AGENT'])
+        self.assertEqual(record.referrer, 'https://www.maykinmedia.nl/')
+        self.assertEqual(record.user_id, self.request.user.pk)
+        self.assertEqual(
+            content_type_id, ContentType.objects.get_for_model(Post).pk)
+        self.assertEqual(object_id, self.post.pk)
+
+        # Now do what the worker would do.
+        tracker = function(record, content_type_id, object_id)
+
+        self.assertEqual(tracker.content_object, self.post)
+        self.assertEqual(tracker.user, self.request.user)
+        self.assertEqual(tracker.timestamp, record.timestamp)
+        self.assertEqual(tracker.referrer, 'https://www.maykinmedia.nl/')
+        self.assertEqual(tracker.browser, 'Chrome')
+        self.assertEqual(tracker.device_type, Tracker.PC)
+        self.assertEqual(tracker.ip_country, 'US')
+        self.assertEqual(tracker.ip_city, 'San Francisco')
+
+    def test_enqueue_from_request_wrong_request(self):
+        """
+        Tests sanity checks for ``HTTPRequest`` object in the non-blocking
+        manager method.
+        """
+        self.assertRaisesMessage(
+            AssertionError,
+            '`request` object is not an `HTTPRequest`',
+            Tracker.objects.enqueue_from_request,
+            'NOT_A_REQUEST', self.post
+        )
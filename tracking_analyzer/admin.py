@@ -1,23 +1,73 @@
+import datetime
 import json
 
+from django.conf import settings
 from django.contrib import admin
-from django.db.models import Count
-from django.urls import reverse
+from django.contrib.admin.utils import quote
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils import timezone
 from django.utils.html import format_html
 
 from django_countries import countries
 
-from .utils import get_requests_count
+from .analytics import (
+    get_analytics_cache, get_analytics_cache_key, invalidate_analytics)
+from .heavy_hitters import get_top_objects, get_top_referrers
+from .utils import get_dimension_count, weighted_count
 from .models import Tracker
 
 
+def get_timestamp_range(params):
+    """
+    Pops the ``timestamp`` lookups of the changelist date hierarchy and date
+    filter from the given query parameters, and returns the
+    ``(start, end)`` range they select, the intersection of both if both are
+    used. Either one is ``None`` if unbounded.
+    """
+    year = params.pop('timestamp__year', None)
+    month = params.pop('timestamp__month', None)
+    day = params.pop('timestamp__day', None)
+    bounds = [
+        models.DateTimeField().to_python(value) for value in (
+            params.pop('timestamp__gte', None),
+            params.pop('timestamp__lt', None)
+        )
+    ]
+
+    if year:
+        start = datetime.datetime(int(year), int(month or 1), int(day or 1))
+        if day:
+            end = start + datetime.timedelta(days=1)
+        elif month:
+            end = (start + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            end = start.replace(year=start.year + 1)
+        bounds.extend([start, end])
+
+    if settings.USE_TZ:
+        bounds = [
+            timezone.make_aware(value) if value and timezone.is_naive(value)
+            else value
+            for value in bounds
+        ]
+
+    starts = [value for value in bounds[::2] if value]
+    ends = [value for value in bounds[1::2] if value]
+
+    return max(starts, default=None), min(ends, default=None)
+
+
 class TrackerAdmin(admin.ModelAdmin):
     date_hierarchy = 'timestamp'
     raw_id_fields = ['user']
     readonly_fields = [
         'content_type', 'object_id', 'ip_address', 'ip_country', 'ip_region',
         'ip_city', 'referrer', 'device_type', 'device', 'browser',
-        'browser_version', 'system', 'system_version', 'user'
+        'browser_version', 'system', 'system_version', 'user',
+        'sample_weight', 'hits'
     ]
     list_filter = [
         ('timestamp', admin.DateFieldListFilter), 'device_type', 'content_type'
@@ -26,7 +76,10 @@ class TrackerAdmin(admin.ModelAdmin):
         'details', 'content_object_link', 'timestamp', 'ip_address_link',
         'ip_country_link', 'ip_city_link', 'user_link',
     ]
+    list_select_related = ['content_type', 'user']
     ordering = ['-timestamp']
+    # Number of objects and referrers in the heavy hitters widget.
+    heavy_hitters_size = 10
 
     class Media:
         js = [
@@ -36,12 +89,50 @@ class TrackerAdmin(admin.ModelAdmin):
             'admin/js/vendor/d3-tip/d3-tip.min.js'
         ]
 
+    def __init__(self, model, admin_site):
+        super(TrackerAdmin, self).__init__(model, admin_site)
+        self._urls = {}
+
+    def get_url(self, name, *args):
+        """
+        Returns the URL of a trackers admin view, reversed once per script
+        prefix and URLconf rather than once per changelist row and column.
+        """
+        key = (get_script_prefix(), get_urlconf(), name, args)
+        if key not in self._urls:
+            self._urls[key] = reverse(
+                'admin:tracking_analyzer_tracker_{0}'.format(name), args=args)
+
+        return self._urls[key]
+
+    def get_changelist_url(self):
+        """
+        Returns the URL of the trackers changelist.
+        """
+        return self.get_url('changelist')
+
+    def get_change_url(self, pk):
+        """
+        Returns the URL of the change view of a tracker, reversed with a
+        placeholder primary key then replaced.
+        """
+        return self.get_url('change', '__pk__').replace(
+            '__pk__', quote(str(pk)))
+
+    def get_queryset(self, request):
+        """
+        Overrides base ``get_queryset`` method to fetch the tracked objects of
+        the changelist page in one query per content type.
+        """
+        return super(TrackerAdmin, self).get_queryset(
+            request).prefetch_related('content_object')
+
     def details(self, obj):
         """
         Define the 'Details' column rows display.
         """
         return format_html('<a href="{0}">Details</a>'.format(
-            reverse('admin:tracking_analyzer_tracker_change', args=(obj.pk,))))
+            self.get_change_url(obj.pk)))
 
     details.allow_tags = True
     details.short_description = 'Details'
@@ -53,8 +144,8 @@ class TrackerAdmin(admin.ModelAdmin):
         return format_html(
             '<a href="{0}?content_type__id__exact={1}&object_id__exact={2}">'
             '{3}</a>'.format(
-                reverse('admin:tracking_analyzer_tracker_changelist'),
-                obj.content_type.id,
+                self.get_changelist_url(),
+                obj.content_type_id,
                 obj.object_id,
                 obj
             )
@@ -70,7 +161,7 @@ class TrackerAdmin(admin.ModelAdmin):
         if obj.ip_address:
             return format_html(
                 '<a href="{0}?ip_address__exact={1}">{1}</a>'.format(
-                    reverse('admin:tracking_analyzer_tracker_changelist'),
+                    self.get_changelist_url(),
                     obj.ip_address,
                 )
             )
@@ -87,7 +178,7 @@ class TrackerAdmin(admin.ModelAdmin):
         if obj.ip_country:
             return format_html(
                 '<a href="{0}?ip_country__exact={1}">{2}</a>'.format(
-                    reverse('admin:tracking_analyzer_tracker_changelist'),
+                    self.get_changelist_url(),
                     obj.ip_country,
                     obj.ip_country.name
                 )
@@ -105,7 +196,7 @@ class TrackerAdmin(admin.ModelAdmin):
         if obj.ip_city:
             return format_html(
                 '<a href="{0}?ip_city__exact={1}">{1}</a>'.format(
-                    reverse('admin:tracking_analyzer_tracker_changelist'),
+                    self.get_changelist_url(),
                     obj.ip_city,
                 )
             )
@@ -122,8 +213,8 @@ class TrackerAdmin(admin.ModelAdmin):
         if obj.user:
             return format_html(
                 '<a href="{0}?user__id__exact={1}">{2}</a>'.format(
-                    reverse('admin:tracking_analyzer_tracker_changelist'),
-                    obj.user.pk,
+                    self.get_changelist_url(),
+                    obj.user_id,
                     obj.user
                 )
             )
@@ -133,6 +224,66 @@ class TrackerAdmin(admin.ModelAdmin):
     user_link.allow_tags = True
     user_link.short_description = 'User'
 
+    @staticmethod
+    def get_rollup_filters(request):
+        """
+        Returns the arguments of ``get_dimension_count`` matching the
+        changelist filters, or ``None`` if neither the rollups nor the
+        materialized views can be used for them: they are disabled, or the
+        trackers are filtered by other fields than the ``timestamp`` and the
+        tracked object.
+        """
+        if not settings.TRACKING_ANALYZER_ROLLUPS_ENABLED and \
+                not settings.TRACKING_ANALYZER_MATERIALIZED_VIEWS:
+            return None
+
+        params = request.GET.dict()
+        params.pop('o', None)
+        params.pop('p', None)
+        filters = {}
+        for lookup, name in (('content_type__id__exact', 'content_type_id'),
+                             ('object_id__exact', 'object_id')):
+            if lookup in params:
+                filters[name] = params.pop(lookup)
+
+        try:
+            filters['start'], filters['end'] = get_timestamp_range(params)
+        except (ValueError, ValidationError):
+            return None
+
+        return None if params else filters
+
+    def get_heavy_hitters(self):
+        """
+        Returns the most requested objects and the most frequent referrers
+        of the last ``TRACKING_ANALYZER_HEAVY_HITTERS_WINDOW`` seconds, for
+        the heavy hitters widget.
+        """
+        changelist_url = self.get_changelist_url()
+        top_objects = [
+            {
+                'label': str(content_object),
+                'url': '{0}?content_type__id__exact={1}&'
+                       'object_id__exact={2}'.format(
+                           changelist_url,
+                           ContentType.objects.get_for_model(
+                               content_object).pk,
+                           content_object.pk),
+                'requests': requests,
+                'error': error
+            }
+            for content_object, requests, error in get_top_objects(
+                self.heavy_hitters_size)
+            if content_object is not None
+        ]
+        top_referrers = [
+            {'label': referrer, 'requests': requests, 'error': error}
+            for referrer, requests, error in get_top_referrers(
+                self.heavy_hitters_size)
+        ]
+
+        return top_objects, top_referrers
+
     def has_add_permission(self, request):
         """
         Overrides base ``has_add_permission`` method to block up any admin user
@@ -159,55 +310,125 @@ class TrackerAdmin(admin.ModelAdmin):
         return super(TrackerAdmin, self).change_view(
             request, object_id, form_url, extra_context=extra_context)
 
-    def changelist_view(self, request, extra_context=None):
+    def get_analytics(self, request, queryset):
         """
-        Overrides base ``changelist_view`` method to add analytics datasets to
-        the response.
+        Returns the analytics datasets of the changelist filtered trackers:
+        requests by country and by device, unless filtered by them, and the
+        most requested objects and referrers, if counted.
         """
-        extra_context = extra_context or {}
-        countries_count = []
-        response = super(TrackerAdmin, self).changelist_view(
-            request, extra_context)
+        analytics = {}
+        rollup_filters = self.get_rollup_filters(request)
 
-        if request.method == 'GET':
-            # Get the current objects queryset to analyze data from it.
-            queryset = response.context_data['cl'].queryset
-
-            # Requests by country (when no filtering by country).
-            if 'ip_country__exact' not in request.GET:
+        # Requests by country (when no filtering by country).
+        if 'ip_country__exact' not in request.GET:
+            if rollup_filters is None:
                 trackers = queryset.values('ip_country').annotate(
-                    trackers=Count('id')).order_by()
-                for track in trackers:
-                    countries_count.append(
-                        [countries.alpha3(track['ip_country']),
-                         track['trackers']]
-                    )
+                    requests=weighted_count()).order_by()
+            else:
+                trackers = sorted(
+                    get_dimension_count('ip_country', **rollup_filters),
+                    key=lambda item: item['ip_country'])
+
+            analytics['countries_count'] = json.dumps([
+                [countries.alpha3(track['ip_country']), track['requests']]
+                for track in trackers
+            ])
+
+        # Requests by device (when not filtering by device).
+        if 'device_type__exact' not in request.GET:
+            if rollup_filters is None:
+                devices_count = list(queryset.values('device_type').annotate(
+                    count=weighted_count()).order_by())
+            else:
+                devices_count = [
+                    {'device_type': item['device_type'],
+                     'count': item['requests']}
+                    for item in sorted(
+                        get_dimension_count('device_type', **rollup_filters),
+                        key=lambda item: item['device_type'])
+                ]
+
+            analytics['devices_count'] = json.dumps(devices_count)
+
+        # Most requested objects and referrers, when counted.
+        if settings.TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED:
+            analytics['top_objects'], analytics['top_referrers'] = \
+                self.get_heavy_hitters()
+
+        return analytics
+
+    def get_cached_analytics(self, request, queryset):
+        """
+        Returns the ``get_analytics`` datasets, from the
+        ``TRACKING_ANALYZER_ANALYTICS_CACHE_BACKEND`` cache if set. They are
+        cached by filters, for every page and ordering of the changelist.
+        """
+        cache = get_analytics_cache()
+        if cache is None:
+            return self.get_analytics(request, queryset)
 
-                extra_context['countries_count'] = json.dumps(countries_count)
+        key = get_analytics_cache_key(cache, request.GET)
+        analytics = cache.get(key)
+        if analytics is None:
+            analytics = self.get_analytics(request, queryset)
+            cache.set(key, analytics,
+                      settings.TRACKING_ANALYZER_ANALYTICS_CACHE_TTL)
 
-            # Requests by device (when not filtering by device).
-            if 'device_type__exact' not in request.GET:
-                devices_count = list(queryset.values('device_type').annotate(
-                    count=Count('id')).order_by())
+        return analytics
 
-                extra_context['devices_count'] = json.dumps(devices_count)
+    @staticmethod
+    def get_requests_count(trackers):
+        """
+        Returns the requests per minute of the given trackers, as the
+        ``get_requests_count`` helper, counted from the loaded trackers.
+        """
+        requests = {}
+        for tracker in trackers:
+            timestamp = timezone.localtime(tracker.timestamp) \
+                if timezone.is_aware(tracker.timestamp) else tracker.timestamp
+            date = timestamp.strftime('%Y-%m-%dT%H:%M')
+            requests[date] = requests.get(date, 0) + \
+                tracker.hits * tracker.sample_weight
+
+        return [
+            {'date': date, 'requests': count}
+            for date, count in sorted(requests.items())
+        ]
 
-            # Requests time line for the current page changelist.
-            current_page = response.context_data['cl'].page_num
-            current_pks = response.context_data['cl'].paginator.page(
-                current_page + 1).object_list.values_list('pk', flat=True)
+    def delete_model(self, request, obj):
+        """
+        Overrides base ``delete_model`` method to invalidate the cached
+        analytics.
+        """
+        super(TrackerAdmin, self).delete_model(request, obj)
+        invalidate_analytics()
 
-            current_results = get_requests_count(
-                Tracker.objects.filter(pk__in=list(current_pks)))
+    def delete_queryset(self, request, queryset):
+        """
+        Overrides base ``delete_queryset`` method to invalidate the cached
+        analytics.
+        """
+        super(TrackerAdmin, self).delete_queryset(request, queryset)
+        invalidate_analytics()
 
-            for item in current_results:
-                item['date'] = '{date}T{hour:02d}:{minute:02d}'.format(
-                    date=item.pop('date'),
-                    hour=item.pop('hour'),
-                    minute=item.pop('minute')
-                )
+    def changelist_view(self, request, extra_context=None):
+        """
+        Overrides base ``changelist_view`` method to add analytics datasets to
+        the response.
+        """
+        extra_context = extra_context or {}
+        response = super(TrackerAdmin, self).changelist_view(
+            request, extra_context)
 
-            extra_context['requests_count'] = json.dumps(list(current_results))
+        if request.method == 'GET':
+            changelist = response.context_data['cl']
+            extra_context.update(
+                self.get_cached_analytics(request, changelist.queryset))
+
+            # Requests time line for the current page changelist, from its
+            # trackers already loaded.
+            extra_context['requests_count'] = json.dumps(
+                self.get_requests_count(changelist.result_list))
 
             response.context_data.update(extra_context)
 
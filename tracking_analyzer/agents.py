@@ -0,0 +1,113 @@
+import threading
+
+from django.apps import apps
+from django.conf import settings
+
+from user_agents import parse
+
+from .cache import LRUCache
+
+
+class UserAgentCache:
+    """
+    Memoizes the device classification per raw user agent string.
+
+    The set of distinct user agents is small compared with the number of
+    tracked requests, so results are kept in an in-process ``LRUCache`` of
+    ``TRACKING_ANALYZER_USER_AGENT_CACHE_SIZE`` entries and repeat visitors
+    skip the user agent parsing entirely.
+    """
+    def __init__(self):
+        self._local = None
+        self._lock = threading.Lock()
+
+    @property
+    def local(self):
+        """
+        The in-process cache, built from the current settings on first use.
+        """
+        if self._local is None:
+            with self._lock:
+                if self._local is None:
+                    self._local = LRUCache(
+                        settings.TRACKING_ANALYZER_USER_AGENT_CACHE_SIZE)
+
+        return self._local
+
+    def get(self, user_agent):
+        """
+        Returns a copy of the cached values for the given user agent string,
+        or ``None``.
+        """
+        values = self.local.get(user_agent)
+
+        return dict(values) if values is not None else None
+
+    def set(self, user_agent, values):
+        """
+        Caches the values for the given user agent string.
+        """
+        self.local.set(user_agent, dict(values))
+
+    def clear(self):
+        """
+        Empties the cache. It will be rebuilt from the current settings on next
+        use.
+        """
+        with self._lock:
+            self._local = None
+
+    def stats(self):
+        """
+        Returns the cache counters.
+        """
+        return self.local.stats()
+
+
+user_agent_cache = UserAgentCache()
+
+
+def classify_user_agent(user_agent):
+    """
+    Classifies a parsed user agent.
+
+    :param user_agent: A ``user_agents.parsers.UserAgent`` instance.
+    :return: A dictionary with the ``Tracker`` device related fields values.
+    """
+    model = apps.get_model('tracking_analyzer', 'Tracker')
+
+    if user_agent.is_mobile:
+        device_type = model.MOBILE
+    elif user_agent.is_tablet:
+        device_type = model.TABLET
+    elif user_agent.is_pc:
+        device_type = model.PC
+    elif user_agent.is_bot:
+        device_type = model.BOT
+    else:
+        device_type = model.UNKNOWN
+
+    return {
+        'device_type': device_type,
+        'device': user_agent.device.family,
+        'browser': user_agent.browser.family[:30],
+        'browser_version': user_agent.browser.version_string,
+        'system': user_agent.os.family,
+        'system_version': user_agent.os.version_string,
+    }
+
+
+def get_device_values(user_agent):
+    """
+    Classifies the device of a request, parsing its user agent only if it is
+    not in the user agents cache yet.
+
+    :param user_agent: The raw ``User-Agent`` header string.
+    :return: A dictionary with the ``Tracker`` device related fields values.
+    """
+    values = user_agent_cache.get(user_agent)
+    if values is None:
+        values = classify_user_agent(parse(user_agent))
+        user_agent_cache.set(user_agent, values)
+
+    return values
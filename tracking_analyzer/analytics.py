@@ -0,0 +1,65 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+GENERATION_KEY = 'tracking_analyzer:analytics:generation'
+# Changelist parameters that don't change the analytics: page and ordering.
+IGNORED_PARAMS = ('p', 'o')
+
+
+def get_analytics_cache():
+    """
+    The Django cache of the admin analytics, or ``None`` if not in use.
+    """
+    alias = settings.TRACKING_ANALYZER_ANALYTICS_CACHE_BACKEND
+    return caches[alias] if alias else None
+
+
+def get_generation(cache):
+    """
+    Returns the current generation of the cached analytics. It starts from
+    the current time in milliseconds, so a generation lost by the cache is
+    not reused.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_KEY)
+
+    return generation
+
+
+def get_analytics_cache_key(cache, params):
+    """
+    Returns the cache key of the analytics of the changelist filtered by the
+    given query parameters, in the current generation. The parameters are
+    normalized, so their order doesn't matter.
+    """
+    querystring = urlencode(sorted(
+        (key, value) for key, values in params.lists()
+        if key not in IGNORED_PARAMS for value in values
+    ))
+
+    return 'tracking_analyzer:analytics:{0}:{1}'.format(
+        get_generation(cache),
+        hashlib.md5(querystring.encode('utf-8')).hexdigest()
+    )
+
+
+def invalidate_analytics():
+    """
+    Starts a new generation of the cached analytics, so the ones computed
+    before are not used anymore. To be called when trackers are deleted.
+    """
+    cache = get_analytics_cache()
+    if cache is None:
+        return
+
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
@@ -0,0 +1,144 @@
+import csv
+import gzip
+
+from django.contrib.auth import get_user_model
+
+try:
+    # pylint: disable=import-error
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Columns of the archive files, as read by the ``load_trackers`` command:
+# ``content_type`` holds ``'app_label.model'`` labels and ``user`` usernames.
+ARCHIVE_FIELDS = (
+    'id', 'content_type', 'object_id', 'timestamp', 'ip_address',
+    'ip_country', 'ip_region', 'ip_city', 'referrer', 'device_type', 'device',
+    'browser', 'browser_version', 'system', 'system_version', 'user',
+    'sample_weight', 'hits',
+)
+INTEGER_FIELDS = ('id', 'object_id', 'sample_weight', 'hits')
+
+
+def get_archive_lookups():
+    """
+    Returns the ``values_list`` lookups of the ``ARCHIVE_FIELDS``, with the
+    content type label split in two.
+    """
+    lookups = []
+    for field in ARCHIVE_FIELDS:
+        if field == 'content_type':
+            lookups.extend(['content_type__app_label', 'content_type__model'])
+        elif field == 'user':
+            lookups.append(
+                'user__{0}'.format(get_user_model().USERNAME_FIELD))
+        else:
+            lookups.append(field)
+
+    return lookups
+
+
+def get_archive_row(values):
+    """
+    Returns the ``ARCHIVE_FIELDS`` values of a row read with the
+    ``get_archive_lookups`` lookups.
+    """
+    content_type = '{0}.{1}'.format(values[1], values[2])
+
+    return values[:1] + (content_type,) + values[3:]
+
+
+class CSVArchiveWriter:
+    """
+    Writes archive rows to a gzipped CSV file, readable by the
+    ``load_trackers`` command.
+    """
+    extension = '.csv.gz'
+
+    def __init__(self, path):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(ARCHIVE_FIELDS)
+
+    def write(self, rows):
+        """
+        Writes a list of rows of ``ARCHIVE_FIELDS`` values.
+        """
+        self.writer.writerows(
+            ['' if value is None else
+             value.isoformat() if hasattr(value, 'isoformat') else value
+             for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        """
+        Finishes the file.
+        """
+        self.file.close()
+
+    @staticmethod
+    def count(path):
+        """
+        Counts the rows of an archive file, reading it back.
+        """
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as data:
+            return sum(1 for _ in csv.reader(data)) - 1
+
+
+class ParquetArchiveWriter:
+    """
+    Writes archive rows to a Parquet file, compressed column by column.
+    Requires ``pyarrow``.
+    """
+    extension = '.parquet'
+
+    def __init__(self, path):
+        self.schema = pyarrow.schema([
+            (field, pyarrow.int64() if field in INTEGER_FIELDS else
+             pyarrow.timestamp('us', tz='UTC') if field == 'timestamp' else
+             pyarrow.string())
+            for field in ARCHIVE_FIELDS
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(
+            path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        """
+        Writes a list of rows of ``ARCHIVE_FIELDS`` values, as a row group.
+        """
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type)
+             for column, field in zip(zip(*rows), self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        """
+        Finishes the file.
+        """
+        self.writer.close()
+
+    @staticmethod
+    def count(path):
+        """
+        Counts the rows of an archive file, reading its metadata back.
+        """
+        return pyarrow.parquet.ParquetFile(path).metadata.num_rows
+
+
+def get_archive_writer_class(archive_format='auto'):
+    """
+    Returns the archive writer for the given format: ``'parquet'``, ``'csv'``
+    or ``'auto'`` to use Parquet when ``pyarrow`` is installed.
+    """
+    if archive_format == 'auto':
+        archive_format = 'parquet' if pyarrow else 'csv'
+
+    assert archive_format == 'csv' or pyarrow, \
+        'Parquet archives require pyarrow'
+
+    return ParquetArchiveWriter if archive_format == 'parquet' else \
+        CSVArchiveWriter
@@ -0,0 +1,197 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+
+from .loader import load_trackers
+
+
+logger = logging.getLogger('tracking_analyzer')
+
+
+class TrackerBuffer:
+    """
+    In-memory write-behind buffer of ``Tracker`` data.
+
+    Tracked requests data are queued as plain dictionaries of field values and
+    saved with a single query (see ``tracking_analyzer.loader``) when
+    ``TRACKING_ANALYZER_BUFFER_FLUSH_SIZE`` of them are waiting, or when the
+    oldest one has waited ``TRACKING_ANALYZER_BUFFER_FLUSH_INTERVAL`` seconds.
+    A background thread takes care of the latter, and whatever is left is
+    flushed when the process exits.
+
+    The buffer never holds more than ``TRACKING_ANALYZER_BUFFER_MAX_SIZE``
+    events. When full, ``TRACKING_ANALYZER_BUFFER_OVERFLOW`` decides what to
+    do:
+
+    - ``'block'``: The caller flushes the buffer itself before queueing.
+    - ``'drop_newest'``: The new event is discarded.
+    - ``'drop_oldest'``: The oldest queued event is discarded.
+    """
+    OVERFLOW_POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+    def __init__(self):
+        self.dropped = 0
+        self._reset()
+
+    def _reset(self):
+        """
+        Sets up a brand new, empty buffer owned by the current process.
+        """
+        self._pid = os.getpid()
+        self._events = deque()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def generation(self):
+        """
+        An opaque token of the events currently queued, which changes on every
+        flush.
+        """
+        return self._events
+
+    def _check_process(self):
+        """
+        Forked processes don't inherit the parent threads, nor they should
+        save the parent pending events: start over with an empty buffer.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _start(self):
+        """
+        Starts the background flushing thread, if not running yet. Must be
+        called with the lock held.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='tracking-analyzer-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """
+        Background thread loop, flushing events that waited too long.
+        """
+        while True:
+            interval = settings.TRACKING_ANALYZER_BUFFER_FLUSH_INTERVAL
+            time.sleep(interval)
+
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= interval:
+                close_old_connections()
+                self.flush()
+
+    def append(self, values):
+        """
+        Queues the data of a tracked request.
+
+        :param values: A dictionary with the ``Tracker`` fields values.
+        :return: ``False`` if the event was discarded, ``True`` otherwise.
+        """
+        self._check_process()
+
+        policy = settings.TRACKING_ANALYZER_BUFFER_OVERFLOW
+        assert policy in self.OVERFLOW_POLICIES, \
+            'Invalid `TRACKING_ANALYZER_BUFFER_OVERFLOW` setting'
+
+        max_size = settings.TRACKING_ANALYZER_BUFFER_MAX_SIZE
+        while policy == 'block' and len(self._events) >= max_size:
+            self.flush()
+
+        with self._lock:
+            if len(self._events) >= max_size:
+                self.dropped += 1
+                if policy == 'drop_newest':
+                    return False
+                self._events.popleft()
+
+            self._events.append(values)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._start()
+
+            must_flush = (
+                len(self._events) >=
+                settings.TRACKING_ANALYZER_BUFFER_FLUSH_SIZE or
+                time.monotonic() - self._oldest >=
+                settings.TRACKING_ANALYZER_BUFFER_FLUSH_INTERVAL
+            )
+
+        if must_flush:
+            self.flush()
+
+        return True
+
+    def flush(self):
+        """
+        Saves all the queued events into the database.
+
+        :return: The number of ``Tracker`` objects created.
+        """
+        self._check_process()
+
+        # Only one flush at a time, so events are saved in order.
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, deque()
+                self._oldest = None
+
+            if not events:
+                return 0
+
+            model = apps.get_model('tracking_analyzer', 'Tracker')
+            try:
+                load_trackers(
+                    [model(**values) for values in events],
+                    batch_size=settings.TRACKING_ANALYZER_BUFFER_FLUSH_SIZE
+                )
+            except Exception:  # pylint: disable=broad-except
+                self.dropped += len(events)
+                logger.exception(
+                    'Unable to save %s buffered trackers.', len(events))
+                return 0
+
+            logger.debug('Saved %s buffered trackers.', len(events))
+
+            return len(events)
+
+    def add_hit(self, values, generation):
+        """
+        Counts one more hit in a queued event, if it was not flushed yet.
+
+        :param values: The dictionary of the event, as given to ``append``.
+        :param generation: The buffer ``generation`` before the event was
+        appended. It changes on every flush.
+        :return: ``True`` if the hit was counted, ``False`` otherwise.
+        """
+        with self._lock:
+            if generation is not self._events or self._pid != os.getpid():
+                return False
+
+            values['hits'] = values.get('hits', 1) + 1
+            return True
+
+    def clear(self):
+        """
+        Discards all the queued events.
+        """
+        with self._lock:
+            self._events = deque()
+            self._oldest = None
+
+
+tracker_buffer = TrackerBuffer()
+
+atexit.register(tracker_buffer.flush)
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A small thread-safe, bounded, in-process cache with least-recently-used
+    eviction and optional per-entry expiration.
+
+    It keeps ``hits``, ``misses`` and ``evictions`` counters, available through
+    the ``stats`` method.
+    """
+    def __init__(self, maxsize, ttl=None):
+        """
+        :param maxsize: Maximum number of entries to keep.
+        :param ttl: Default time to live of the entries, in seconds. ``None``
+        means entries never expire.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get_entry(key) is not None
+
+    def _get_entry(self, key):
+        """
+        Returns the ``(expires, value)`` entry for the given key, dropping it
+        if it already expired. Must be called with the lock held.
+        """
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is not None and \
+                entry[0] <= time.monotonic():
+            del self._data[key]
+            entry = None
+
+        return entry
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for the given key, or ``default`` if it is not
+        cached or it already expired.
+        """
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        Caches a value for the given key, evicting the least recently used
+        entries if the cache is full.
+
+        :param ttl: Time to live of this entry, in seconds. Defaults to the
+        cache ``ttl``.
+        """
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Removes the given key from the cache, if present.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Empties the cache and resets its counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dictionary with the cache counters and current size.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
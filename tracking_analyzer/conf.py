@@ -10,7 +10,143 @@ class TrackingAnalyzerAppConf(AppConf):
     - ``MAXMIND_URL``: The MaxMind datasets URL.
     - ``MAXMIND_COUNTRIES``: The file name of the MaxMind Country dataset.
     - ``MAXMIND_CITIES``: The file name of the MaxMind City dataset.
+    - ``GEOIP_MODE``: How the GeoIP2 datasets are opened: ``'auto'``,
+      ``'mmap'``, ``'memory'`` or ``'file'``.
+    - ``GEOIP_RELOAD_INTERVAL``: Seconds between checks for updated GeoIP2
+      datasets on disk.
+    - ``GEOIP_CACHE_SIZE``: Maximum number of IP addresses whose geolocation
+      is cached in each process. ``0`` disables the cache.
+    - ``GEOIP_CACHE_TTL``: Seconds a geolocation result is cached.
+    - ``GEOIP_CACHE_NEGATIVE_TTL``: Seconds a failed geolocation is cached.
+    - ``GEOIP_CACHE_BACKEND``: Optional Django cache alias to share the
+      geolocation results between processes.
+    - ``BUFFER_ENABLED``: Whether trackers are buffered in memory and saved in
+      bulk instead of one by one.
+    - ``BUFFER_FLUSH_SIZE``: Number of buffered trackers that triggers a save.
+    - ``BUFFER_FLUSH_INTERVAL``: Maximum seconds a tracker stays buffered.
+    - ``BUFFER_MAX_SIZE``: Maximum number of buffered trackers.
+    - ``BUFFER_OVERFLOW``: What to do when the buffer is full: ``'block'``,
+      ``'drop_newest'`` or ``'drop_oldest'``.
+    - ``ASYNC_WORKERS``: Number of threads used by ``acreate_from_request``
+      for user agent parsing and geolocation.
+    - ``WORKERS``: Number of background threads used by
+      ``enqueue_from_request``.
+    - ``WORKERS_QUEUE_SIZE``: Maximum number of requests waiting for the
+      background threads.
+    - ``WORKERS_OVERFLOW``: What to do when the queue is full: ``'drop'``,
+      ``'block'`` or ``'run'``.
+    - ``WORKERS_SHUTDOWN_TIMEOUT``: Seconds each background thread is given to
+      finish the queued requests at exit.
+    - ``DEFER_GEOLOCATION``: Whether trackers are saved without geographical
+      info, to be filled later by the ``geolocate_trackers`` command.
+    - ``USER_AGENT_CACHE_SIZE``: Maximum number of user agents whose device
+      classification is cached in each process. ``0`` disables the cache.
+    - ``SAMPLING_RATE``: Fraction of requests that are tracked, from ``0`` to
+      ``1``.
+    - ``SAMPLING_RATES_BY_CONTENT_TYPE``: Sampling rates for specific tracked
+      models, keyed by ``'app_label.model'``.
+    - ``SAMPLING_RATES_BY_DEVICE_TYPE``: Sampling rates for specific device
+      types, like ``'bot'``.
+    - ``SPOOL_ENABLED``: Whether ``create_from_request`` appends the requests
+      to a local spool file instead of saving them into the database.
+    - ``SPOOL_DIR``: Directory where the spool files are written.
+    - ``SPOOL_ROTATE_INTERVAL``: Seconds after which each process starts a new
+      spool file.
+    - ``DEDUP_WINDOW``: Seconds during which repeated hits of a visitor are
+      counted in the same tracker. ``0`` disables it.
+    - ``DEDUP_CACHE_SIZE``: Maximum number of recent trackers remembered in
+      each process to count repeated hits.
+    - ``NORMALIZED_STORAGE``: Whether the user agent and referrer strings are
+      stored once in dimension tables, referenced by the trackers.
+    - ``DIMENSIONS_CACHE_SIZE``: Maximum number of dimension table rows cached
+      in each process.
+    - ``COMPACT_IP_STORAGE``: Whether the IP addresses are stored packed in
+      binary columns, with their network prefix, instead of text.
+    - ``PARTITION_INTERVAL``: Range of each partition of the trackers table
+      on PostgreSQL, ``'month'`` or ``'day'``. ``None`` disables partitioning.
+    - ``PARTITIONS_AHEAD``: Number of future periods the
+      ``partition_trackers`` command creates partitions for.
+    - ``PARTITIONS_RETENTION``: Number of past periods whose partitions are
+      kept by the ``partition_trackers`` command. ``None`` keeps them all.
+    - ``RETENTION_DAYS``: Number of days the ``prune_trackers`` command keeps
+      the trackers. ``None`` keeps them all.
+    - ``RETENTION_DAYS_BY_CONTENT_TYPE``: Retention days for the trackers of
+      specific models, keyed by ``'app_label.model'``.
+    - ``ARCHIVE_DIR``: Directory where the ``archive_trackers`` command writes
+      the archives.
+    - ``ROLLUPS_ENABLED``: Whether the analytics are read from the rollups
+      maintained by the ``update_rollups`` command.
+    - ``ROLLUPS_LAG``: Seconds the ``update_rollups`` and
+      ``update_visitor_sketches`` commands wait before reading a tracker.
+    - ``ROLLUPS_GAP_TIMEOUT``: Seconds the ``update_rollups`` and
+      ``update_visitor_sketches`` commands look for trackers whose ids they
+      passed before their transaction was committed.
+    - ``MATERIALIZED_VIEWS``: Whether the analytics are read from the
+      PostgreSQL materialized views refreshed by the
+      ``refresh_materialized_views`` command.
+    - ``MATERIALIZED_VIEWS_MAX_AGE``: Seconds after a refresh the
+      materialized views are still read.
+    - ``SKETCH_PRECISION``: Precision of the unique visitors sketches, from
+      ``4`` to ``16``. Each sketch has ``2 ** SKETCH_PRECISION`` registers.
+    - ``HEAVY_HITTERS_ENABLED``: Whether the most requested objects and
+      referrers are counted in each process.
+    - ``HEAVY_HITTERS_CAPACITY``: Number of counters of each heavy hitters
+      summary.
+    - ``HEAVY_HITTERS_INTERVAL``: Seconds of each heavy hitters summary, and
+      between saves of the summaries.
+    - ``HEAVY_HITTERS_WINDOW``: Seconds the heavy hitters summaries are kept.
+    - ``ANALYTICS_CACHE_BACKEND``: Optional Django cache alias to cache the
+      admin changelist analytics in.
+    - ``ANALYTICS_CACHE_TTL``: Seconds the admin changelist analytics are
+      cached.
     """
     MAXMIND_URL = "http://geolite.maxmind.com/download/geoip/database/"
     MAXMIND_COUNTRIES = "GeoLite2-Country.mmdb.gz"
     MAXMIND_CITIES = "GeoLite2-City.mmdb.gz"
+    GEOIP_MODE = 'auto'
+    GEOIP_RELOAD_INTERVAL = 60
+    GEOIP_CACHE_SIZE = 10000
+    GEOIP_CACHE_TTL = 60 * 60 * 24
+    GEOIP_CACHE_NEGATIVE_TTL = 60 * 5
+    GEOIP_CACHE_BACKEND = None
+    BUFFER_ENABLED = False
+    BUFFER_FLUSH_SIZE = 500
+    BUFFER_FLUSH_INTERVAL = 5
+    BUFFER_MAX_SIZE = 10000
+    BUFFER_OVERFLOW = 'block'
+    ASYNC_WORKERS = 4
+    WORKERS = 2
+    WORKERS_QUEUE_SIZE = 1000
+    WORKERS_OVERFLOW = 'drop'
+    WORKERS_SHUTDOWN_TIMEOUT = 10
+    DEFER_GEOLOCATION = False
+    USER_AGENT_CACHE_SIZE = 1000
+    SAMPLING_RATE = 1
+    SAMPLING_RATES_BY_CONTENT_TYPE = {}
+    SAMPLING_RATES_BY_DEVICE_TYPE = {}
+    SPOOL_ENABLED = False
+    SPOOL_DIR = None
+    SPOOL_ROTATE_INTERVAL = 60
+    DEDUP_WINDOW = 0
+    DEDUP_CACHE_SIZE = 10000
+    NORMALIZED_STORAGE = False
+    DIMENSIONS_CACHE_SIZE = 10000
+    COMPACT_IP_STORAGE = False
+    PARTITION_INTERVAL = None
+    PARTITIONS_AHEAD = 3
+    PARTITIONS_RETENTION = None
+    RETENTION_DAYS = None
+    RETENTION_DAYS_BY_CONTENT_TYPE = {}
+    ARCHIVE_DIR = None
+    ROLLUPS_ENABLED = False
+    ROLLUPS_LAG = 300
+    ROLLUPS_GAP_TIMEOUT = 24 * 60 * 60
+    MATERIALIZED_VIEWS = False
+    MATERIALIZED_VIEWS_MAX_AGE = 60 * 60
+    SKETCH_PRECISION = 12
+    HEAVY_HITTERS_ENABLED = False
+    HEAVY_HITTERS_CAPACITY = 200
+    HEAVY_HITTERS_INTERVAL = 60
+    HEAVY_HITTERS_WINDOW = 60 * 60
+    ANALYTICS_CACHE_BACKEND = None
+    ANALYTICS_CACHE_TTL = 60
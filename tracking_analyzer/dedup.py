@@ -0,0 +1,97 @@
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F
+
+from .buffer import tracker_buffer
+from .cache import LRUCache
+
+
+class HitCoalescer:
+    """
+    Counts repeated hits in a single ``Tracker``.
+
+    The trackers saved or buffered in the last
+    ``TRACKING_ANALYZER_DEDUP_WINDOW`` seconds are remembered in an in-process
+    ``LRUCache`` of ``TRACKING_ANALYZER_DEDUP_CACHE_SIZE`` entries, keyed on
+    the tracked object, the IP address, the user and the device. A new hit
+    with the same key increments the ``hits`` of the remembered tracker, or of
+    its buffered event, instead of adding a new one.
+    """
+    fields = (
+        'content_type_id', 'object_id', 'ip_address', 'user_id',
+        'device_type', 'device', 'browser', 'browser_version', 'system',
+        'system_version', 'sample_weight',
+    )
+
+    def __init__(self):
+        self._local = None
+        self._lock = threading.Lock()
+
+    @property
+    def local(self):
+        """
+        The in-process cache, built from the current settings on first use.
+        """
+        if self._local is None:
+            with self._lock:
+                if self._local is None:
+                    self._local = LRUCache(
+                        settings.TRACKING_ANALYZER_DEDUP_CACHE_SIZE,
+                        settings.TRACKING_ANALYZER_DEDUP_WINDOW
+                    )
+
+        return self._local
+
+    def get_key(self, values):
+        """
+        Returns the cache key of a hit, from its ``Tracker`` fields values.
+        """
+        return tuple(values.get(field) for field in self.fields)
+
+    def add_hit(self, values):
+        """
+        Counts a hit in the remembered tracker with the same key, if any.
+
+        :param values: A dictionary with the ``Tracker`` fields values.
+        :return: ``True`` if the hit was counted, ``False`` if a new tracker
+        must be saved.
+        """
+        target = self.local.get(self.get_key(values))
+        if target is None:
+            return False
+
+        if isinstance(target, tuple):
+            return tracker_buffer.add_hit(*target)
+
+        model = apps.get_model('tracking_analyzer', 'Tracker')
+        return model.objects.filter(pk=target).update(
+            hits=F('hits') + 1) > 0
+
+    def remember_tracker(self, values, tracker):
+        """
+        Remembers a saved tracker, for the hits to come.
+        """
+        self.local.set(self.get_key(values), tracker.pk)
+
+    def remember_event(self, values, generation):
+        """
+        Remembers a buffered event, for the hits to come while it is still in
+        the buffer.
+
+        :param generation: The buffer ``generation`` before the event was
+        appended.
+        """
+        self.local.set(self.get_key(values), (values, generation))
+
+    def clear(self):
+        """
+        Forgets all the trackers. The cache will be rebuilt from the current
+        settings on next use.
+        """
+        with self._lock:
+            self._local = None
+
+
+hit_coalescer = HitCoalescer()
@@ -0,0 +1,262 @@
+import copy
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.query import ModelIterable, QuerySet, ValuesIterable
+
+from .cache import LRUCache
+
+
+AGENT_FIELDS = (
+    'device', 'browser', 'browser_version', 'system', 'system_version')
+
+# Lookups on the wide ``Tracker`` columns, and the lookups on the dimension
+# tables that replace them in the normalized storage layout.
+DIMENSION_LOOKUPS = dict(
+    [(field, 'agent_dimension__{0}'.format(field)) for field in AGENT_FIELDS] +
+    [('referrer', 'referrer_dimension__url')]
+)
+
+
+class DimensionCache:
+    """
+    Memoizes the ids of the dimension tables rows by their values, and their
+    values by id, in an in-process ``LRUCache`` of
+    ``TRACKING_ANALYZER_DIMENSIONS_CACHE_SIZE`` entries. Dimension rows never
+    change, so they never expire.
+    """
+    def __init__(self):
+        self._local = None
+        self._lock = threading.Lock()
+
+    @property
+    def local(self):
+        """
+        The in-process cache, built from the current settings on first use.
+        """
+        if self._local is None:
+            with self._lock:
+                if self._local is None:
+                    self._local = LRUCache(
+                        settings.TRACKING_ANALYZER_DIMENSIONS_CACHE_SIZE)
+
+        return self._local
+
+    def get_agent_id(self, values):
+        """
+        Returns the id of the ``AgentDimension`` with the given values,
+        creating it if needed.
+
+        :param values: A tuple with the values of ``AGENT_FIELDS``.
+        """
+        agent_id = self.local.get(('agent', values))
+        if agent_id is None:
+            model = apps.get_model('tracking_analyzer', 'AgentDimension')
+            agent_id = model.objects.get_or_create(
+                **dict(zip(AGENT_FIELDS, values)))[0].pk
+            self.local.set(('agent', values), agent_id)
+            self.local.set(('agent_id', agent_id), values)
+
+        return agent_id
+
+    def get_agent(self, agent_id):
+        """
+        Returns the tuple of ``AGENT_FIELDS`` values of an ``AgentDimension``.
+        """
+        values = self.local.get(('agent_id', agent_id))
+        if values is None:
+            model = apps.get_model('tracking_analyzer', 'AgentDimension')
+            values = model.objects.values_list(*AGENT_FIELDS).get(pk=agent_id)
+            self.local.set(('agent_id', agent_id), values)
+
+        return values
+
+    def get_referrer_id(self, url):
+        """
+        Returns the id of the ``ReferrerDimension`` with the given URL,
+        creating it if needed.
+        """
+        referrer_id = self.local.get(('referrer', url))
+        if referrer_id is None:
+            model = apps.get_model('tracking_analyzer', 'ReferrerDimension')
+            referrer_id = model.objects.get_or_create(url=url)[0].pk
+            self.local.set(('referrer', url), referrer_id)
+            self.local.set(('referrer_id', referrer_id), url)
+
+        return referrer_id
+
+    def get_referrer(self, referrer_id):
+        """
+        Returns the URL of a ``ReferrerDimension``.
+        """
+        url = self.local.get(('referrer_id', referrer_id))
+        if url is None:
+            model = apps.get_model('tracking_analyzer', 'ReferrerDimension')
+            url = model.objects.values_list('url', flat=True).get(
+                pk=referrer_id)
+            self.local.set(('referrer_id', referrer_id), url)
+
+        return url
+
+    def clear(self):
+        """
+        Empties the cache. It will be rebuilt from the current settings on next
+        use.
+        """
+        with self._lock:
+            self._local = None
+
+
+dimension_cache = DimensionCache()
+
+
+def normalize_tracker(tracker):
+    """
+    Moves the user agent and referrer strings of an unsaved ``Tracker`` to the
+    dimension tables, if ``TRACKING_ANALYZER_NORMALIZED_STORAGE`` is set.
+    """
+    if not settings.TRACKING_ANALYZER_NORMALIZED_STORAGE or \
+            not tracker.get_deferred_fields().isdisjoint(DIMENSION_LOOKUPS):
+        return
+
+    tracker.agent_dimension_id = dimension_cache.get_agent_id(
+        tuple(getattr(tracker, field) for field in AGENT_FIELDS))
+    tracker.referrer_dimension_id = dimension_cache.get_referrer_id(
+        tracker.referrer) if tracker.referrer else None
+
+    for field in AGENT_FIELDS:
+        setattr(tracker, field, '')
+    tracker.referrer = ''
+
+
+def denormalize_tracker(tracker):
+    """
+    Sets the user agent and referrer strings of a ``Tracker`` stored in the
+    normalized layout back into its fields, so they can be read as usual.
+    """
+    deferred = tracker.get_deferred_fields()
+
+    if 'agent_dimension_id' not in deferred and \
+            tracker.agent_dimension_id is not None:
+        values = dimension_cache.get_agent(tracker.agent_dimension_id)
+        for field, value in zip(AGENT_FIELDS, values):
+            setattr(tracker, field, value)
+
+    if 'referrer_dimension_id' not in deferred and \
+            tracker.referrer_dimension_id is not None:
+        tracker.referrer = dimension_cache.get_referrer(
+            tracker.referrer_dimension_id)
+
+
+def get_lookup_aliases():
+    """
+    Returns the lookups that replace the wide ``Tracker`` columns in the
+    storage layout chosen by ``TRACKING_ANALYZER_NORMALIZED_STORAGE`` and
+    ``TRACKING_ANALYZER_COMPACT_IP_STORAGE``.
+    """
+    aliases = {}
+    if settings.TRACKING_ANALYZER_NORMALIZED_STORAGE:
+        aliases.update(DIMENSION_LOOKUPS)
+    if settings.TRACKING_ANALYZER_COMPACT_IP_STORAGE:
+        aliases['ip_address'] = 'ip_packed'
+
+    return aliases
+
+
+def rewrite_lookup(lookup):
+    """
+    Translates a lookup on a wide ``Tracker`` column, like ``browser`` or
+    ``-referrer__startswith``, to the column that stores it in the current
+    storage layout.
+    """
+    aliases = get_lookup_aliases()
+    prefix = '-' if lookup.startswith('-') else ''
+    field, separator, rest = lookup[len(prefix):].partition('__')
+    if field not in aliases:
+        return lookup
+
+    return prefix + aliases[field] + separator + rest
+
+
+def rewrite_q(node):
+    """
+    Translates the lookups of a ``Q`` object, as ``rewrite_lookup`` does.
+    """
+    clone = copy.copy(node)
+    clone.children = [
+        rewrite_q(child) if isinstance(child, Q) else
+        (rewrite_lookup(child[0]), child[1])
+        for child in node.children
+    ]
+
+    return clone
+
+
+class TrackerIterable(ModelIterable):
+    """
+    Yields ``Tracker`` instances with their user agent and referrer strings
+    read from the dimension tables.
+    """
+    def __iter__(self):
+        for tracker in super().__iter__():
+            denormalize_tracker(tracker)
+            yield tracker
+
+
+class DimensionValuesIterable(ValuesIterable):
+    """
+    Yields dictionaries keyed on the wide ``Tracker`` column names, instead of
+    the lookups that replaced them in the current storage layout.
+    """
+    def __iter__(self):
+        names = {
+            lookup: field for field, lookup in get_lookup_aliases().items()}
+
+        for row in super().__iter__():
+            yield {names.get(key, key): value for key, value in row.items()}
+
+
+class TrackerQuerySet(QuerySet):
+    """
+    ``Tracker`` queryset that keeps the user agent, referrer and IP address
+    fields usable by name in ``filter``, ``exclude``, ``order_by``, ``values``
+    and ``values_list`` when they are stored in the dimension tables or the
+    packed IP address columns.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._iterable_class = TrackerIterable
+
+    def filter(self, *args, **kwargs):
+        return super().filter(
+            *[rewrite_q(arg) if isinstance(arg, Q) else arg for arg in args],
+            **{rewrite_lookup(key): value for key, value in kwargs.items()}
+        )
+
+    def exclude(self, *args, **kwargs):
+        return super().exclude(
+            *[rewrite_q(arg) if isinstance(arg, Q) else arg for arg in args],
+            **{rewrite_lookup(key): value for key, value in kwargs.items()}
+        )
+
+    def order_by(self, *field_names):
+        return super().order_by(*[
+            rewrite_lookup(name) if isinstance(name, str) else name
+            for name in field_names
+        ])
+
+    def values(self, *fields, **expressions):
+        clone = super().values(
+            *[rewrite_lookup(field) for field in fields], **expressions)
+        clone._iterable_class = DimensionValuesIterable
+
+        return clone
+
+    def values_list(self, *fields, flat=False, named=False):
+        return super().values_list(
+            *[rewrite_lookup(field) if isinstance(field, str) else field
+              for field in fields],
+            flat=flat, named=named
+        )
@@ -0,0 +1,302 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
+from django.core.cache import caches
+
+from geoip2.errors import GeoIP2Error
+
+from .cache import LRUCache
+
+
+logger = logging.getLogger('tracking_analyzer')
+
+
+class GeoIPReader:
+    """
+    Process-wide, thread-safe holder of a single ``GeoIP2`` instance.
+
+    The MaxMind datasets are opened once per process, using the mode set in
+    ``TRACKING_ANALYZER_GEOIP_MODE``. Every
+    ``TRACKING_ANALYZER_GEOIP_RELOAD_INTERVAL`` seconds the datasets files are
+    checked on disk and, if they changed (e.g. ``install_geoip_dataset`` has
+    been run), a new ``GeoIP2`` instance is opened and swapped in. Lookups
+    never take the lock: they just use whatever instance is current when they
+    start, so a reload does not block lookups already running.
+    """
+    MODES = {
+        'auto': GeoIP2.MODE_AUTO,
+        'mmap': GeoIP2.MODE_MMAP_EXT,
+        'memory': GeoIP2.MODE_MEMORY,
+        'file': GeoIP2.MODE_FILE,
+    }
+
+    def __init__(self):
+        self._geoip = None
+        self._signature = None
+        self._version = ''
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_dataset_paths():
+        """
+        Returns the paths of the GeoIP2 datasets files, as ``GeoIP2`` would
+        resolve them from the Django settings.
+        """
+        path = getattr(settings, 'GEOIP_PATH', None)
+        if not path or not os.path.isdir(str(path)):
+            return [str(path)] if path else []
+
+        return [
+            os.path.join(
+                str(path),
+                getattr(settings, 'GEOIP_COUNTRY', 'GeoLite2-Country.mmdb')
+            ),
+            os.path.join(
+                str(path),
+                getattr(settings, 'GEOIP_CITY', 'GeoLite2-City.mmdb')
+            ),
+        ]
+
+    def get_signature(self):
+        """
+        Returns a cheap fingerprint of the datasets files on disk, made of
+        their inode, size and modification time.
+        """
+        signature = []
+        for path in self.get_dataset_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signature.append(None)
+            else:
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime))
+
+        return tuple(signature)
+
+    @staticmethod
+    def get_build_epochs(geoip):
+        """
+        Returns the build epochs of the datasets opened by a ``GeoIP2``
+        instance, which are the same in every process and host using them.
+        """
+        # pylint: disable=protected-access
+        return ':'.join(
+            str(reader.metadata().build_epoch)
+            for reader in (geoip._country, geoip._city) if reader
+        )
+
+    def get_geoip(self):
+        """
+        Returns the current ``GeoIP2`` instance, opening it or reopening it if
+        the datasets changed on disk since the last check.
+
+        :return: A ``GeoIP2`` instance.
+        :raises GeoIP2Exception: If the datasets could not be opened.
+        """
+        geoip = self._geoip
+        if geoip is not None and time.monotonic() < self._next_check:
+            return geoip
+
+        with self._lock:
+            # Some other thread might have done the job in the meantime.
+            if self._geoip is not None and \
+                    time.monotonic() < self._next_check:
+                return self._geoip
+
+            self._next_check = time.monotonic() + \
+                settings.TRACKING_ANALYZER_GEOIP_RELOAD_INTERVAL
+
+            signature = self.get_signature()
+            if self._geoip is None or signature != self._signature:
+                self._geoip = self.open()
+                self._version = self.get_build_epochs(self._geoip)
+                if self._signature is not None:
+                    # The datasets changed, so did the cached results.
+                    geoip_cache.clear()
+                self._signature = signature
+
+            return self._geoip
+
+    def open(self):
+        """
+        Opens a new ``GeoIP2`` instance in the configured mode.
+        """
+        mode = settings.TRACKING_ANALYZER_GEOIP_MODE
+        try:
+            cache = self.MODES[mode]
+        except KeyError:
+            raise GeoIP2Exception(
+                'Invalid `TRACKING_ANALYZER_GEOIP_MODE` setting: {0}'.format(
+                    mode)
+            )
+
+        logger.debug('Opening GeoIP2 datasets in "%s" mode.', mode)
+
+        return GeoIP2(cache=cache)
+
+    def get_version(self):
+        """
+        Returns the build epochs of the current datasets, or an empty string
+        if they could not be opened.
+        """
+        try:
+            self.get_geoip()
+        except GeoIP2Exception:
+            return ''
+
+        return self._version
+
+    def reload(self):
+        """
+        Forces the datasets to be reopened on the next lookup.
+        """
+        with self._lock:
+            self._next_check = 0
+            self._signature = None
+
+    def close(self):
+        """
+        Drops the current ``GeoIP2`` instance. Lookups running on it are not
+        affected, the readers are released once they are done with it.
+        """
+        with self._lock:
+            self._geoip = None
+            self._signature = None
+            self._version = ''
+            self._next_check = 0
+
+    def city(self, ip_address):
+        """
+        Shortcut to ``GeoIP2.city`` on the current instance.
+        """
+        return self.get_geoip().city(ip_address)
+
+
+geoip_reader = GeoIPReader()
+
+
+class GeoIPCache:
+    """
+    Memoizes the geolocation results per IP address.
+
+    Results are kept in an in-process ``LRUCache`` of
+    ``TRACKING_ANALYZER_GEOIP_CACHE_SIZE`` entries and, if
+    ``TRACKING_ANALYZER_GEOIP_CACHE_BACKEND`` names a Django cache, also in
+    that cache, so they can be shared by several processes. Failed lookups are
+    cached too, for ``TRACKING_ANALYZER_GEOIP_CACHE_NEGATIVE_TTL`` seconds.
+
+    The shared cache keys include the build epochs of the datasets, so the
+    results of outdated datasets are not read anymore once a process opens
+    the new ones, and just expire.
+    """
+    key_prefix = 'tracking_analyzer:geoip:'
+
+    def __init__(self):
+        self._local = None
+        self._lock = threading.Lock()
+
+    @property
+    def local(self):
+        """
+        The in-process cache, built from the current settings on first use.
+        """
+        if self._local is None:
+            with self._lock:
+                if self._local is None:
+                    self._local = LRUCache(
+                        settings.TRACKING_ANALYZER_GEOIP_CACHE_SIZE,
+                        settings.TRACKING_ANALYZER_GEOIP_CACHE_TTL
+                    )
+
+        return self._local
+
+    @property
+    def shared(self):
+        """
+        The Django cache shared by the processes, or ``None`` if not in use.
+        """
+        alias = settings.TRACKING_ANALYZER_GEOIP_CACHE_BACKEND
+        return caches[alias] if alias else None
+
+    def get_key(self, ip_address):
+        """
+        Returns the shared cache key of the given IP address.
+        """
+        return '{0}{1}:{2}'.format(
+            self.key_prefix, geoip_reader.get_version(), ip_address)
+
+    def get(self, ip_address):
+        """
+        Returns the cached result for the given IP address or ``None``.
+        """
+        result = self.local.get(ip_address)
+        if result is None and self.shared is not None:
+            result = self.shared.get(self.get_key(ip_address))
+            if result is not None:
+                self.local.set(ip_address, result)
+
+        return result
+
+    def set(self, ip_address, result, ttl):
+        """
+        Caches the result for the given IP address.
+        """
+        self.local.set(ip_address, result, ttl)
+        if self.shared is not None:
+            self.shared.set(self.get_key(ip_address), result, ttl)
+
+    def clear(self):
+        """
+        Empties the in-process cache. It will be rebuilt from the current
+        settings on next use. The shared cache is left alone: its keys change
+        with the datasets.
+        """
+        with self._lock:
+            self._local = None
+
+    def stats(self):
+        """
+        Returns the in-process cache counters.
+        """
+        return self.local.stats()
+
+
+geoip_cache = GeoIPCache()
+
+
+def geolocate(ip_address):
+    """
+    Returns the geographical info for the given IP address, either from the
+    cache or from the GeoIP2 datasets.
+
+    :param ip_address: A string with an IPv4 or IPv6 address.
+    :return: A dictionary with the ``country_code``, ``region`` and ``city``
+    of the address, which is empty if it could not be geolocated.
+    """
+    result = geoip_cache.get(ip_address)
+    if result is not None:
+        return result
+
+    try:
+        city = geoip_reader.city(ip_address)
+    except (GeoIP2Error, GeoIP2Exception):
+        logger.exception(
+            'Unable to determine geolocation for address %s', ip_address)
+        result = {}
+        ttl = settings.TRACKING_ANALYZER_GEOIP_CACHE_NEGATIVE_TTL
+    else:
+        result = {
+            'country_code': city.get('country_code') or '',
+            'region': city.get('region') or '',
+            'city': city.get('city') or '',
+        }
+        ttl = settings.TRACKING_ANALYZER_GEOIP_CACHE_TTL
+
+    geoip_cache.set(ip_address, result, ttl)
+
+    return result
@@ -0,0 +1,313 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+
+logger = logging.getLogger('tracking_analyzer')
+
+
+class SpaceSaving:
+    """
+    Space-Saving summary of the most frequent keys of a stream, in at most
+    ``capacity`` counters whatever the number of distinct keys.
+
+    A key without counter takes over the one of the smallest count, which
+    becomes its ``error``: its count is overestimated by at most that. Any
+    key counted more than ``total / capacity`` times has a counter.
+    """
+    def __init__(self, capacity, counters=None):
+        self.capacity = capacity
+        self.counters = counters or {}
+
+    def get_floor(self):
+        """
+        Returns the count any key without counter may have: the smallest
+        one if all the counters are taken, or else ``0``.
+        """
+        if len(self.counters) < self.capacity:
+            return 0
+
+        return min(count for count, _ in self.counters.values())
+
+    def add(self, key, weight=1):
+        """
+        Counts a key ``weight`` times.
+        """
+        if key in self.counters:
+            self.counters[key][0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+        else:
+            smallest = min(self.counters, key=lambda item: self.counters[item])
+            count = self.counters.pop(smallest)[0]
+            self.counters[key] = [count + weight, count]
+
+    def merge(self, other):
+        """
+        Adds the counts of another summary, keeping the ``capacity`` largest
+        ones.
+        """
+        own_floor, other_floor = self.get_floor(), other.get_floor()
+        merged = {}
+        for key in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(key, (own_floor, own_floor))
+            other_count, other_error = other.counters.get(
+                key, (other_floor, other_floor))
+            merged[key] = [count + other_count, error + other_error]
+
+        self.counters = dict(sorted(
+            merged.items(), key=lambda item: item[1], reverse=True
+        )[:self.capacity])
+
+    def top(self, size):
+        """
+        Returns the ``size`` keys of largest count.
+
+        :return: A list of ``(key, count, error)`` tuples.
+        """
+        return [
+            (key, count, error) for key, (count, error) in sorted(
+                self.counters.items(), key=lambda item: item[1], reverse=True
+            )[:size]
+        ]
+
+    def to_json(self):
+        """
+        Returns the counters, to be stored.
+        """
+        return json.dumps(self.counters)
+
+    @classmethod
+    def from_json(cls, capacity, data):
+        """
+        Returns the summary of some stored counters.
+        """
+        return cls(capacity, json.loads(data))
+
+
+class HeavyHitters:
+    """
+    In-process Space-Saving summaries of the most requested objects and
+    referrers, one per stream and period of
+    ``TRACKING_ANALYZER_HEAVY_HITTERS_INTERVAL`` seconds, of
+    ``TRACKING_ANALYZER_HEAVY_HITTERS_CAPACITY`` counters each.
+
+    Every interval, from a background thread, and when the process exits,
+    the summaries are saved into ``HeavyHitterSummary`` objects and the ones
+    of the past periods forgotten, so at most two periods are kept in
+    memory. Stored summaries
+    older than ``TRACKING_ANALYZER_HEAVY_HITTERS_WINDOW`` seconds are
+    deleted.
+    """
+    STREAMS = ('objects', 'referrers')
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        """
+        Sets up brand new, empty summaries owned by the current process.
+        """
+        self._pid = os.getpid()
+        self._process = '{0}:{1}'.format(socket.gethostname(), self._pid)
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _check_process(self):
+        """
+        Forked processes start over with empty summaries, not to save the
+        parent ones as theirs.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _start(self):
+        """
+        Starts the background flushing thread, if not running yet. Must be
+        called with the lock held.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='tracking-analyzer-heavy-hitters',
+                daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """
+        Background thread loop, saving the summaries every interval.
+        """
+        while True:
+            time.sleep(settings.TRACKING_ANALYZER_HEAVY_HITTERS_INTERVAL)
+            close_old_connections()
+            self.flush()
+
+    @staticmethod
+    def get_keys(values):
+        """
+        Returns the key of the tracked object and referrer of a request, by
+        stream.
+        """
+        keys = {'objects': '{0}:{1}'.format(
+            values['content_type_id'], values['object_id'])}
+        if values.get('referrer'):
+            keys['referrers'] = values['referrer']
+
+        return keys
+
+    def add(self, values):
+        """
+        Counts a tracked request, as many times as its sample weight, if
+        ``TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED`` is set.
+
+        :param values: A dictionary with the ``Tracker`` fields values.
+        """
+        if not settings.TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED:
+            return
+
+        self._check_process()
+        interval = settings.TRACKING_ANALYZER_HEAVY_HITTERS_INTERVAL
+        start = int(time.time()) // interval * interval
+
+        with self._lock:
+            for stream, key in self.get_keys(values).items():
+                if (stream, start) not in self._summaries:
+                    self._summaries[(stream, start)] = SpaceSaving(
+                        settings.TRACKING_ANALYZER_HEAVY_HITTERS_CAPACITY)
+                self._summaries[(stream, start)].add(
+                    key, values.get('sample_weight', 1))
+            self._start()
+
+    def flush(self):
+        """
+        Saves the summaries into the database, and forgets the ones of the
+        past periods.
+        """
+        self._check_process()
+        interval = settings.TRACKING_ANALYZER_HEAVY_HITTERS_INTERVAL
+        current = int(time.time()) // interval * interval
+
+        with self._lock:
+            summaries = [
+                (stream, start, summary.to_json())
+                for (stream, start), summary in self._summaries.items()
+            ]
+            self._summaries = {
+                key: summary for key, summary in self._summaries.items()
+                if key[1] >= current
+            }
+
+        if not summaries:
+            return
+
+        model = apps.get_model('tracking_analyzer', 'HeavyHitterSummary')
+        try:
+            for stream, start, counters in summaries:
+                model.objects.update_or_create(
+                    stream=stream, start=get_datetime(start),
+                    process=self._process, defaults={'counters': counters})
+
+            model.objects.filter(start__lt=get_datetime(
+                current - settings.TRACKING_ANALYZER_HEAVY_HITTERS_WINDOW
+            )).delete()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Unable to save the heavy hitters summaries.')
+
+    def clear(self):
+        """
+        Forgets all the summaries.
+        """
+        with self._lock:
+            self._summaries = {}
+
+
+def get_datetime(value):
+    """
+    Returns the datetime of a Unix timestamp, aware only if time zone support
+    is enabled.
+    """
+    value = datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+
+    return value if settings.USE_TZ else timezone.make_naive(value)
+
+
+def get_heavy_hitters(stream, size=50, window=None):
+    """
+    Returns the most frequent keys of a stream over the last ``window``
+    seconds, merging the stored summaries of every process. The summaries of
+    the current period are saved every
+    ``TRACKING_ANALYZER_HEAVY_HITTERS_INTERVAL`` seconds.
+
+    :param stream: ``'objects'`` or ``'referrers'``.
+    :param size: Number of keys returned.
+    :param window: Seconds to look back. Defaults to
+    ``TRACKING_ANALYZER_HEAVY_HITTERS_WINDOW``.
+    :return: A list of ``(key, requests, error)`` tuples, ``requests`` being
+    overestimated by at most ``error``.
+    """
+    model = apps.get_model('tracking_analyzer', 'HeavyHitterSummary')
+    capacity = settings.TRACKING_ANALYZER_HEAVY_HITTERS_CAPACITY
+    window = window or settings.TRACKING_ANALYZER_HEAVY_HITTERS_WINDOW
+
+    summary = SpaceSaving(capacity)
+    for counters in model.objects.filter(
+            stream=stream,
+            start__gte=get_datetime(int(time.time()) - window)
+    ).values_list('counters', flat=True):
+        summary.merge(SpaceSaving.from_json(capacity, counters))
+
+    return summary.top(size)
+
+
+def get_top_objects(size=50, window=None):
+    """
+    Returns the most requested objects over the last ``window`` seconds (see
+    ``get_heavy_hitters``).
+
+    :return: A list of ``(content_object, requests, error)`` tuples. Deleted
+    objects are ``None``.
+    """
+    content_type_model = apps.get_model('contenttypes', 'ContentType')
+    top = [
+        (key.split(':'), requests, error)
+        for key, requests, error in get_heavy_hitters(
+            'objects', size, window)
+    ]
+
+    objects = {}
+    for content_type_id in {key[0] for key, _, _ in top}:
+        content_type = content_type_model.objects.get_for_id(content_type_id)
+        for pk, instance in content_type.model_class()._default_manager \
+                .in_bulk([key[1] for key, _, _ in top
+                          if key[0] == content_type_id]).items():
+            objects[(content_type_id, str(pk))] = instance
+
+    return [
+        (objects.get(tuple(key)), requests, error)
+        for key, requests, error in top
+    ]
+
+
+def get_top_referrers(size=50, window=None):
+    """
+    Returns the most frequent referrers over the last ``window`` seconds
+    (see ``get_heavy_hitters``).
+
+    :return: A list of ``(referrer, requests, error)`` tuples.
+    """
+    return get_heavy_hitters('referrers', size, window)
+
+
+heavy_hitters = HeavyHitters()
+
+atexit.register(heavy_hitters.flush)
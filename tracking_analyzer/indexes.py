@@ -0,0 +1,110 @@
+from django.apps import apps
+from django.db import connections, router
+
+
+BRIN_INDEX = 'tracker_timestamp_brin'
+BTREE_INDEX = 'tracker_timestamp_idx'
+
+
+class TimestampIndexes:
+    """
+    Manages the optional PostgreSQL BRIN index on the ``timestamp`` of the
+    ``Tracker`` table, and the ``tracker_timestamp_idx`` B-tree index it can
+    replace.
+
+    Every method can be run again safely: indexes are only created if they
+    are missing, or invalid after an interrupted concurrent build, and only
+    dropped if they exist. Indexes are created and dropped concurrently, not
+    to block the writes to the table, except on a partitioned table where
+    PostgreSQL does not support it.
+    """
+    def __init__(self, using=None):
+        self.model = apps.get_model('tracking_analyzer', 'Tracker')
+        self.connection = connections[
+            using or router.db_for_write(self.model)]
+        self.table = self.model._meta.db_table
+
+    def quote(self, name):
+        """
+        Quotes a table or index name.
+        """
+        return self.connection.ops.quote_name(name)
+
+    def execute(self, sql, params=None):
+        """
+        Runs a SQL statement and returns its rows, if any.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else []
+
+    def is_partitioned(self):
+        """
+        Whether the ``Tracker`` table is partitioned.
+        """
+        return self.execute(
+            'SELECT relkind FROM pg_class WHERE oid = %s::regclass',
+            [self.table]
+        )[0][0] == 'p'
+
+    def get_indexes(self):
+        """
+        Returns the indexes of the ``Tracker`` table.
+
+        :return: A dictionary with whether each index is valid, by name.
+        """
+        return dict(self.execute(
+            'SELECT c.relname, i.indisvalid FROM pg_index i '
+            'JOIN pg_class c ON c.oid = i.indexrelid '
+            'WHERE i.indrelid = %s::regclass',
+            [self.table]
+        ))
+
+    def get_btree_index(self):
+        """
+        Returns the ``tracker_timestamp_idx`` index of the ``Tracker`` model.
+        """
+        return next(index for index in self.model._meta.indexes
+                    if index.name == BTREE_INDEX)
+
+    def create(self, name):
+        """
+        Creates the ``BRIN_INDEX`` or ``BTREE_INDEX`` index, if missing.
+
+        :return: Whether the index was created.
+        """
+        indexes = self.get_indexes()
+        if indexes.get(name):
+            return False
+
+        if name in indexes:
+            # Left invalid by an interrupted concurrent build.
+            self.drop(name)
+
+        concurrently = not self.is_partitioned()
+        if name == BRIN_INDEX:
+            self.execute('CREATE INDEX {0}{1} ON {2} USING brin '
+                         '("timestamp")'.format(
+                             'CONCURRENTLY ' if concurrently else '',
+                             self.quote(name), self.quote(self.table)))
+        else:
+            with self.connection.schema_editor(atomic=False) as editor:
+                editor.execute(self.get_btree_index().create_sql(
+                    self.model, editor, concurrently=concurrently))
+
+        return True
+
+    def drop(self, name):
+        """
+        Drops the ``BRIN_INDEX`` or ``BTREE_INDEX`` index, if it exists.
+
+        :return: Whether the index was dropped.
+        """
+        if name not in self.get_indexes():
+            return False
+
+        self.execute('DROP INDEX {0}{1}'.format(
+            '' if self.is_partitioned() else 'CONCURRENTLY ',
+            self.quote(name)))
+
+        return True
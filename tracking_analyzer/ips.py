@@ -0,0 +1,147 @@
+import ipaddress
+
+from django.conf import settings
+from django.db import models
+
+
+# Length of the network prefixes precomputed for each address family, like the
+# ``/24`` networks of IPv4 and the ``/48`` sites of IPv6.
+IPV4_PREFIX_LENGTH = 24
+IPV6_PREFIX_LENGTH = 48
+
+
+def pack_ip(address):
+    """
+    Packs an IP address in 16 bytes, with IPv4 addresses mapped into IPv6, so
+    both families sort and compare as fixed-width binary strings.
+
+    :param address: A string or an ``ipaddress`` address.
+    """
+    address = ipaddress.ip_address(address)
+    if address.version == 4:
+        address = ipaddress.IPv6Address('::ffff:{0}'.format(address))
+
+    return address.packed
+
+
+def unpack_ip(value):
+    """
+    Returns the string of an IP address packed by ``pack_ip``.
+    """
+    address = ipaddress.IPv6Address(bytes(value))
+
+    return str(address.ipv4_mapped or address)
+
+
+def get_ip_prefix(address):
+    """
+    Returns the network address of the ``IPV4_PREFIX_LENGTH`` or
+    ``IPV6_PREFIX_LENGTH`` prefix an IP address belongs to.
+    """
+    address = ipaddress.ip_address(address)
+    length = IPV4_PREFIX_LENGTH if address.version == 4 else \
+        IPV6_PREFIX_LENGTH
+
+    return str(ipaddress.ip_network(
+        '{0}/{1}'.format(address, length), strict=False).network_address)
+
+
+def get_ip_range(network):
+    """
+    Returns the first and last packed addresses of a network.
+
+    :param network: A string in CIDR notation, like ``'10.1.0.0/16'``.
+    """
+    network = ipaddress.ip_network(network, strict=False)
+
+    return (
+        pack_ip(network.network_address),
+        pack_ip(network.broadcast_address)
+    )
+
+
+class PackedIPAddressField(models.BinaryField):
+    """
+    An IP address stored as 16 bytes by ``pack_ip``, instead of text. It reads
+    and accepts address strings, and supports ``in_network`` lookups.
+    """
+    description = 'IP address packed in 16 bytes'
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 16)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        # MySQL and Oracle store binary fields as BLOBs, which can't be
+        # indexed.
+        if connection.vendor == 'mysql':
+            return 'varbinary({0})'.format(self.max_length)
+        if connection.vendor == 'oracle':
+            return 'RAW({0})'.format(self.max_length)
+
+        return super().db_type(connection)
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else unpack_ip(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+
+        return unpack_ip(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+
+        return pack_ip(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+@PackedIPAddressField.register_lookup
+class InNetwork(models.Lookup):
+    """
+    ``ip_packed__in_network='10.1.0.0/16'`` selects the addresses of a network
+    with a range scan.
+    """
+    lookup_name = 'in_network'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        first, last = get_ip_range(self.rhs)
+        params = list(params) + [
+            connection.Database.Binary(first),
+            connection.Database.Binary(last)
+        ]
+
+        return '{0} BETWEEN %s AND %s'.format(lhs), params
+
+
+def compact_tracker(tracker):
+    """
+    Moves the IP address of a ``Tracker`` to its packed columns, if
+    ``TRACKING_ANALYZER_COMPACT_IP_STORAGE`` is set.
+    """
+    if not settings.TRACKING_ANALYZER_COMPACT_IP_STORAGE or \
+            'ip_address' in tracker.get_deferred_fields() or \
+            not tracker.ip_address:
+        return
+
+    tracker.ip_packed = tracker.ip_address
+    tracker.ip_prefix = get_ip_prefix(tracker.ip_address)
+    tracker.ip_address = None
+
+
+def expand_tracker(tracker):
+    """
+    Sets the IP address of a ``Tracker`` stored in its packed columns back
+    into ``ip_address``, so it can be read as usual.
+    """
+    deferred = tracker.get_deferred_fields()
+
+    if 'ip_packed' not in deferred and tracker.ip_packed is not None and \
+            ('ip_address' in deferred or tracker.ip_address is None):
+        tracker.ip_address = tracker.ip_packed
@@ -0,0 +1,106 @@
+import io
+from itertools import islice
+
+from django.apps import apps
+from django.db import connections, router
+
+from .dimensions import normalize_tracker
+from .ips import compact_tracker
+
+
+def supports_copy(using):
+    """
+    Whether the given database can load rows with ``COPY ... FROM STDIN``.
+    """
+    return connections[using].vendor == 'postgresql'
+
+
+def format_csv_value(value):
+    """
+    Formats a value as a ``COPY`` CSV field: ``NULL`` is an unquoted empty
+    field, binary values are hex encoded and any other value, even an empty
+    string, is quoted.
+    """
+    if value is None:
+        return ''
+
+    # psycopg2 wraps binary values in an adapter.
+    value = getattr(value, 'adapted', value)
+    if isinstance(value, (bytes, memoryview)):
+        value = '\\x{0}'.format(bytes(value).hex())
+
+    return '"{0}"'.format(str(value).replace('"', '""'))
+
+
+def copy_trackers(trackers, using):
+    """
+    Inserts unsaved ``Tracker`` instances with a single PostgreSQL
+    ``COPY ... FROM STDIN`` statement.
+
+    Values are converted exactly as the ORM does before saving them, and
+    written as CSV. Primary keys are left to the database.
+
+    :param trackers: A list of unsaved ``Tracker`` instances.
+    :param using: The database alias.
+    """
+    model = apps.get_model('tracking_analyzer', 'Tracker')
+    connection = connections[using]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.auto_field
+    ]
+
+    data = io.StringIO()
+    for tracker in trackers:
+        data.write(','.join(
+            format_csv_value(field.get_db_prep_save(
+                field.pre_save(tracker, True), connection))
+            for field in fields
+        ) + '\n')
+    data.seek(0)
+
+    sql = 'COPY {0} ({1}) FROM STDIN WITH (FORMAT csv)'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, data)
+
+
+def load_trackers(trackers, batch_size=1000, using=None, use_copy=True):
+    """
+    Saves many unsaved ``Tracker`` instances, in batches.
+
+    On PostgreSQL each batch is streamed into the table with ``COPY``, which
+    is much faster than the multi-row ``INSERT`` statements of
+    ``bulk_create``. Other databases fall back to ``bulk_create``. Don't rely
+    on the primary keys of the saved instances being set.
+
+    :param trackers: An iterable of unsaved ``Tracker`` instances.
+    :param batch_size: Number of trackers saved at once, or ``None`` to save
+    them all at once.
+    :param using: The database alias. Defaults to the one for writing
+    ``Tracker`` objects.
+    :param use_copy: Set it to ``False`` to always use ``bulk_create``.
+    :return: The number of ``Tracker`` objects saved.
+    """
+    model = apps.get_model('tracking_analyzer', 'Tracker')
+    using = using or router.db_for_write(model)
+    use_copy = use_copy and supports_copy(using)
+
+    loaded = 0
+    trackers = iter(trackers)
+    while True:
+        batch = list(islice(trackers, batch_size))
+        if not batch:
+            return loaded
+
+        for tracker in batch:
+            normalize_tracker(tracker)
+            compact_tracker(tracker)
+
+        if use_copy:
+            copy_trackers(batch, using)
+        else:
+            model.objects.using(using).bulk_create(batch)
+        loaded += len(batch)
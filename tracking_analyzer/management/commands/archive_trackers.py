@@ -0,0 +1,192 @@
+import datetime
+import os
+import tempfile
+from array import array
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.utils import timezone
+
+from tracking_analyzer.analytics import invalidate_analytics
+from tracking_analyzer.archive import (
+    get_archive_lookups, get_archive_row, get_archive_writer_class)
+from tracking_analyzer.models import Tracker
+
+
+class Command(BaseCommand):
+    help = 'Archives the trackers older than a number of days to compressed ' \
+           'files, one directory per day, and optionally deletes them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            default=settings.TRACKING_ANALYZER_ARCHIVE_DIR,
+            help='Directory where the archives are written. Defaults to '
+                 'TRACKING_ANALYZER_ARCHIVE_DIR.'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TRACKING_ANALYZER_RETENTION_DAYS,
+            help='Archive the trackers of the days before this number of days '
+                 'ago. Defaults to TRACKING_ANALYZER_RETENTION_DAYS.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['auto', 'parquet', 'csv'],
+            default='auto',
+            help='Archive format. "auto" uses Parquet if pyarrow is '
+                 'installed, and gzipped CSV otherwise.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of trackers read and written at once.'
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete the archived trackers, once their archive is '
+                 'verified.'
+        )
+
+    @staticmethod
+    def get_day(timestamp):
+        """
+        Returns the UTC day of a tracker timestamp.
+        """
+        if timezone.is_aware(timestamp):
+            timestamp = timestamp.astimezone(datetime.timezone.utc)
+
+        return timestamp.date()
+
+    @staticmethod
+    def get_day_start(day):
+        """
+        Returns the first instant of a UTC day, naive if time zone support is
+        disabled.
+        """
+        start = datetime.datetime.combine(day, datetime.time())
+        if settings.USE_TZ:
+            start = timezone.make_aware(start, datetime.timezone.utc)
+
+        return start
+
+    def archive_day(self, day, rows, directory, writer_class, chunk_size):
+        """
+        Writes the rows of a day to a new archive file, and verifies it
+        against the file and the database.
+
+        :return: An array with the ids of the archived trackers, or ``None``
+        if the archive could not be verified.
+        """
+        day_directory = os.path.join(
+            directory, 'day={0}'.format(day.isoformat()))
+        os.makedirs(day_directory, exist_ok=True)
+        # Overlapping runs write their own temporary files.
+        handle, temporary_path = tempfile.mkstemp(
+            suffix='.tmp', dir=day_directory)
+        os.close(handle)
+
+        ids = array('q')
+        writer = writer_class(temporary_path)
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                writer.write(chunk)
+                ids.extend(row[0] for row in chunk)
+        finally:
+            writer.close()
+
+        # Every tracker of the day in the archived ids range must be in the
+        # archive, and the archive must be readable.
+        first_pk, last_pk = min(ids), max(ids)
+        start = self.get_day_start(day)
+        stored = Tracker.objects.filter(
+            timestamp__gte=start,
+            timestamp__lt=start + datetime.timedelta(days=1),
+            pk__gte=first_pk, pk__lte=last_pk
+        ).count()
+        if writer_class.count(temporary_path) != len(ids) or \
+                stored != len(ids):
+            os.remove(temporary_path)
+            return None
+
+        os.rename(temporary_path, os.path.join(
+            day_directory, 'trackers-{0}-{1}{2}'.format(
+                first_pk, last_pk, writer_class.extension)))
+
+        return ids
+
+    @staticmethod
+    def delete_day(ids, batch_size):
+        """
+        Deletes the archived trackers of a day, in batches of ids and without
+        the Django deletion collector.
+
+        Only the archived ids are deleted: trackers of the same day and ids
+        range committed since they were read, by a long transaction, are
+        kept for the next run.
+        """
+        using = router.db_for_write(Tracker)
+        ids = sorted(ids)
+
+        for index in range(0, len(ids), batch_size):
+            with transaction.atomic(using=using):
+                Tracker.objects.filter(
+                    pk__in=ids[index:index + batch_size])._raw_delete(using)
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not directory:
+            raise CommandError(
+                '`TRACKING_ANALYZER_ARCHIVE_DIR` setting is not set.')
+        if options['days'] is None:
+            raise CommandError('The number of days to keep is not set.')
+
+        try:
+            writer_class = get_archive_writer_class(options['format'])
+        except AssertionError as error:
+            raise CommandError(str(error))
+
+        cutoff = self.get_day_start(self.get_day(
+            timezone.now() - datetime.timedelta(days=options['days'])))
+        rows = (
+            get_archive_row(values) for values in Tracker.objects.filter(
+                timestamp__lt=cutoff
+            ).order_by('timestamp', 'pk').values_list(
+                *get_archive_lookups()
+            ).iterator(chunk_size=options['chunk_size'])
+        )
+
+        # The trackers are only deleted after reading all of them, not to
+        # change the table under the open cursor.
+        archived = []
+        for day, day_rows in groupby(
+                rows, key=lambda row: self.get_day(row[3])):
+            ids = self.archive_day(
+                day, day_rows, directory, writer_class, options['chunk_size'])
+            if ids is None:
+                self.stdout.write(
+                    '{0}: archive could not be verified.'.format(day))
+                continue
+
+            archived.append((day, ids))
+            self.stdout.write('{0}: {1} trackers archived.'.format(
+                day, len(ids)))
+
+        if options['delete']:
+            for day, ids in archived:
+                self.delete_day(ids, options['chunk_size'])
+                self.stdout.write('{0}: archived trackers deleted.'.format(
+                    day))
+
+            invalidate_analytics()
+
+        self.stdout.write('Archive done.')
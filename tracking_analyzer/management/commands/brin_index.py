@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.indexes import BRIN_INDEX, BTREE_INDEX, TimestampIndexes
+
+
+class Command(BaseCommand):
+    help = 'Creates the BRIN index on the timestamp of the trackers table ' \
+           'on PostgreSQL, or drops it. Can be run again safely.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replace-btree',
+            action='store_true',
+            help='Drop the B-tree index on the timestamp once the BRIN one '
+                 'is built.'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop the BRIN index instead, creating the B-tree index on '
+                 'the timestamp back first if missing.'
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Database alias. Defaults to the one for writing trackers.'
+        )
+
+    def handle(self, *args, **options):
+        indexes = TimestampIndexes(using=options['database'])
+        if indexes.connection.vendor != 'postgresql':
+            raise CommandError('BRIN indexes are only available on '
+                               'PostgreSQL.')
+
+        if options['drop']:
+            # The timestamp ranges are never left without index.
+            actions = [(indexes.create, BTREE_INDEX, 'created'),
+                       (indexes.drop, BRIN_INDEX, 'dropped')]
+        else:
+            actions = [(indexes.create, BRIN_INDEX, 'created')]
+            if options['replace_btree']:
+                actions.append((indexes.drop, BTREE_INDEX, 'dropped'))
+
+        for action, name, done in actions:
+            self.stdout.write('{0}: {1}.'.format(
+                name, done if action(name) else 'unchanged'))
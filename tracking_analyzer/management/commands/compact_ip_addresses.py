@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.ips import compact_tracker
+from tracking_analyzer.models import Tracker
+
+
+class Command(BaseCommand):
+    help = 'Moves the IP addresses of the existing trackers to the packed ' \
+           'binary columns, or back with --reverse.'
+
+    fields = ['ip_address', 'ip_packed', 'ip_prefix']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reverse',
+            action='store_true',
+            help='Copy the addresses back into the text column, before '
+                 'unsetting TRACKING_ANALYZER_COMPACT_IP_STORAGE.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of trackers processed at once.'
+        )
+
+    @staticmethod
+    def expand_tracker(tracker):
+        """
+        Clears the packed columns of a ``Tracker`` read with its IP address
+        from them, so it is saved in its text column.
+        """
+        tracker.ip_packed = None
+        tracker.ip_prefix = None
+
+    def handle(self, *args, **options):
+        reverse = options['reverse']
+        chunk_size = options['chunk_size']
+
+        if reverse == settings.TRACKING_ANALYZER_COMPACT_IP_STORAGE:
+            raise CommandError(
+                '`TRACKING_ANALYZER_COMPACT_IP_STORAGE` setting must be '
+                '{0}.'.format('unset' if reverse else 'set'))
+
+        # The base manager queries the columns as they are, whatever the
+        # storage layout.
+        queryset = Tracker._base_manager.only('pk', *self.fields)
+        if reverse:
+            queryset = queryset.filter(ip_packed__isnull=False)
+            convert = self.expand_tracker
+        else:
+            queryset = queryset.filter(ip_address__isnull=False)
+            convert = compact_tracker
+
+        last_pk = 0
+        processed = 0
+        while True:
+            trackers = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not trackers:
+                break
+
+            last_pk = trackers[-1].pk
+            for tracker in trackers:
+                convert(tracker)
+            Tracker.objects.bulk_update(trackers, self.fields)
+
+            processed += len(trackers)
+            self.stdout.write('{0} trackers processed.'.format(processed))
+
+        self.stdout.write('Compaction done.')
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+
+from tracking_analyzer.geoip import geolocate
+from tracking_analyzer.models import Tracker
+
+
+class Command(BaseCommand):
+    help = 'Fills the geographical info of the trackers from their IP ' \
+           'address, using the installed MaxMind(R) datasets.'
+
+    fields = ['ip_country', 'ip_region', 'ip_city']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Geolocate all the trackers again, not only the ones without'
+                 ' geographical info. Useful after updating the datasets.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of trackers processed at once.'
+        )
+
+    def geolocate_chunk(self, trackers):
+        """
+        Geolocates a chunk of trackers, looking up each IP address only once.
+
+        :param trackers: A list of ``Tracker`` instances.
+        :return: The list of trackers whose geographical info changed.
+        """
+        locations = {
+            ip_address: geolocate(ip_address)
+            for ip_address in {tracker.ip_address for tracker in trackers}
+        }
+
+        changed = []
+        for tracker in trackers:
+            city = locations[tracker.ip_address]
+            values = (
+                city.get('country_code', ''),
+                city.get('region', ''),
+                city.get('city', '')
+            )
+
+            if values != (tracker.ip_country, tracker.ip_region,
+                          tracker.ip_city):
+                tracker.ip_country, tracker.ip_region, tracker.ip_city = \
+                    values
+                changed.append(tracker)
+
+        return changed
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        queryset = Tracker.objects.filter(ip_address__isnull=False)
+        if not options['all']:
+            queryset = queryset.filter(ip_country='', ip_region='', ip_city='')
+        queryset = queryset.only(
+            'pk', 'ip_address', 'ip_packed', *self.fields)
+
+        last_pk = 0
+        processed = updated = 0
+        while True:
+            trackers = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not trackers:
+                break
+
+            last_pk = trackers[-1].pk
+            changed = self.geolocate_chunk(trackers)
+            Tracker.objects.bulk_update(changed, self.fields)
+
+            processed += len(trackers)
+            updated += len(changed)
+            self.stdout.write(
+                '{0} trackers processed, {1} updated.'.format(
+                    processed, updated)
+            )
+
+        self.stdout.write('Geolocation done.')
@@ -1,11 +1,16 @@
 import gzip
-from os.path import isfile, join, splitext
+import os
+import shutil
+import tempfile
+from os.path import dirname, isfile, join, splitext
 from urllib.error import HTTPError, URLError
 from urllib.request import urlopen
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from tracking_analyzer.geoip import geoip_reader
+
 
 class Command(BaseCommand):
     help = 'Installs/updates the MaxMind(R) datasets. Plase check ' \
@@ -91,14 +96,36 @@ class Command(BaseCommand):
 
         self.stdout.write('Uncompressing downloaded dataset...')
 
-        with gzip.open(filename, 'rb') as gzipped:
-            with open(splitext(filename)[0], 'wb') as gunzipped:
-                gunzipped.write(gzipped.read())
-                self.stdout.write(
-                    '{0} dataset installed and ready for use.'.format(
-                        splitext(filename)[0]
-                    )
-                )
+        target = self.uncompress_dataset(filename)
+        self.stdout.write(
+            '{0} dataset installed and ready for use.'.format(target))
+
+    def uncompress_dataset(self, filename):
+        """
+        Uncompresses a downloaded dataset next to it.
+
+        The dataset is uncompressed into a temporary file and then moved over
+        the current one, so running processes never see a half-written dataset
+        and can hot reload it.
+
+        :param filename: The path of the gzipped dataset.
+        :return: The path of the uncompressed dataset.
+        """
+        target = splitext(filename)[0]
+        descriptor, temporary = tempfile.mkstemp(dir=dirname(target))
+        try:
+            with gzip.open(filename, 'rb') as gzipped:
+                with os.fdopen(descriptor, 'wb') as gunzipped:
+                    shutil.copyfileobj(gzipped, gunzipped)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+        geoip_reader.reload()
+
+        return target
 
     def checkout_datasets(self, geoip_dir, url, datasets):
         for dataset in datasets:
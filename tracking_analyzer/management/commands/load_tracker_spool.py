@@ -0,0 +1,66 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tracking_analyzer.models import Checkpoint, Tracker
+from tracking_analyzer.spool import tracker_spool
+
+
+class Command(BaseCommand):
+    help = 'Loads the tracked requests written to the spool files into the ' \
+           'database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of requests saved at once.'
+        )
+
+    @staticmethod
+    def load_file(path, batch_size):
+        """
+        Loads a spool file from the position where the previous load stopped.
+
+        Each batch is saved in the same transaction that moves the file
+        checkpoint forward, so an interrupted load neither loses nor
+        duplicates requests when run again.
+
+        :param path: The spool file path.
+        :param batch_size: Number of requests saved at once.
+        :return: The number of ``Tracker`` objects created.
+        """
+        name = os.path.basename(path)
+        loaded = 0
+
+        while True:
+            with transaction.atomic():
+                checkpoint, _ = Checkpoint.objects.select_for_update(
+                    ).get_or_create(name=name)
+                rows, position = tracker_spool.read(
+                    path, checkpoint.position, batch_size)
+                if not rows:
+                    return loaded
+
+                loaded += Tracker.objects.create_batch(rows)
+
+                checkpoint.position = position
+                checkpoint.save(update_fields=['position'])
+
+    def handle(self, *args, **options):
+        for path, finished in tracker_spool.get_files():
+            loaded = self.load_file(path, options['batch_size'])
+
+            if finished:
+                # The file goes first: if the process dies in between, the
+                # leftover checkpoint is harmless.
+                os.remove(path)
+                Checkpoint.objects.filter(
+                    name=os.path.basename(path)).delete()
+
+            self.stdout.write('{0}: {1} trackers loaded.'.format(
+                os.path.basename(path), loaded))
+
+        self.stdout.write('Spool loaded.')
@@ -0,0 +1,161 @@
+import csv
+import gzip
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from tracking_analyzer.loader import load_trackers, supports_copy
+from tracking_analyzer.models import Tracker
+
+
+class Command(BaseCommand):
+    help = 'Loads trackers from CSV files, using PostgreSQL COPY when ' \
+           'available.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            metavar='path',
+            help='CSV files, optionally gzipped, with a header row of '
+                 '`Tracker` field names. `content_type` holds '
+                 '"app_label.model" labels and `user` holds usernames.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of trackers saved at once.'
+        )
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Compare the loading speed with COPY and with the ORM, '
+                 'without keeping the loaded trackers.'
+        )
+
+    def __init__(self, *args, **kwargs):
+        super(Command, self).__init__(*args, **kwargs)
+        self.content_types = {}
+        self.users = {}
+
+    @staticmethod
+    def read_rows(paths):
+        """
+        Yields the rows of the given CSV files as dictionaries.
+        """
+        for path in paths:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', newline='', encoding='utf-8') as data:
+                yield from csv.DictReader(data)
+
+    def get_content_type_id(self, label):
+        """
+        Returns the ``ContentType`` id of an ``'app_label.model'`` label.
+        """
+        if label not in self.content_types:
+            try:
+                self.content_types[label] = \
+                    ContentType.objects.get_by_natural_key(
+                        *label.split('.', 1)).pk
+            except (ContentType.DoesNotExist, TypeError):
+                raise CommandError('Unknown content type: {0}'.format(label))
+
+        return self.content_types[label]
+
+    def resolve_users(self, rows):
+        """
+        Looks up, with a single query, the ids of the users of a batch of rows
+        that are not known yet. Unknown usernames resolve to no user.
+        """
+        user_model = get_user_model()
+        usernames = {row.get('user') for row in rows}
+        usernames -= set(self.users) | {'', None}
+        if not usernames:
+            return
+
+        self.users.update(dict.fromkeys(usernames))
+        self.users.update(
+            user_model.objects.filter(**{
+                '{0}__in'.format(user_model.USERNAME_FIELD): usernames
+            }).values_list(user_model.USERNAME_FIELD, 'pk')
+        )
+
+    def build_tracker(self, row):
+        """
+        Builds an unsaved ``Tracker`` from a CSV row, converting each value to
+        the type of its field. Columns that are not ``Tracker`` fields, like
+        ``id``, are ignored.
+        """
+        tracker = Tracker(
+            content_type_id=self.get_content_type_id(row['content_type']),
+            user_id=self.users.get(row.get('user') or None)
+        )
+
+        for field in Tracker._meta.concrete_fields:
+            value = row.get(field.name)
+            if field.is_relation or field.primary_key or value is None:
+                continue
+
+            if value == '' and field.null:
+                value = None
+            setattr(tracker, field.attname, field.to_python(value))
+
+        return tracker
+
+    def load(self, paths, batch_size, use_copy=True):
+        """
+        Loads the trackers from the given CSV files.
+
+        :return: The number of ``Tracker`` objects saved.
+        """
+        loaded = 0
+        rows = self.read_rows(paths)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return loaded
+
+            self.resolve_users(batch)
+            loaded += load_trackers(
+                [self.build_tracker(row) for row in batch],
+                batch_size=None, use_copy=use_copy
+            )
+
+    def benchmark(self, paths, batch_size):
+        """
+        Loads the trackers with each available method, rolling back the
+        changes, and reports the rows per second of each one.
+        """
+        methods = [('ORM', False)]
+        if supports_copy(router.db_for_write(Tracker)):
+            methods.insert(0, ('COPY', True))
+        else:
+            self.stdout.write('COPY is only available on PostgreSQL.')
+
+        for name, use_copy in methods:
+            self.content_types, self.users = {}, {}
+            with transaction.atomic():
+                start = time.perf_counter()
+                loaded = self.load(paths, batch_size, use_copy)
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                '{0}: {1} trackers in {2:.2f} seconds, {3:.0f} rows/s.'.format(
+                    name, loaded, elapsed, loaded / elapsed if elapsed else 0)
+            )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options['paths'], options['batch_size'])
+            return
+
+        with transaction.atomic():
+            loaded = self.load(options['paths'], options['batch_size'])
+
+        self.stdout.write('{0} trackers loaded.'.format(loaded))
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.dimensions import AGENT_FIELDS, normalize_tracker
+from tracking_analyzer.models import Tracker
+
+
+class Command(BaseCommand):
+    help = 'Moves the user agent and referrer strings of the existing ' \
+           'trackers to the dimension tables, or back with --reverse.'
+
+    fields = list(AGENT_FIELDS) + [
+        'referrer', 'agent_dimension', 'referrer_dimension']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reverse',
+            action='store_true',
+            help='Copy the strings back from the dimension tables into the '
+                 'trackers, before unsetting TRACKING_ANALYZER_NORMALIZED_'
+                 'STORAGE.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of trackers processed at once.'
+        )
+
+    @staticmethod
+    def detach_dimensions(tracker):
+        """
+        Detaches a ``Tracker`` read with its strings from the dimension
+        tables, so they are saved in its own columns.
+        """
+        tracker.agent_dimension_id = None
+        tracker.referrer_dimension_id = None
+
+    def handle(self, *args, **options):
+        reverse = options['reverse']
+        chunk_size = options['chunk_size']
+
+        if reverse == settings.TRACKING_ANALYZER_NORMALIZED_STORAGE:
+            raise CommandError(
+                '`TRACKING_ANALYZER_NORMALIZED_STORAGE` setting must be '
+                '{0}.'.format('unset' if reverse else 'set'))
+
+        if reverse:
+            queryset = Tracker.objects.filter(agent_dimension__isnull=False)
+            convert = self.detach_dimensions
+        else:
+            queryset = Tracker.objects.filter(agent_dimension__isnull=True)
+            convert = normalize_tracker
+        queryset = queryset.only('pk', *self.fields)
+
+        last_pk = 0
+        processed = 0
+        while True:
+            trackers = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not trackers:
+                break
+
+            last_pk = trackers[-1].pk
+            for tracker in trackers:
+                convert(tracker)
+            Tracker.objects.bulk_update(trackers, self.fields)
+
+            processed += len(trackers)
+            self.stdout.write('{0} trackers processed.'.format(processed))
+
+        self.stdout.write('Normalization done.')
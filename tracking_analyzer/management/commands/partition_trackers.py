@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.analytics import invalidate_analytics
+from tracking_analyzer.partitions import TrackerPartitions
+
+
+class Command(BaseCommand):
+    help = 'Creates the upcoming partitions of the trackers table on ' \
+           'PostgreSQL, and detaches or drops the expired ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Turn the existing trackers table into a partitioned one '
+                 'first. The table is locked meanwhile.'
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.TRACKING_ANALYZER_PARTITIONS_AHEAD,
+            help='Number of periods after the current one to create '
+                 'partitions for.'
+        )
+        parser.add_argument(
+            '--retention',
+            type=int,
+            default=settings.TRACKING_ANALYZER_PARTITIONS_RETENTION,
+            help='Number of periods before the current one to keep. Older '
+                 'partitions are detached. Keeps everything by default.'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop the expired partitions instead of just detaching them.'
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Database alias. Defaults to the one for writing trackers.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.TRACKING_ANALYZER_PARTITION_INTERVAL:
+            raise CommandError(
+                '`TRACKING_ANALYZER_PARTITION_INTERVAL` setting is not set.')
+
+        partitions = TrackerPartitions(using=options['database'])
+        if partitions.connection.vendor != 'postgresql':
+            raise CommandError('Partitioning is only available on '
+                               'PostgreSQL.')
+
+        if not partitions.is_partitioned():
+            if not options['convert']:
+                raise CommandError(
+                    'The trackers table is not partitioned. Run the command '
+                    'with --convert first.')
+
+            recreated = partitions.convert()
+            self.stdout.write('Trackers table partitioned.')
+            for name in recreated:
+                self.stdout.write('{0}: recreated.'.format(name))
+
+        for name in partitions.create_partitions(options['ahead']):
+            self.stdout.write('{0}: created.'.format(name))
+
+        if options['retention'] is not None:
+            for name in partitions.expire_partitions(
+                    options['retention'], options['drop']):
+                self.stdout.write('{0}: {1}.'.format(
+                    name, 'dropped' if options['drop'] else 'detached'))
+
+            invalidate_analytics()
+
+        self.stdout.write('Partitions updated.')
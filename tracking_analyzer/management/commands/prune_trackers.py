@@ -0,0 +1,156 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from tracking_analyzer.analytics import invalidate_analytics
+from tracking_analyzer.models import Checkpoint, Tracker
+
+
+class Command(BaseCommand):
+    help = 'Deletes the trackers older than their retention period, in ' \
+           'small batches of consecutive ids.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TRACKING_ANALYZER_RETENTION_DAYS,
+            help='Number of days the trackers are kept, but for the content '
+                 'types in TRACKING_ANALYZER_RETENTION_DAYS_BY_CONTENT_TYPE.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of consecutive ids deleted at once.'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Seconds to wait between batches.'
+        )
+
+    @staticmethod
+    def get_retention_rules(days):
+        """
+        Returns the retention rules, one per content type with its own
+        retention and one for the rest.
+
+        :param days: Number of days the rest of the trackers are kept, or
+        ``None`` to keep them.
+        :return: A list of ``(name, days, content_type_ids, exclude)`` tuples.
+        The trackers of a rule are the ones of the given content types, or
+        the ones of any other content type if ``exclude`` is set.
+        """
+        rules = []
+        for label, value in \
+                settings.TRACKING_ANALYZER_RETENTION_DAYS_BY_CONTENT_TYPE \
+                .items():
+            try:
+                content_type = ContentType.objects.get_by_natural_key(
+                    *label.split('.', 1))
+            except (ContentType.DoesNotExist, TypeError):
+                raise CommandError('Unknown content type: {0}'.format(label))
+
+            rules.append((label, value, [content_type.pk], False))
+
+        rules.append(('*', days, [rule[2][0] for rule in rules], True))
+
+        return [rule for rule in rules if rule[1] is not None]
+
+    @staticmethod
+    def get_delete_sql(connection, content_type_ids, exclude):
+        """
+        Returns the ``DELETE`` statement of a batch of a retention rule. Its
+        parameters are the first and the excluded last id of the batch, the
+        retention cutoff and the content type ids of the rule.
+        """
+        table, pk, timestamp, content_type = [
+            connection.ops.quote_name(name) for name in (
+                Tracker._meta.db_table, Tracker._meta.pk.column, 'timestamp',
+                'content_type_id')
+        ]
+        sql = 'DELETE FROM {0} WHERE {1} >= %s AND {1} < %s AND {2} < %s' \
+            .format(table, pk, timestamp)
+        if content_type_ids:
+            sql += ' AND {0} {1}IN ({2})'.format(
+                content_type, 'NOT ' if exclude else '',
+                ', '.join(['%s'] * len(content_type_ids)))
+
+        return sql
+
+    def prune(self, rule, batch_size, sleep):
+        """
+        Deletes the expired trackers of a retention rule with plain
+        ``DELETE`` statements, skipping the Django deletion collector, in
+        batches of ``batch_size`` consecutive ids, each in its own short
+        transaction.
+
+        The position of the current batch is saved in a ``Checkpoint``, so an
+        interrupted run resumes where it stopped.
+
+        :return: The number of ``Tracker`` objects deleted.
+        """
+        name, days, content_type_ids, exclude = rule
+        cutoff = timezone.now() - datetime.timedelta(days=days)
+        using = router.db_for_write(Tracker)
+        connection = connections[using]
+
+        sql = self.get_delete_sql(connection, content_type_ids, exclude)
+        expired = Tracker.objects.filter(timestamp__lt=cutoff)
+        if content_type_ids:
+            expired = expired.exclude(content_type_id__in=content_type_ids) \
+                if exclude else \
+                expired.filter(content_type_id__in=content_type_ids)
+
+        # Ids don't follow the ``timestamp`` (spool loads, buffer flushes and
+        # backfills insert older trackers with newer ids), so the batches
+        # span the whole expired ids range. Each ``DELETE`` still checks the
+        # ``timestamp``.
+        bounds = expired.aggregate(first_pk=Min('pk'), last_pk=Max('pk'))
+        if bounds['last_pk'] is None:
+            return 0
+        last_pk = bounds['last_pk']
+
+        checkpoint = Checkpoint.objects.filter(
+            name='prune_trackers:{0}'.format(name)).first()
+        first_pk = checkpoint.position if checkpoint else bounds['first_pk']
+
+        deleted = 0
+        while first_pk <= last_pk:
+            with transaction.atomic(using=using):
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [
+                        first_pk, first_pk + batch_size,
+                        connection.ops.adapt_datetimefield_value(cutoff)
+                    ] + content_type_ids)
+                    deleted += cursor.rowcount
+
+                first_pk += batch_size
+                Checkpoint.objects.update_or_create(
+                    name='prune_trackers:{0}'.format(name),
+                    defaults={'position': first_pk}
+                )
+
+            self.stdout.write('{0}: {1} trackers deleted.'.format(
+                name, deleted))
+            time.sleep(sleep)
+
+        Checkpoint.objects.filter(
+            name='prune_trackers:{0}'.format(name)).delete()
+
+        return deleted
+
+    def handle(self, *args, **options):
+        for rule in self.get_retention_rules(options['days']):
+            self.prune(rule, options['batch_size'], options['sleep'])
+
+        invalidate_analytics()
+        self.stdout.write('Pruning done.')
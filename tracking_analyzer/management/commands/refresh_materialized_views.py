@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.matviews import MaterializedViews
+
+
+class Command(BaseCommand):
+    help = 'Creates the missing PostgreSQL materialized views of the ' \
+           'trackers analytics, and refreshes them concurrently.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recreate',
+            action='store_true',
+            help='Drop and create the views again, for example after '
+                 'changing USE_TZ.'
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Database alias. Defaults to the one for writing trackers.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.TRACKING_ANALYZER_MATERIALIZED_VIEWS:
+            raise CommandError(
+                '`TRACKING_ANALYZER_MATERIALIZED_VIEWS` setting is not set.')
+
+        views = MaterializedViews(using=options['database'])
+        if views.connection.vendor != 'postgresql':
+            raise CommandError('Materialized views are only available on '
+                               'PostgreSQL.')
+
+        if options['recreate']:
+            views.drop()
+
+        # New views are filled on creation, so only the other ones are
+        # refreshed.
+        created = views.create()
+        for name in created:
+            self.stdout.write('{0}: created.'.format(name))
+
+        views.refresh(exclude=created)
+        self.stdout.write('Materialized views refreshed.')
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.rollups import check_lag, update_rollups
+
+
+class Command(BaseCommand):
+    help = 'Counts the trackers saved since the last run in the rollups ' \
+           'read by the admin analytics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of trackers counted at once.'
+        )
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=settings.TRACKING_ANALYZER_ROLLUPS_LAG,
+            help='Seconds to wait before counting a tracker. Defaults to '
+                 'TRACKING_ANALYZER_ROLLUPS_LAG.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            check_lag(options['lag'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        counted = update_rollups(options['batch_size'], options['lag'])
+
+        self.stdout.write('{0} trackers rolled up.'.format(counted))
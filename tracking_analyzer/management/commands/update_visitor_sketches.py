@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking_analyzer.rollups import check_lag
+from tracking_analyzer.sketches import update_visitor_sketches
+
+
+class Command(BaseCommand):
+    help = 'Adds the visitors of the trackers saved since the last run to ' \
+           'the daily unique visitors sketches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of trackers read at once.'
+        )
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=settings.TRACKING_ANALYZER_ROLLUPS_LAG,
+            help='Seconds to wait before reading a tracker. Defaults to '
+                 'TRACKING_ANALYZER_ROLLUPS_LAG.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            check_lag(options['lag'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        read = update_visitor_sketches(options['batch_size'], options['lag'])
+
+        self.stdout.write('{0} trackers read.'.format(read))
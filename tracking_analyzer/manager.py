@@ -1,13 +1,29 @@
+import asyncio
 import logging
+from itertools import islice
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.http import HttpRequest
+from django.utils import timezone
 
-from geoip2.errors import GeoIP2Error
+from asgiref.sync import sync_to_async
 from ipware.ip import get_client_ip
 
+from .agents import get_device_values
+from .buffer import tracker_buffer
+from .dedup import hit_coalescer
+from .dimensions import TrackerQuerySet
+from .geoip import geolocate
+from .heavy_hitters import heavy_hitters
+from .loader import load_trackers
+from .records import RequestRecord
+from .sampling import get_sample_weight
+from .spool import tracker_spool
+from .workers import get_async_executor, worker_pool
+
 
 logger = logging.getLogger('tracking_analyzer')
 
@@ -17,68 +33,445 @@ class TrackerManager(models.Manager):
     Custom ``Tracker`` model manager that implements a method to create a new
     object instance from an HTTP request.
     """
+    def get_queryset(self):
+        return TrackerQuerySet(self.model, using=self._db)
+
+    @staticmethod
+    def get_geo_values(ip_address):
+        """
+        Geolocates an IP address, unless
+        ``TRACKING_ANALYZER_DEFER_GEOLOCATION`` is set, in which case it is
+        left to the ``geolocate_trackers`` management command.
+
+        :param ip_address: A string with an IP address, or ``None``.
+        :return: A dictionary with the ``Tracker`` IP related fields values.
+        """
+        city = {}
+        if ip_address and \
+                not settings.TRACKING_ANALYZER_DEFER_GEOLOCATION:
+            city = geolocate(ip_address)
+
+        return {
+            'ip_address': ip_address,
+            'ip_country': city.get('country_code', '') or '',
+            'ip_region': city.get('region', '') or '',
+            'ip_city': city.get('city', '') or '',
+        }
+
+    def get_sampled_values(self, user_agent, ip_address, content_type_id):
+        """
+        Classifies the device of a request and decides whether it is left out
+        of the sample. Only requests that are tracked are geolocated.
+
+        :param user_agent: The raw ``User-Agent`` header string.
+        :param ip_address: A string with an IP address, or ``None``.
+        :param content_type_id: The ``ContentType`` id of the tracked object.
+        :return: A dictionary with the ``Tracker`` device, sample weight and
+        IP related fields values, or ``None`` if the request is left out of the
+        sample.
+        """
+        values = get_device_values(user_agent)
+        values['sample_weight'] = get_sample_weight(
+            content_type_id, values['device_type'])
+        if values['sample_weight'] is None:
+            return None
+
+        values.update(self.get_geo_values(ip_address))
+
+        return values
+
+    def get_client_values(self, request, content_type_id):
+        """
+        Gathers the data of a request client that do not involve the database:
+        device, sample weight, IP address, geographical info and referrer.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_type_id: The ``ContentType`` id of the tracked object.
+        :return: A dictionary with the ``Tracker`` fields values, or ``None``
+        if the request is left out of the sample.
+        """
+        # Get the IP address and so the geographical info, if available.
+        ip_address, _ = get_client_ip(request) or ''
+        if not ip_address:
+            logger.debug(
+                'Could not determine IP address for request %s', request)
+
+        values = self.get_sampled_values(
+            request.META.get('HTTP_USER_AGENT', ''), ip_address,
+            content_type_id
+        )
+        if values is not None:
+            values['referrer'] = request.META.get('HTTP_REFERER', '')
+
+        return values
+
+    def get_values_from_record(self, record, content_type_id):
+        """
+        Same as ``get_client_values``, but from a ``RequestRecord``.
+
+        :param record: A ``RequestRecord`` instance.
+        :param content_type_id: The ``ContentType`` id of the tracked object.
+        :return: A dictionary with the ``Tracker`` fields values, or ``None``
+        if the request is left out of the sample.
+        """
+        values = self.get_sampled_values(
+            record.user_agent, record.ip_address, content_type_id)
+        if values is not None:
+            values.update({
+                'timestamp': record.timestamp,
+                'referrer': record.referrer,
+                'user_id': record.user_id,
+            })
+
+        return values
+
+    @staticmethod
+    def get_user_id(request):
+        """
+        Returns the primary key of the user of a request, or ``None`` for
+        anonymous users.
+        """
+        user = request.user
+        user = user if isinstance(user, User) else None
+
+        return user.pk if user else None
+
+    def get_relations_values(self, request, content_object):
+        """
+        Gathers the content type and the user of a request, which might need
+        to query the database.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_object: A Django model instance.
+        :return: A dictionary with the ``Tracker`` relations fields values.
+        """
+        return {
+            'content_type_id': ContentType.objects.get_for_model(
+                content_object).pk,
+            'object_id': content_object.pk,
+            'user_id': self.get_user_id(request),
+        }
+
+    @staticmethod
+    def check_arguments(request, content_object):
+        """
+        Sanity checks for the ``create_from_request`` arguments.
+        """
+        assert isinstance(request, HttpRequest), \
+            '`request` object is not an `HTTPRequest`'
+        assert issubclass(content_object.__class__, models.Model), \
+            '`content_object` is not a Django model'
+
+    def get_record_from_request(self, request, content_object):
+        """
+        Collects the raw data of a request, to be processed later.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_object: A Django model instance. Any object can be
+        related.
+        :return: A tuple with a ``RequestRecord`` instance, the
+        ``ContentType`` id and the primary key of the tracked object.
+        """
+        self.check_arguments(request, content_object)
+
+        relations = self.get_relations_values(request, content_object)
+
+        return (
+            RequestRecord.from_request(request, relations['user_id']),
+            relations['content_type_id'],
+            relations['object_id'],
+        )
+
+    def get_values_from_request(self, request, content_object):
+        """
+        Given an ``HTTPRequest`` object and a generic content, it gathers the
+        data of that request to be stored in a ``Tracker``.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_object: A Django model instance. Any object can be
+        related.
+        :return: A dictionary with the ``Tracker`` fields values, or ``None``
+        if the request is left out of the sample.
+        """
+        self.check_arguments(request, content_object)
+
+        values = {'timestamp': timezone.now()}
+        values.update(self.get_relations_values(request, content_object))
+
+        client_values = self.get_client_values(
+            request, values['content_type_id'])
+        if client_values is None:
+            return None
+        values.update(client_values)
+
+        return values
+
+    def save_values(self, values):
+        """
+        Saves a ``Tracker`` with the given data, or queues it if
+        ``TRACKING_ANALYZER_BUFFER_ENABLED`` is set.
+
+        With a ``TRACKING_ANALYZER_DEDUP_WINDOW``, a hit identical to one
+        saved or queued within the window is just counted in its ``hits``.
+
+        With ``TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED``, the request is
+        counted in the heavy hitters summaries in any case.
+
+        :param values: A dictionary with the ``Tracker`` fields values.
+        :return: The new ``Tracker`` instance, or ``None`` if buffered or
+        counted in a previous one.
+        """
+        heavy_hitters.add(values)
+
+        dedup = settings.TRACKING_ANALYZER_DEDUP_WINDOW > 0
+        if dedup and hit_coalescer.add_hit(values):
+            return None
+
+        if settings.TRACKING_ANALYZER_BUFFER_ENABLED:
+            generation = tracker_buffer.generation
+            if tracker_buffer.append(values) and dedup:
+                hit_coalescer.remember_event(values, generation)
+            return None
+
+        tracker = self.create(**values)
+        if dedup:
+            hit_coalescer.remember_tracker(values, tracker)
+
+        return tracker
+
     def create_from_request(self, request, content_object):
         """
         Given an ``HTTPRequest`` object and a generic content, it creates a
         ``Tracker`` object to store the data of that request.
 
+        If ``TRACKING_ANALYZER_BUFFER_ENABLED`` is set, the data is just queued
+        in memory to be saved later together with other requests data, and no
+        ``Tracker`` instance is returned.
+
+        If the request is left out of the sample (see the
+        ``TRACKING_ANALYZER_SAMPLING_*`` settings), nothing is saved.
+
+        With ``TRACKING_ANALYZER_SPOOL_ENABLED`` set, the request is just
+        appended to the spool instead (see ``spool_from_request``).
+
         :param request: A Django ``HTTPRequest`` object.
         :param content_object: A Django model instance. Any object can be
         related.
-        :return: A newly created ``Tracker`` instance.
+        :return: A newly created ``Tracker`` instance, or ``None`` if buffered,
+        spooled or left out of the sample.
         """
-        # Sanity checks.
-        assert isinstance(request, HttpRequest), \
-            '`request` object is not an `HTTPRequest`'
-        assert issubclass(content_object.__class__, models.Model), \
-            '`content_object` is not a Django model'
+        if settings.TRACKING_ANALYZER_SPOOL_ENABLED:
+            self.spool_from_request(request, content_object)
+            return None
 
-        user = request.user
-        user = user if isinstance(user, User) else None
+        values = self.get_values_from_request(request, content_object)
+        if values is None:
+            return None
 
-        if request.user_agent.is_mobile:
-            device_type = self.model.MOBILE
-        elif request.user_agent.is_tablet:
-            device_type = self.model.TABLET
-        elif request.user_agent.is_pc:
-            device_type = self.model.PC
-        elif request.user_agent.is_bot:
-            device_type = self.model.BOT
-        else:
-            device_type = self.model.UNKNOWN
+        tracker = self.save_values(values)
 
-        city = {}
+        logger.info(
+            'Tracked click in %s %s.',
+            content_object._meta.object_name, content_object.pk
+        )
 
-        # Get the IP address and so the geographical info, if available.
-        ip_address, _ = get_client_ip(request) or ''
-        if not ip_address:
-            logger.debug(
-                'Could not determine IP address for request %s', request)
-        else:
-            geo = GeoIP2()
-            try:
-                city = geo.city(ip_address)
-            except (GeoIP2Error, GeoIP2Exception):
-                logger.exception(
-                    'Unable to determine geolocation for address %s',
-                    ip_address
-                )
-
-        tracker = self.model.objects.create(
-            content_object=content_object,
-            ip_address=ip_address,
-            ip_country=city.get('country_code', '') or '',
-            ip_region=city.get('region', '') or '',
-            ip_city=city.get('city', '') or '',
-            referrer=request.META.get('HTTP_REFERER', ''),
-            device_type=device_type,
-            device=request.user_agent.device.family,
-            browser=request.user_agent.browser.family[:30],
-            browser_version=request.user_agent.browser.version_string,
-            system=request.user_agent.os.family,
-            system_version=request.user_agent.os.version_string,
-            user=user
+        return tracker
+
+    def create_from_record(self, record, content_type_id, object_id):
+        """
+        Creates a ``Tracker`` from a ``RequestRecord`` of the request.
+
+        :param record: A ``RequestRecord`` instance.
+        :param content_type_id: The ``ContentType`` id of the tracked object.
+        :param object_id: The primary key of the tracked object.
+        :return: A newly created ``Tracker`` instance, or ``None`` if buffered
+        or left out of the sample.
+        """
+        values = self.get_values_from_record(record, content_type_id)
+        if values is None:
+            return None
+
+        values['content_type_id'] = content_type_id
+        values['object_id'] = object_id
+
+        return self.save_values(values)
+
+    def enqueue_from_request(self, request, content_object):
+        """
+        Non-blocking version of ``create_from_request``.
+
+        Only the request data that are cheap to get are collected in the
+        current thread. Device classification, geolocation and saving happen
+        later in the background worker threads.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_object: A Django model instance. Any object can be
+        related.
+        :return: ``True`` if the request was queued, ``False`` if it was
+        discarded because the queue is full.
+        """
+        return worker_pool.submit(
+            self.create_from_record,
+            *self.get_record_from_request(request, content_object)
+        )
+
+    def spool_from_request(self, request, content_object):
+        """
+        Durable, non-blocking version of ``create_from_request``.
+
+        The raw request data is appended to a local spool file, which survives
+        crashes and restarts, and the ``load_tracker_spool`` management
+        command saves it into the database later on.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_object: A Django model instance. Any object can be
+        related.
+        """
+        tracker_spool.append(
+            *self.get_record_from_request(request, content_object))
+
+    def bulk_create_from_requests(self, items, batch_size=1000):
+        """
+        Creates the ``Tracker`` objects of many requests at once.
+
+        Each batch of ``batch_size`` requests is saved with a single
+        ``bulk_create``. Within a batch, each user agent is classified and
+        each IP address is geolocated only once. Requests left out of the
+        sample are not saved.
+
+        :param items: An iterable of ``(request, content_object)`` pairs, where
+        ``request`` is either a Django ``HTTPRequest`` object or a
+        ``RequestRecord`` and ``content_object`` is a Django model instance.
+        :param batch_size: Number of requests saved at once.
+        :return: The number of ``Tracker`` objects created.
+        """
+        content_types = {}
+        created = 0
+
+        items = iter(items)
+        while True:
+            batch = []
+            for request, content_object in islice(items, batch_size):
+                if isinstance(request, HttpRequest):
+                    request = RequestRecord.from_request(
+                        request, self.get_user_id(request))
+
+                assert isinstance(request, RequestRecord), \
+                    '`request` object is not an `HTTPRequest` nor a ' \
+                    '`RequestRecord`'
+                assert isinstance(content_object, models.Model), \
+                    '`content_object` is not a Django model'
+
+                model = content_object.__class__
+                if model not in content_types:
+                    content_types[model] = \
+                        ContentType.objects.get_for_model(model).pk
+
+                batch.append(
+                    (request, content_types[model], content_object.pk))
+
+            if not batch:
+                return created
+
+            created += self.create_batch(batch)
+
+    def create_batch(self, batch):
+        """
+        Saves a batch of requests of ``bulk_create_from_requests`` with a
+        single query (see ``tracking_analyzer.loader``), classifying each user
+        agent and geolocating each IP address only once. Requests left out of
+        the sample are skipped.
+
+        :param batch: A list of ``(record, content_type_id, object_id)``
+        tuples.
+        :return: The number of ``Tracker`` objects created.
+        """
+        devices = {
+            user_agent: get_device_values(user_agent)
+            for user_agent in {record.user_agent for record, _, _ in batch}
+        }
+
+        sampled = []
+        for record, content_type_id, object_id in batch:
+            weight = get_sample_weight(
+                content_type_id, devices[record.user_agent]['device_type'])
+            if weight is not None:
+                sampled.append((record, content_type_id, object_id, weight))
+                heavy_hitters.add({
+                    'content_type_id': content_type_id,
+                    'object_id': object_id,
+                    'referrer': record.referrer,
+                    'sample_weight': weight,
+                })
+
+        locations = {
+            ip_address: self.get_geo_values(ip_address)
+            for ip_address in {item[0].ip_address for item in sampled}
+        }
+
+        load_trackers([
+            self.model(
+                content_type_id=content_type_id,
+                object_id=object_id,
+                timestamp=record.timestamp,
+                referrer=record.referrer,
+                user_id=record.user_id,
+                sample_weight=weight,
+                **devices[record.user_agent],
+                **locations[record.ip_address]
+            )
+            for record, content_type_id, object_id, weight in sampled
+        ], batch_size=None, using=self.db)
+
+        logger.info('Tracked %s clicks in bulk.', len(sampled))
+
+        return len(sampled)
+
+    async def acreate_from_request(self, request, content_object):
+        """
+        Asynchronous version of ``create_from_request``, to be awaited from
+        asynchronous views.
+
+        The user agent parsing and the geolocation run in a bounded thread
+        pool of ``TRACKING_ANALYZER_ASYNC_WORKERS`` threads, so they block
+        neither the event loop nor the default executor. The ``Tracker`` is
+        then saved with the asynchronous ORM when available.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param content_object: A Django model instance. Any object can be
+        related.
+        :return: A newly created ``Tracker`` instance, or ``None`` if buffered,
+        spooled or left out of the sample.
+        """
+        if settings.TRACKING_ANALYZER_SPOOL_ENABLED:
+            await sync_to_async(self.spool_from_request)(
+                request, content_object)
+            return None
+
+        self.check_arguments(request, content_object)
+
+        values = {'timestamp': timezone.now()}
+        values.update(
+            await sync_to_async(self.get_relations_values)(
+                request, content_object)
         )
+
+        client_values = await asyncio.get_running_loop().run_in_executor(
+            get_async_executor(), self.get_client_values, request,
+            values['content_type_id']
+        )
+        if client_values is None:
+            return None
+        values.update(client_values)
+
+        if hasattr(self, 'acreate') and \
+                not settings.TRACKING_ANALYZER_BUFFER_ENABLED and \
+                not settings.TRACKING_ANALYZER_DEDUP_WINDOW:
+            heavy_hitters.add(values)
+            tracker = await self.acreate(**values)
+        else:
+            tracker = await sync_to_async(self.save_values)(values)
+
         logger.info(
             'Tracked click in %s %s.',
             content_object._meta.object_name, content_object.pk
@@ -0,0 +1,205 @@
+import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from .rollups import get_bucket_start
+
+
+# The ``Tracker`` field each view counts the daily requests by, besides the
+# tracked object, keyed by the view name suffix.
+VIEW_FIELDS = {
+    'objects': 'object_id',
+    'countries': 'ip_country',
+    'devices': 'device_type',
+}
+CHECKPOINT_NAME = 'materialized_views'
+
+
+class MaterializedViews:
+    """
+    Manages the PostgreSQL materialized views of the daily requests of each
+    tracked object, by country and by device type, named after the
+    ``Tracker`` table like ``tracking_analyzer_tracker_daily_countries``.
+
+    The time of the last refresh is saved in a ``Checkpoint``, as a Unix
+    timestamp.
+    """
+    def __init__(self, using=None):
+        self.model = apps.get_model('tracking_analyzer', 'Tracker')
+        self.connection = connections[
+            using or router.db_for_write(self.model)]
+        self.table = self.model._meta.db_table
+
+    def quote(self, name):
+        """
+        Quotes a table, view or index name.
+        """
+        return self.connection.ops.quote_name(name)
+
+    def execute(self, sql, params=None):
+        """
+        Runs a SQL statement and returns its rows, if any.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else []
+
+    def get_view_name(self, field):
+        """
+        Returns the name of the view counting the requests by a field of
+        ``VIEW_FIELDS``.
+        """
+        suffix = {value: key for key, value in VIEW_FIELDS.items()}[field]
+
+        return '{0}_daily_{1}'.format(self.table, suffix)
+
+    def get_key_columns(self, field):
+        """
+        Returns the columns identifying the rows of the view of a field.
+        """
+        return ['day', 'content_type_id', 'object_id'] + \
+            ([field] if field != 'object_id' else [])
+
+    def get_select_sql(self, field):
+        """
+        Returns the query of the view of a field. Days are in UTC.
+        """
+        day = '("timestamp" AT TIME ZONE \'UTC\')::date' if settings.USE_TZ \
+            else '"timestamp"::date'
+        columns = self.get_key_columns(field)
+
+        return 'SELECT {0} AS "day", {1}, SUM("hits" * "sample_weight") ' \
+            'AS "requests" FROM {2} GROUP BY {3}'.format(
+                day, ', '.join(self.quote(column) for column in columns[1:]),
+                self.quote(self.table),
+                ', '.join(str(index + 1) for index in range(len(columns))))
+
+    def get_existing_views(self):
+        """
+        Returns the names of the materialized views in the current schema.
+        """
+        return {name for (name,) in self.execute(
+            'SELECT matviewname FROM pg_matviews '
+            'WHERE schemaname = current_schema()')}
+
+    def create(self):
+        """
+        Creates and fills the missing views, with the unique index a
+        concurrent refresh requires.
+
+        :return: The names of the new views.
+        """
+        existing = self.get_existing_views()
+
+        created = []
+        for field in VIEW_FIELDS.values():
+            name = self.get_view_name(field)
+            if name in existing:
+                continue
+
+            self.execute('CREATE MATERIALIZED VIEW {0} AS {1}'.format(
+                self.quote(name), self.get_select_sql(field)))
+            self.execute('CREATE UNIQUE INDEX {0} ON {1} ({2})'.format(
+                self.quote('{0}_key'.format(name)), self.quote(name),
+                ', '.join(self.quote(column)
+                          for column in self.get_key_columns(field))))
+            created.append(name)
+
+        return created
+
+    def drop(self):
+        """
+        Drops the views, and forgets the time of their last refresh.
+        """
+        for field in VIEW_FIELDS.values():
+            self.execute('DROP MATERIALIZED VIEW IF EXISTS {0}'.format(
+                self.quote(self.get_view_name(field))))
+
+        apps.get_model('tracking_analyzer', 'Checkpoint').objects.using(
+            self.connection.alias).filter(name=CHECKPOINT_NAME).delete()
+
+    def refresh(self, exclude=(), concurrently=True):
+        """
+        Refreshes the views, but the excluded ones, and saves the time of the
+        refresh. A concurrent refresh doesn't block the queries reading the
+        views meanwhile.
+        """
+        for field in VIEW_FIELDS.values():
+            name = self.get_view_name(field)
+            if name not in exclude:
+                self.execute('REFRESH MATERIALIZED VIEW {0}{1}'.format(
+                    'CONCURRENTLY ' if concurrently else '',
+                    self.quote(name)))
+
+        self.set_refreshed()
+
+    def set_refreshed(self):
+        """
+        Saves the current time as the time of the last refresh.
+        """
+        apps.get_model('tracking_analyzer', 'Checkpoint').objects.using(
+            self.connection.alias).update_or_create(
+                name=CHECKPOINT_NAME,
+                defaults={'position': int(timezone.now().timestamp())})
+
+    def get_refreshed(self):
+        """
+        Returns the aware datetime of the last refresh, or ``None``.
+        """
+        checkpoint = apps.get_model('tracking_analyzer', 'Checkpoint') \
+            .objects.using(self.connection.alias).filter(
+                name=CHECKPOINT_NAME).first()
+        if checkpoint is None:
+            return None
+
+        return datetime.datetime.fromtimestamp(
+            checkpoint.position, datetime.timezone.utc)
+
+    def is_fresh(self, max_age=None):
+        """
+        Whether the views were refreshed in the last ``max_age`` seconds,
+        ``TRACKING_ANALYZER_MATERIALIZED_VIEWS_MAX_AGE`` by default.
+        """
+        if self.connection.vendor != 'postgresql':
+            return False
+
+        if max_age is None:
+            max_age = settings.TRACKING_ANALYZER_MATERIALIZED_VIEWS_MAX_AGE
+        refreshed = self.get_refreshed()
+
+        return refreshed is not None and \
+            datetime.datetime.now(datetime.timezone.utc) - refreshed <= \
+            datetime.timedelta(seconds=max_age)
+
+    def get_dimension_count(self, field, start=None, end=None, **filters):
+        """
+        Returns the requests by value of a field of ``VIEW_FIELDS``, read
+        from its view.
+
+        :param start: Optional datetime of the first request counted. It must
+        be the start of a day.
+        :param end: Optional datetime, excluded, where the count stops. It
+        must be the start of a day.
+        :param filters: Optional ``content_type_id`` and ``object_id`` of the
+        tracked objects.
+        :return: A list of ``(value, requests)`` tuples.
+        """
+        conditions, params = [], []
+        for lookup, value in (('>=', start), ('<', end)):
+            if value is not None:
+                conditions.append('"day" {0} %s'.format(lookup))
+                params.append(get_bucket_start(value, 'day').date())
+        for column, value in sorted(filters.items()):
+            conditions.append('{0} = %s'.format(self.quote(column)))
+            params.append(value)
+
+        return self.execute(
+            'SELECT {0}, SUM("requests") FROM {1}{2} GROUP BY 1 '
+            'ORDER BY 1'.format(
+                self.quote(field), self.quote(self.get_view_name(field)),
+                ' WHERE ' + ' AND '.join(conditions) if conditions else ''),
+            params
+        )
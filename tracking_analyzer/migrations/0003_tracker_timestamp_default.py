@@ -0,0 +1,19 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking_analyzer', '0002_auto_20160719_2212'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tracker',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
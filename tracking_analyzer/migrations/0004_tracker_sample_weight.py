@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking_analyzer', '0003_tracker_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tracker',
+            name='sample_weight',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
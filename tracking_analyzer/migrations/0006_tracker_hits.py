@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking_analyzer', '0005_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tracker',
+            name='hits',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+import tracking_analyzer.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('tracking_analyzer', '0006_tracker_hits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferrerDimension',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AgentDimension',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device', models.CharField(blank=True, max_length=30)),
+                ('browser', models.CharField(blank=True, max_length=30)),
+                ('browser_version', models.CharField(blank=True, max_length=30)),
+                ('system', models.CharField(blank=True, max_length=30)),
+                ('system_version', models.CharField(blank=True, max_length=30)),
+            ],
+            options={
+                'unique_together': {('device', 'browser', 'browser_version', 'system', 'system_version')},
+            },
+        ),
+        tracking_analyzer.operations.AddForeignKeyConcurrently(
+            model_name='tracker',
+            name='agent_dimension',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='tracking_analyzer.AgentDimension'),
+        ),
+        tracking_analyzer.operations.AddForeignKeyConcurrently(
+            model_name='tracker',
+            name='referrer_dimension',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='tracking_analyzer.ReferrerDimension'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['agent_dimension'], name='tracker_agent_dimension_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['referrer_dimension'], name='tracker_referrer_dimension_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+import tracking_analyzer.ips
+import tracking_analyzer.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('tracking_analyzer', '0007_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tracker',
+            name='ip_packed',
+            field=tracking_analyzer.ips.PackedIPAddressField(max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='tracker',
+            name='ip_prefix',
+            field=tracking_analyzer.ips.PackedIPAddressField(max_length=16, null=True),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['ip_packed'], name='tracker_ip_packed_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['ip_prefix'], name='tracker_ip_prefix_idx'),
+        ),
+    ]
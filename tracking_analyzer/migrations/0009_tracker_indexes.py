@@ -0,0 +1,41 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+import tracking_analyzer.operations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('tracking_analyzer', '0008_tracker_ip_packed'),
+    ]
+
+    operations = [
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['timestamp', 'hits', 'sample_weight'], name='tracker_timestamp_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='tracker_object_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['device_type', 'timestamp'], name='tracker_device_type_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['ip_country', 'timestamp'], name='tracker_ip_country_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['ip_city', 'timestamp'], name='tracker_ip_city_idx'),
+        ),
+        tracking_analyzer.operations.AddIndexConcurrently(
+            model_name='tracker',
+            index=models.Index(fields=['ip_address', 'timestamp'], name='tracker_ip_address_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracking_analyzer', '0009_tracker_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackerRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('bucket', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('timestamp', models.DateTimeField()),
+                ('dimension', models.CharField(max_length=30)),
+                ('value', models.CharField(blank=True, max_length=255)),
+                ('requests', models.BigIntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trackerrollup',
+            index=models.Index(fields=['bucket', 'dimension', 'timestamp'], name='tracker_rollup_timestamp_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='trackerrollup',
+            unique_together={('content_type', 'object_id', 'bucket', 'timestamp', 'dimension', 'value')},
+        ),
+    ]
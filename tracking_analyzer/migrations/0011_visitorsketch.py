@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tracking_analyzer', '0010_trackerrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('day', models.DateField()),
+                ('registers', models.BinaryField(default=b'')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='visitorsketch',
+            index=models.Index(fields=['day'], name='visitor_sketch_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='visitorsketch',
+            unique_together={('content_type', 'object_id', 'day')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking_analyzer', '0011_visitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeavyHitterSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(choices=[('objects', 'Objects'), ('referrers', 'Referrers')], max_length=10)),
+                ('start', models.DateTimeField()),
+                ('process', models.CharField(max_length=255)),
+                ('counters', models.TextField()),
+            ],
+            options={
+                'unique_together': {('stream', 'start', 'process')},
+            },
+        ),
+    ]
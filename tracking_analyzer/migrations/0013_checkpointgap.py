@@ -0,0 +1,25 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking_analyzer', '0012_heavyhittersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointGap',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.BigIntegerField()),
+                ('end', models.BigIntegerField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gaps', to='tracking_analyzer.Checkpoint')),
+            ],
+        ),
+    ]
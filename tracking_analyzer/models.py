@@ -2,10 +2,14 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
 
 from django_countries.fields import CountryField
 
+from .dimensions import denormalize_tracker, normalize_tracker
+from .ips import compact_tracker, expand_tracker, PackedIPAddressField
 from .manager import TrackerManager
+from .sketches import VisitorSketchQuerySet
 
 
 class Tracker(models.Model):
@@ -29,8 +33,10 @@ class Tracker(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey('content_type', 'object_id')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
+    ip_packed = PackedIPAddressField(null=True)
+    ip_prefix = PackedIPAddressField(null=True)
     ip_country = CountryField(blank=True)
     ip_region = models.CharField(max_length=255, blank=True)
     ip_city = models.CharField(max_length=255, blank=True)
@@ -51,9 +57,245 @@ class Tracker(models.Model):
         blank=True,
         on_delete=models.CASCADE
     )
+    sample_weight = models.PositiveIntegerField(default=1)
+    hits = models.PositiveIntegerField(default=1)
+    agent_dimension = models.ForeignKey(
+        'AgentDimension',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        on_delete=models.PROTECT
+    )
+    referrer_dimension = models.ForeignKey(
+        'ReferrerDimension',
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        on_delete=models.PROTECT
+    )
 
     objects = TrackerManager()
 
+    class Meta:
+        # The admin changelist is ordered by ``timestamp`` and filtered by
+        # these columns. ``timestamp`` comes last, so the filtered rows are
+        # read in order without sorting them. The ``timestamp`` index
+        # includes the counters, so ``get_requests_count`` over a date range
+        # is answered from the index alone. The packed IP addresses are
+        # indexed for the ``in_network`` range scans. The foreign keys are
+        # indexed here, rather than with ``db_index``, so the migrations
+        # build their indexes concurrently.
+        indexes = [
+            models.Index(
+                fields=['timestamp', 'hits', 'sample_weight'],
+                name='tracker_timestamp_idx'
+            ),
+            models.Index(
+                fields=['content_type', 'object_id', 'timestamp'],
+                name='tracker_object_idx'
+            ),
+            models.Index(
+                fields=['device_type', 'timestamp'],
+                name='tracker_device_type_idx'
+            ),
+            models.Index(
+                fields=['ip_country', 'timestamp'],
+                name='tracker_ip_country_idx'
+            ),
+            models.Index(
+                fields=['ip_city', 'timestamp'],
+                name='tracker_ip_city_idx'
+            ),
+            models.Index(
+                fields=['ip_address', 'timestamp'],
+                name='tracker_ip_address_idx'
+            ),
+            models.Index(
+                fields=['agent_dimension'],
+                name='tracker_agent_dimension_idx'
+            ),
+            models.Index(
+                fields=['referrer_dimension'],
+                name='tracker_referrer_dimension_idx'
+            ),
+            models.Index(fields=['ip_packed'], name='tracker_ip_packed_idx'),
+            models.Index(fields=['ip_prefix'], name='tracker_ip_prefix_idx'),
+        ]
+
     def __str__(self):
         return '{0} :: {1}, {2}'.format(
             self.content_object, self.user, self.timestamp)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        expand_tracker(instance)
+
+        return instance
+
+    def save(self, *args, **kwargs):
+        normalize_tracker(self)
+        compact_tracker(self)
+        super().save(*args, **kwargs)
+        denormalize_tracker(self)
+        expand_tracker(self)
+
+
+class AgentDimension(models.Model):
+    """
+    A distinct user agent classification, stored once and referenced by the
+    trackers if ``TRACKING_ANALYZER_NORMALIZED_STORAGE`` is set.
+    """
+    device = models.CharField(max_length=30, blank=True)
+    browser = models.CharField(max_length=30, blank=True)
+    browser_version = models.CharField(max_length=30, blank=True)
+    system = models.CharField(max_length=30, blank=True)
+    system_version = models.CharField(max_length=30, blank=True)
+
+    class Meta:
+        unique_together = (
+            'device', 'browser', 'browser_version', 'system',
+            'system_version',
+        )
+
+    def __str__(self):
+        return '{0} {1} :: {2} {3}'.format(
+            self.browser, self.browser_version, self.system,
+            self.system_version)
+
+
+class ReferrerDimension(models.Model):
+    """
+    A distinct referrer URL, stored once and referenced by the trackers if
+    ``TRACKING_ANALYZER_NORMALIZED_STORAGE`` is set.
+    """
+    url = models.URLField(unique=True)
+
+    def __str__(self):
+        return str(self.url)
+
+
+class Checkpoint(models.Model):
+    """
+    Progress of a resumable data load, like the position up to which a spool
+    file has been loaded into the database.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '{0} :: {1}'.format(self.name, self.position)
+
+
+class CheckpointGap(models.Model):
+    """
+    A range of ``Tracker`` ids a ``Checkpoint`` went past while they were not
+    visible, because their transaction was not committed yet, or rolled
+    back. They are read again until ``TRACKING_ANALYZER_ROLLUPS_GAP_TIMEOUT``
+    seconds after being found.
+    """
+    checkpoint = models.ForeignKey(
+        Checkpoint, related_name='gaps', on_delete=models.CASCADE)
+    start = models.BigIntegerField()
+    end = models.BigIntegerField()
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '{0} :: {1}-{2}'.format(self.checkpoint, self.start, self.end)
+
+
+class TrackerRollup(models.Model):
+    """
+    The requests of the trackers of an object, in a time bucket, with a value
+    of one of the ``tracking_analyzer.rollups.ROLLUP_FIELDS``. Maintained by
+    the ``update_rollups`` command if ``TRACKING_ANALYZER_ROLLUPS_ENABLED``
+    is set.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    BUCKETS = (
+        (MINUTE, 'Minute'),
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    )
+    KEY_FIELDS = (
+        'content_type_id', 'object_id', 'bucket', 'timestamp', 'dimension',
+        'value',
+    )
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    bucket = models.CharField(max_length=6, choices=BUCKETS)
+    timestamp = models.DateTimeField()
+    dimension = models.CharField(max_length=30)
+    value = models.CharField(max_length=255, blank=True)
+    requests = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            'content_type', 'object_id', 'bucket', 'timestamp', 'dimension',
+            'value',
+        )
+        indexes = [
+            models.Index(
+                fields=['bucket', 'dimension', 'timestamp'],
+                name='tracker_rollup_timestamp_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return '{0} :: {1} {2}, {3}={4}'.format(
+            self.content_object, self.bucket, self.timestamp, self.dimension,
+            self.value)
+
+
+class VisitorSketch(models.Model):
+    """
+    A ``HyperLogLog`` sketch of the visitors of an object in a UTC day,
+    maintained by the ``update_visitor_sketches`` command.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    day = models.DateField()
+    registers = models.BinaryField(default=b'')
+
+    objects = VisitorSketchQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('content_type', 'object_id', 'day')
+        indexes = [
+            models.Index(fields=['day'], name='visitor_sketch_day_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} :: {1}'.format(self.content_object, self.day)
+
+
+class HeavyHitterSummary(models.Model):
+    """
+    The Space-Saving summary of the most frequent objects or referrers of a
+    process in a period, saved by ``tracking_analyzer.heavy_hitters`` if
+    ``TRACKING_ANALYZER_HEAVY_HITTERS_ENABLED`` is set.
+    """
+    OBJECTS = 'objects'
+    REFERRERS = 'referrers'
+    STREAMS = (
+        (OBJECTS, 'Objects'),
+        (REFERRERS, 'Referrers'),
+    )
+
+    stream = models.CharField(max_length=10, choices=STREAMS)
+    start = models.DateTimeField()
+    process = models.CharField(max_length=255)
+    counters = models.TextField()
+
+    class Meta:
+        unique_together = ('stream', 'start', 'process')
+
+    def __str__(self):
+        return '{0} :: {1}, {2}'.format(self.stream, self.start, self.process)
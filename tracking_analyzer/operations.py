@@ -0,0 +1,79 @@
+from django.db.migrations.operations import AddField, AddIndex
+
+
+class AddIndexConcurrently(AddIndex):
+    """
+    Creates an index without blocking the writes to the table on PostgreSQL,
+    with ``CREATE INDEX CONCURRENTLY``, and as usual on other databases.
+
+    PostgreSQL cannot build indexes concurrently inside a transaction, so the
+    migrations using it must be declared with ``atomic = False``.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+            return
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+            return
+
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+    def describe(self):
+        return 'Concurrently create index {0} on field(s) {1} of model ' \
+               '{2}'.format(self.index.name, ', '.join(self.index.fields),
+                            self.model_name)
+
+
+class AddForeignKeyConcurrently(AddField):
+    """
+    Adds a foreign key column without blocking the writes to the table on
+    PostgreSQL, and as usual on other databases.
+
+    The constraint is added ``NOT VALID`` first, which only takes a brief
+    lock, then validated with ``VALIDATE CONSTRAINT``, which scans the table
+    without blocking its writes. Each statement must commit on its own, so
+    the migrations using it must be declared with ``atomic = False``.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql' or \
+                not self.field.db_constraint:
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+            return
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        # The column is added without its constraint, added afterwards.
+        field = model._meta.get_field(self.name)
+        field.db_constraint = False
+        try:
+            schema_editor.add_field(model, field)
+        finally:
+            field.db_constraint = True
+
+        # pylint: disable=protected-access
+        constraint = schema_editor._create_fk_sql(
+            model, field, '_fk_%(to_table)s_%(to_column)s')
+        schema_editor.execute('{0} NOT VALID'.format(constraint))
+        schema_editor.execute('ALTER TABLE {0} VALIDATE CONSTRAINT {1}'.format(
+            constraint.parts['table'], constraint.parts['name']))
+
+    def describe(self):
+        return 'Concurrently add foreign key {0} to {1}'.format(
+            self.name, self.model_name)
@@ -0,0 +1,327 @@
+import datetime
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .matviews import MaterializedViews, VIEW_FIELDS
+
+
+BOUNDS_RE = re.compile(r'FROM \((.+?)\) TO \((.+?)\)')
+
+
+def get_period_start(value, interval):
+    """
+    Returns the start, in UTC, of the ``'month'`` or ``'day'`` period a
+    datetime belongs to.
+    """
+    value = value.astimezone(datetime.timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+
+    return value.replace(day=1) if interval == 'month' else value
+
+
+def get_next_period(start, interval, periods=1):
+    """
+    Returns the start of the period the given number of periods after the one
+    starting at ``start``, or before it if ``periods`` is negative.
+    """
+    if interval == 'day':
+        return start + datetime.timedelta(days=periods)
+
+    month = start.month - 1 + periods
+
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def parse_bound(value):
+    """
+    Parses a range partition bound, as printed by PostgreSQL. ``MINVALUE``
+    and ``MAXVALUE`` are returned as ``None``.
+    """
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+
+    return parse_datetime(value.strip("'"))
+
+
+class TrackerPartitions:
+    """
+    Manages the range partitions by ``timestamp`` of the ``Tracker`` table on
+    PostgreSQL.
+
+    Partitions span a ``TRACKING_ANALYZER_PARTITION_INTERVAL`` each and are
+    named after the table and their start, like
+    ``tracking_analyzer_tracker_p202607``. The rows of an existing table are
+    kept in a ``..._legacy`` partition, and the ones out of every range go to
+    a ``..._default`` partition.
+    """
+    def __init__(self, using=None, interval=None):
+        self.model = apps.get_model('tracking_analyzer', 'Tracker')
+        self.connection = connections[
+            using or router.db_for_write(self.model)]
+        self.table = self.model._meta.db_table
+        self.interval = interval or \
+            settings.TRACKING_ANALYZER_PARTITION_INTERVAL
+
+        assert self.interval in ('month', 'day'), \
+            '`TRACKING_ANALYZER_PARTITION_INTERVAL` setting must be ' \
+            '"month" or "day"'
+
+    def quote(self, name):
+        """
+        Quotes a table or index name.
+        """
+        return self.connection.ops.quote_name(name)
+
+    def execute(self, sql, params=None):
+        """
+        Runs a SQL statement and returns its rows, if any.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else []
+
+    def get_partition_name(self, start):
+        """
+        Returns the name of the partition of the period starting at ``start``.
+        """
+        return '{0}_p{1}'.format(self.table, start.strftime(
+            '%Y%m' if self.interval == 'month' else '%Y%m%d'))
+
+    def is_partitioned(self):
+        """
+        Whether the ``Tracker`` table is partitioned already.
+        """
+        return self.execute(
+            'SELECT relkind FROM pg_class WHERE oid = %s::regclass',
+            [self.table]
+        )[0][0] == 'p'
+
+    def get_partitions(self):
+        """
+        Returns the partitions of the ``Tracker`` table.
+
+        :return: A list of ``(name, start, end)`` tuples, with ``None`` for
+        unbounded ends. The default partition has neither.
+        """
+        partitions = []
+        for name, bounds in self.execute(
+                'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+                'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+                [self.table]):
+            match = BOUNDS_RE.search(bounds)
+            if match:
+                partitions.append((name, parse_bound(match.group(1)),
+                                   parse_bound(match.group(2))))
+            else:
+                partitions.append((name, None, None))
+
+        return partitions
+
+    def get_index_sql(self, schema_editor):
+        """
+        Returns the statements creating the indexes and foreign keys of the
+        ``Tracker`` model.
+        """
+        statements = []
+        for field in self.model._meta.local_concrete_fields:
+            if field.db_index and not field.primary_key:
+                statements.append(
+                    schema_editor._create_index_sql(self.model, [field]))
+            if field.remote_field and field.db_constraint:
+                statements.append(schema_editor._create_fk_sql(
+                    self.model, field, '_fk_%(to_table)s_%(to_column)s'))
+
+        statements.extend(
+            index.create_sql(self.model, schema_editor)
+            for index in self.model._meta.indexes
+        )
+
+        return statements
+
+    def convert(self):
+        """
+        Turns the ``Tracker`` table into a partitioned one. The existing
+        table, with its rows and indexes, is attached as the partition of
+        everything up to the end of the current period, so nothing is copied.
+
+        Attaching a partition checks that all its rows fit in its range. So
+        the table is first checked against a matching ``CHECK`` constraint,
+        validated while the trackers are still being written, and PostgreSQL
+        skips its own scan. The conversion then runs in a single transaction
+        holding an ``ACCESS EXCLUSIVE`` lock on the table, which blocks its
+        reads and writes until committed but no longer depends on its size.
+        Trackers saved meanwhile with a ``timestamp`` after the end of the
+        period, if converting right when it ends, are refused.
+
+        Materialized views keep reading the table they were created on, the
+        legacy partition once renamed. The existing ones are dropped with the
+        time of their last refresh, so they are not read meanwhile, and
+        created again on the partitioned table once it is unlocked.
+
+        :return: The names of the materialized views created again.
+        """
+        legacy = '{0}_legacy'.format(self.table)
+        constraint = self.quote('{0}_bound'.format(legacy))
+        now = timezone.now()
+
+        last = self.execute('SELECT MAX("timestamp") FROM {0}'.format(
+            self.quote(self.table)))[0][0]
+        boundary = get_next_period(
+            get_period_start(max(now, last or now), self.interval),
+            self.interval
+        )
+
+        # Adding the constraint without checking the rows only takes a brief
+        # lock, and validating it afterwards doesn't block the writes.
+        self.execute('ALTER TABLE {0} DROP CONSTRAINT IF EXISTS {1}'.format(
+            self.quote(self.table), constraint))
+        self.execute(
+            'ALTER TABLE {0} ADD CONSTRAINT {1} CHECK ("timestamp" < %s) '
+            'NOT VALID'.format(self.quote(self.table), constraint),
+            [boundary]
+        )
+        self.execute('ALTER TABLE {0} VALIDATE CONSTRAINT {1}'.format(
+            self.quote(self.table), constraint))
+
+        views = MaterializedViews(self.connection.alias)
+        existing = views.get_existing_views() & {
+            views.get_view_name(field) for field in VIEW_FIELDS.values()}
+
+        with transaction.atomic(using=self.connection.alias):
+            if existing:
+                views.drop()
+
+            # Index names are unique in the schema, so the ones of the
+            # existing table are renamed to be created again on the new one.
+            for (index,) in self.execute(
+                    'SELECT indexname FROM pg_indexes '
+                    'WHERE schemaname = current_schema() AND tablename = %s',
+                    [self.table]):
+                self.execute('ALTER INDEX {0} RENAME TO {1}'.format(
+                    self.quote(index), self.quote(index[:55] + '_legacy')))
+
+            sequence = self.execute(
+                'SELECT pg_get_serial_sequence(%s, %s)', [self.table, 'id']
+            )[0][0]
+            self.execute('ALTER TABLE {0} RENAME TO {1}'.format(
+                self.quote(self.table), self.quote(legacy)))
+            self.execute(
+                'CREATE TABLE {0} (LIKE {1} INCLUDING DEFAULTS) '
+                'PARTITION BY RANGE ("timestamp")'.format(
+                    self.quote(self.table), self.quote(legacy)))
+            # The partition key must be part of the primary key.
+            self.execute('ALTER TABLE {0} ADD PRIMARY KEY ("id", '
+                         '"timestamp")'.format(self.quote(self.table)))
+            self.execute('ALTER SEQUENCE {0} OWNED BY {1}."id"'.format(
+                sequence, self.quote(self.table)))
+
+            with self.connection.schema_editor(atomic=False) as editor:
+                for statement in self.get_index_sql(editor):
+                    editor.execute(statement)
+
+            self.execute(
+                'ALTER TABLE {0} ATTACH PARTITION {1} '
+                'FOR VALUES FROM (MINVALUE) TO (%s)'.format(
+                    self.quote(self.table), self.quote(legacy)),
+                [boundary]
+            )
+            # The partition bounds enforce it from now on.
+            self.execute('ALTER TABLE {0} DROP CONSTRAINT {1}'.format(
+                self.quote(legacy), constraint))
+            self.execute(
+                'CREATE TABLE {0} PARTITION OF {1} DEFAULT'.format(
+                    self.quote('{0}_default'.format(self.table)),
+                    self.quote(self.table)))
+
+        if not existing:
+            return []
+
+        created = views.create()
+        views.set_refreshed()
+
+        return created
+
+    def create_partitions(self, ahead):
+        """
+        Creates the partitions of the current period and of the given number
+        of periods after it, skipping the ranges already covered.
+
+        The trackers of a new range already saved in the default partition,
+        which would prevent creating it, are moved into the new partition in
+        the same transaction.
+
+        :return: The names of the new partitions.
+        """
+        partitions = self.get_partitions()
+        ranges = [(start, end) for _, start, end in partitions
+                  if start or end]
+        default = next((name for name, start, end in partitions
+                        if not start and not end), None)
+        start = get_period_start(timezone.now(), self.interval)
+
+        created = []
+        for _ in range(ahead + 1):
+            end = get_next_period(start, self.interval)
+            covered = any(
+                (lower is None or lower < end) and
+                (upper is None or upper > start)
+                for lower, upper in ranges
+            )
+
+            if not covered:
+                name = self.get_partition_name(start)
+                with transaction.atomic(using=self.connection.alias):
+                    self.execute(
+                        'CREATE TABLE {0} (LIKE {1} INCLUDING '
+                        'DEFAULTS)'.format(
+                            self.quote(name), self.quote(self.table)))
+                    if default:
+                        self.execute(
+                            'WITH moved AS (DELETE FROM {0} WHERE '
+                            '"timestamp" >= %s AND "timestamp" < %s '
+                            'RETURNING *) INSERT INTO {1} SELECT * FROM '
+                            'moved'.format(self.quote(default),
+                                           self.quote(name)),
+                            [start, end]
+                        )
+                    self.execute(
+                        'ALTER TABLE {0} ATTACH PARTITION {1} '
+                        'FOR VALUES FROM (%s) TO (%s)'.format(
+                            self.quote(self.table), self.quote(name)),
+                        [start, end]
+                    )
+                created.append(name)
+
+            start = end
+
+        return created
+
+    def expire_partitions(self, retention, drop=False):
+        """
+        Detaches the partitions whose whole range is older than the given
+        number of periods before the current one, and drops them if asked to.
+
+        :return: The names of the expired partitions.
+        """
+        cutoff = get_next_period(
+            get_period_start(timezone.now(), self.interval),
+            self.interval,
+            -retention
+        )
+
+        expired = []
+        for name, _, end in self.get_partitions():
+            if end is not None and end <= cutoff:
+                self.execute('ALTER TABLE {0} DETACH PARTITION {1}'.format(
+                    self.quote(self.table), self.quote(name)))
+                if drop:
+                    self.execute('DROP TABLE {0}'.format(self.quote(name)))
+                expired.append(name)
+
+        return expired
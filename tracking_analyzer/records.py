@@ -0,0 +1,34 @@
+from collections import namedtuple
+
+from django.utils import timezone
+
+from ipware.ip import get_client_ip
+
+
+class RequestRecord(namedtuple(
+        'RequestRecord',
+        ['ip_address', 'user_agent', 'referrer', 'user_id', 'timestamp'])):
+    """
+    The raw data of a request needed to create a ``Tracker``, which can be
+    collected cheaply and processed later, away from the request.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_request(cls, request, user_id=None):
+        """
+        Collects the raw data of a request.
+
+        :param request: A Django ``HTTPRequest`` object.
+        :param user_id: The primary key of the request user, if any.
+        :return: A ``RequestRecord`` instance.
+        """
+        ip_address, _ = get_client_ip(request) or ''
+
+        return cls(
+            ip_address=ip_address,
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            referrer=request.META.get('HTTP_REFERER', ''),
+            user_id=user_id,
+            timestamp=timezone.now(),
+        )
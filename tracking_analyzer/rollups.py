@@ -0,0 +1,404 @@
+import datetime
+from collections import Counter
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+
+# Bucket sizes, from the coarsest.
+ROLLUP_BUCKETS = ('day', 'hour', 'minute')
+# ``Tracker`` fields whose values are counted in the rollups.
+ROLLUP_FIELDS = ('ip_country', 'device_type', 'browser')
+CHECKPOINT_NAME = 'rollups'
+
+
+def get_bucket_start(value, bucket):
+    """
+    Returns the start of the ``'minute'``, ``'hour'`` or ``'day'`` bucket a
+    datetime belongs to, in UTC if it is aware.
+    """
+    if timezone.is_aware(value):
+        value = value.astimezone(datetime.timezone.utc)
+
+    value = value.replace(second=0, microsecond=0)
+    if bucket in ('hour', 'day'):
+        value = value.replace(minute=0)
+    if bucket == 'day':
+        value = value.replace(hour=0)
+
+    return value
+
+
+def get_bucket(start=None, end=None):
+    """
+    Returns the coarsest bucket whose boundaries match the given time range
+    ends, or ``None`` if they are not even whole minutes.
+    """
+    for bucket in ROLLUP_BUCKETS:
+        if all(value is None or get_bucket_start(value, bucket) == value
+               for value in (start, end)):
+            return bucket
+
+    return None
+
+
+def get_rollup_counts(rows):
+    """
+    Counts the requests of trackers in every bucket and rollup field.
+
+    :param rows: An iterable of ``(content_type_id, object_id, timestamp,
+    requests, ip_country, device_type, browser)`` tuples.
+    :return: A ``Counter`` of requests keyed by ``(content_type_id,
+    object_id, bucket, timestamp, dimension, value)``, the dimension being
+    the field name.
+    """
+    counts = Counter()
+    for content_type_id, object_id, timestamp, requests, *values in rows:
+        for bucket in ROLLUP_BUCKETS:
+            start = get_bucket_start(timestamp, bucket)
+            for field, value in zip(ROLLUP_FIELDS, values):
+                counts[(content_type_id, object_id, bucket, start, field,
+                        value or '')] += requests
+
+    return counts
+
+
+def upsert_rollups(counts, using, batch_size=100):
+    """
+    Adds the counted requests to the ``TrackerRollup`` rows, creating the
+    missing ones. On PostgreSQL, SQLite and MySQL each batch is a single
+    ``INSERT`` statement that adds to the existing rows on conflict.
+    """
+    model = apps.get_model('tracking_analyzer', 'TrackerRollup')
+    connection = connections[using]
+    if connection.vendor not in ('postgresql', 'sqlite', 'mysql'):
+        for key, requests in counts.items():
+            values = dict(zip(model.KEY_FIELDS, key))
+            if not model.objects.using(using).filter(**values).update(
+                    requests=F('requests') + requests):
+                model.objects.using(using).create(
+                    requests=requests, **values)
+        return
+
+    columns = [
+        model._meta.get_field(name).column
+        for name in model.KEY_FIELDS + ('requests',)
+    ]
+    table, requests_column = [
+        connection.ops.quote_name(name)
+        for name in (model._meta.db_table, 'requests')
+    ]
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE {0} = {0} + VALUES({0})'.format(
+            requests_column)
+    else:
+        conflict = 'ON CONFLICT ({0}) DO UPDATE SET {1} = {2}.{1} + ' \
+            'EXCLUDED.{1}'.format(
+                ', '.join(connection.ops.quote_name(column)
+                          for column in columns[:-1]),
+                requests_column, table)
+
+    items = iter(counts.items())
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                return
+
+            params = []
+            for key, requests in batch:
+                params.extend(key[:3])
+                params.append(connection.ops.adapt_datetimefield_value(key[3]))
+                params.extend(key[4:] + (requests,))
+
+            cursor.execute(
+                'INSERT INTO {0} ({1}) VALUES {2} {3}'.format(
+                    table,
+                    ', '.join(connection.ops.quote_name(column)
+                              for column in columns),
+                    ', '.join(['({0})'.format(
+                        ', '.join(['%s'] * len(columns)))] * len(batch)),
+                    conflict
+                ),
+                params
+            )
+
+
+def get_high_water_mark(using=None):
+    """
+    Returns the id of the last ``Tracker`` counted in the rollups.
+    """
+    model = apps.get_model('tracking_analyzer', 'Checkpoint')
+    checkpoint = model.objects.using(using).filter(
+        name=CHECKPOINT_NAME).first()
+
+    return checkpoint.position if checkpoint else 0
+
+
+def get_unread_filter(name, using=None):
+    """
+    Returns the ``Q`` object of the trackers not read yet past a checkpoint:
+    the ones after its position, and the ones of its gaps.
+    """
+    model = apps.get_model('tracking_analyzer', 'Checkpoint')
+    checkpoint = model.objects.using(using).filter(name=name).first()
+    if checkpoint is None:
+        return Q(pk__gt=0)
+
+    return reduce(or_, [
+        Q(pk__range=(start, end))
+        for start, end in checkpoint.gaps.values_list('start', 'end')
+    ], Q(pk__gt=checkpoint.position))
+
+
+def split_gap(start, end, pks):
+    """
+    Returns the ranges left of the ``(start, end)`` ids range, both ends
+    included, once the given sorted ids are taken out of it.
+    """
+    ranges = []
+    for pk in pks:
+        if pk > start:
+            ranges.append((start, pk - 1))
+        start = pk + 1
+    if start <= end:
+        ranges.append((start, end))
+
+    return ranges
+
+
+def check_lag(lag):
+    """
+    Checks a tracker is not read before the last hit it may get: with a
+    ``TRACKING_ANALYZER_DEDUP_WINDOW``, the lag must be longer.
+    """
+    window = settings.TRACKING_ANALYZER_DEDUP_WINDOW
+    if window and lag <= window:
+        raise ValueError(
+            'The lag, {0} seconds, must be longer than the '
+            'TRACKING_ANALYZER_DEDUP_WINDOW, {1} seconds.'.format(lag, window))
+
+
+def read_gap(gap, queryset, save, batch_size, cutoff):
+    """
+    Reads the trackers of a ``CheckpointGap`` committed since it was found,
+    for ``read_trackers``, and replaces it by the ranges still not read.
+
+    :return: The number of ``Tracker`` objects read.
+    """
+    using = queryset.db
+    checkpoint_model = apps.get_model('tracking_analyzer', 'Checkpoint')
+    gap_model = type(gap)
+    position, ranges, read = gap.start, [], 0
+
+    while position <= gap.end:
+        rows = list(queryset.filter(
+            pk__gte=position, pk__lte=gap.end,
+            timestamp__lt=cutoff).order_by('pk')[:batch_size])
+        if not rows:
+            break
+
+        pks = [row[0] for row in rows]
+        with transaction.atomic(using=using):
+            # Overlapping runs read the same trackers: only the one finding
+            # the gap as it left it, under the checkpoint lock, saves them.
+            list(checkpoint_model.objects.using(using).select_for_update()
+                 .filter(pk=gap.checkpoint_id))
+            gaps = gap_model.objects.using(using).filter(
+                checkpoint_id=gap.checkpoint_id, start__gte=gap.start,
+                end__lte=gap.end)
+            if sorted(gaps.values_list('start', 'end')) != \
+                    ranges + split_gap(position, gap.end, []):
+                break
+
+            ranges.extend(split_gap(position, pks[-1], pks))
+            position = pks[-1] + 1
+            save(rows)
+            gaps.delete()
+            gap_model.objects.using(using).bulk_create([
+                gap_model(checkpoint_id=gap.checkpoint_id, start=start,
+                          end=end, created=gap.created)
+                for start, end in ranges + split_gap(position, gap.end, [])
+            ])
+        read += len(rows)
+
+        if len(rows) < batch_size:
+            break
+
+    return read
+
+
+def read_trackers(name, queryset, save, batch_size=10000, lag=None):
+    """
+    Reads the trackers saved since the last run, and passes them to
+    ``save`` in batches of ``batch_size``, within the transaction saving
+    the progress in a ``Checkpoint``.
+
+    Trackers are read by increasing id from the checkpoint position, the
+    last id read. Reading stops at the first tracker more recent than
+    ``lag`` seconds, which may still get hits. The ids passed by while not
+    visible yet, their transaction not committed, are kept in
+    ``CheckpointGap`` ranges and read again by the next runs, until they
+    are ``TRACKING_ANALYZER_ROLLUPS_GAP_TIMEOUT`` seconds old. So trackers
+    of long transactions, like ``load_trackers`` backfills, are read too.
+
+    Each batch is saved with the checkpoint locked, and only if the
+    checkpoint is still as this run last left it, so overlapping runs never
+    save the same trackers twice.
+
+    :param name: The name of the ``Checkpoint``.
+    :param queryset: A ``Tracker`` values list queryset, of the ``pk`` and
+    ``timestamp`` first.
+    :param save: A function of a list of ``queryset`` rows.
+    :param batch_size: Number of trackers read at once.
+    :param lag: Seconds to wait before reading a tracker. Defaults to
+    ``TRACKING_ANALYZER_ROLLUPS_LAG``.
+    :return: The number of ``Tracker`` objects read.
+    """
+    using = queryset.db
+    checkpoint_model = apps.get_model('tracking_analyzer', 'Checkpoint')
+    gap_model = apps.get_model('tracking_analyzer', 'CheckpointGap')
+    if lag is None:
+        lag = settings.TRACKING_ANALYZER_ROLLUPS_LAG
+    check_lag(lag)
+    now = timezone.now()
+    cutoff = now - datetime.timedelta(seconds=lag)
+
+    checkpoint, _ = checkpoint_model.objects.using(using).get_or_create(
+        name=name)
+    locked = checkpoint_model.objects.using(using).select_for_update() \
+        .filter(pk=checkpoint.pk)
+    read = 0
+
+    # Trackers committed after their ids were passed.
+    for gap in list(checkpoint.gaps.order_by('start')):
+        read += read_gap(gap, queryset, save, batch_size, cutoff)
+
+    checkpoint.gaps.filter(created__lt=now - datetime.timedelta(
+        seconds=settings.TRACKING_ANALYZER_ROLLUPS_GAP_TIMEOUT)).delete()
+
+    # Trackers saved after the checkpoint position.
+    while True:
+        rows, gaps, position = [], [], checkpoint.position
+        for row in queryset.filter(pk__gt=checkpoint.position).order_by(
+                'pk')[:batch_size]:
+            if row[1] >= cutoff:
+                break
+            if row[0] > position + 1:
+                gaps.append(gap_model(checkpoint=checkpoint,
+                                      start=position + 1, end=row[0] - 1,
+                                      created=now))
+            rows.append(row)
+            position = row[0]
+
+        if not rows:
+            return read
+
+        with transaction.atomic(using=using):
+            # The position may have been moved by an overlapping run, which
+            # read these trackers already. Read again from there.
+            current = locked.values_list('position', flat=True).get()
+            if current != checkpoint.position:
+                checkpoint.position = current
+                continue
+
+            save(rows)
+            gap_model.objects.using(using).bulk_create(gaps)
+            checkpoint.position = position
+            checkpoint.save(update_fields=['position'])
+        read += len(rows)
+
+        if len(rows) < batch_size:
+            return read
+
+
+def update_rollups(batch_size=10000, lag=None, using=None):
+    """
+    Counts the trackers saved since the last run in the rollups, read with
+    ``read_trackers``. Late arriving trackers, loaded with an old
+    ``timestamp``, are added to their old buckets.
+
+    :param batch_size: Number of trackers counted at once.
+    :param lag: Seconds to wait before counting a tracker. Defaults to
+    ``TRACKING_ANALYZER_ROLLUPS_LAG``.
+    :param using: The database alias. Defaults to the one for writing
+    ``Tracker`` objects.
+    :return: The number of ``Tracker`` objects counted.
+    """
+    model = apps.get_model('tracking_analyzer', 'Tracker')
+    using = using or router.db_for_write(model)
+
+    def save(rows):
+        upsert_rollups(get_rollup_counts(
+            (content_type_id, object_id, timestamp) + tuple(values)
+            for _, timestamp, content_type_id, object_id, *values in rows
+        ), using)
+
+    return read_trackers(
+        CHECKPOINT_NAME,
+        model.objects.using(using).annotate(
+            requests=F('hits') * F('sample_weight')).values_list(
+                'pk', 'timestamp', 'content_type_id', 'object_id',
+                'requests', *ROLLUP_FIELDS),
+        save, batch_size, lag)
+
+
+def get_rollup_requests(field, start=None, end=None, bucket=None,
+                        **filters):
+    """
+    Returns the requests of the trackers by value of a rollup field, and by
+    bucket if one is given, read from the rollups and from the trackers not
+    counted in them yet.
+
+    :param field: One of ``ROLLUP_FIELDS``.
+    :param start: Optional datetime of the first request counted. It must
+    be the start of a bucket.
+    :param end: Optional datetime, excluded, where the count stops. It must
+    be the start of a bucket.
+    :param bucket: Optional bucket to count the requests by.
+    :param filters: Optional ``content_type_id`` and ``object_id`` of the
+    tracked objects.
+    :return: A ``Counter`` of requests keyed by value, or by ``(timestamp,
+    value)`` if a bucket is given.
+    """
+    rollups = apps.get_model('tracking_analyzer', 'TrackerRollup').objects \
+        .filter(bucket=bucket or get_bucket(start, end), dimension=field,
+                **filters)
+    trackers = apps.get_model('tracking_analyzer', 'Tracker').objects \
+        .filter(get_unread_filter(CHECKPOINT_NAME), **filters)
+    if start is not None:
+        rollups = rollups.filter(timestamp__gte=start)
+        trackers = trackers.filter(timestamp__gte=start)
+    if end is not None:
+        rollups = rollups.filter(timestamp__lt=end)
+        trackers = trackers.filter(timestamp__lt=end)
+
+    if not bucket:
+        counts = Counter({
+            item['value']: item['total']
+            for item in rollups.values('value').annotate(
+                total=Sum('requests')).order_by()
+        })
+        for item in trackers.values(field).annotate(
+                total=Sum(F('hits') * F('sample_weight'))).order_by():
+            counts[item[field] or ''] += item['total']
+
+        return counts
+
+    counts = Counter({
+        (item['timestamp'], item['value']): item['total']
+        for item in rollups.values('timestamp', 'value').annotate(
+            total=Sum('requests')).order_by()
+    })
+    for timestamp, value, hits, sample_weight in trackers.values_list(
+            'timestamp', field, 'hits', 'sample_weight'):
+        counts[(get_bucket_start(timestamp, bucket), value or '')] += \
+            hits * sample_weight
+
+    return counts
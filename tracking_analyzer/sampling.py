@@ -0,0 +1,56 @@
+import random
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+
+def get_sampling_rate(content_type_id, device_type):
+    """
+    Returns the fraction of requests to be tracked for the given content type
+    and device type.
+
+    A rate set in ``TRACKING_ANALYZER_SAMPLING_RATES_BY_DEVICE_TYPE`` takes
+    precedence over one set in
+    ``TRACKING_ANALYZER_SAMPLING_RATES_BY_CONTENT_TYPE``, which takes
+    precedence over ``TRACKING_ANALYZER_SAMPLING_RATE``.
+
+    :param content_type_id: The ``ContentType`` id of the tracked object.
+    :param device_type: One of the ``Tracker`` device types.
+    :return: A number between ``0`` and ``1``.
+    """
+    rate = settings.TRACKING_ANALYZER_SAMPLING_RATE
+
+    content_type_rates = \
+        settings.TRACKING_ANALYZER_SAMPLING_RATES_BY_CONTENT_TYPE
+    if content_type_rates:
+        content_type = ContentType.objects.get_for_id(content_type_id)
+        rate = content_type_rates.get(
+            '{0}.{1}'.format(content_type.app_label, content_type.model), rate)
+
+    return settings.TRACKING_ANALYZER_SAMPLING_RATES_BY_DEVICE_TYPE.get(
+        device_type, rate)
+
+
+def get_sample_weight(content_type_id, device_type):
+    """
+    Decides whether a request is tracked or left out of the sample.
+
+    The weight of a tracked request is the inverse of its sampling rate,
+    rounded to an integer, and requests are kept with a probability of exactly
+    one in ``weight``. This way, adding up the weights of the tracked requests
+    gives an unbiased estimate of the total number of requests.
+
+    :param content_type_id: The ``ContentType`` id of the tracked object.
+    :param device_type: One of the ``Tracker`` device types.
+    :return: The sample weight of the request, or ``None`` if it must not be
+    tracked.
+    """
+    rate = get_sampling_rate(content_type_id, device_type)
+    if rate >= 1:
+        return 1
+    if rate <= 0:
+        return None
+
+    weight = round(1 / rate)
+
+    return weight if random.random() * weight < 1 else None
@@ -0,0 +1,220 @@
+import hashlib
+import math
+import zlib
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, router
+
+from .rollups import get_bucket_start, read_trackers
+
+
+CHECKPOINT_NAME = 'visitor_sketches'
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog sketch, estimating the number of distinct values added to
+    it in ``2 ** precision`` bytes, with a relative standard ``error`` of
+    ``1.04 / sqrt(2 ** precision)``.
+
+    Adding a value twice doesn't change the sketch, and merged sketches
+    estimate the distinct values added to any of them.
+    """
+    def __init__(self, precision=None, registers=None):
+        self.precision = precision or \
+            settings.TRACKING_ANALYZER_SKETCH_PRECISION
+        assert 4 <= self.precision <= 16, \
+            '`precision` must be between 4 and 16'
+
+        self.registers = bytearray(registers or 1 << self.precision)
+        assert len(self.registers) == 1 << self.precision, \
+            '`registers` size does not match the precision'
+
+    @property
+    def error(self):
+        """
+        Relative standard error of the estimates.
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value):
+        """
+        Adds a string value to the sketch.
+        """
+        hashed = int.from_bytes(hashlib.blake2b(
+            value.encode('utf-8'), digest_size=8).digest(), 'big')
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """
+        Adds the values of another sketch of the same precision.
+        """
+        assert other.precision == self.precision, \
+            'Sketches of different precision can not be merged'
+
+        self.registers = bytearray(
+            max(pair) for pair in zip(self.registers, other.registers))
+
+    def fold(self, precision):
+        """
+        Returns the sketch of the same values with a lower precision, to be
+        merged with sketches of that precision.
+        """
+        assert 4 <= precision <= self.precision, \
+            '`precision` must be between 4 and the sketch precision'
+
+        bits = self.precision - precision
+        folded = HyperLogLog(precision)
+        for index, rank in enumerate(self.registers):
+            if rank:
+                # The dropped index bits come first in the folded hash.
+                dropped = index & ((1 << bits) - 1)
+                rank = bits - dropped.bit_length() + 1 if dropped \
+                    else rank + bits
+                folded.registers[index >> bits] = max(
+                    folded.registers[index >> bits], rank)
+
+        return folded
+
+    def count(self):
+        """
+        Returns the estimated number of distinct values added.
+        """
+        size = len(self.registers)
+        # The bias correction of the HyperLogLog paper, whose formula only
+        # holds from 128 registers.
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(
+            size, 0.7213 / (1 + 1.079 / size))
+        estimate = alpha * size ** 2 / sum(
+            2.0 ** -register for register in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """
+        Returns the compressed registers, to be stored.
+        """
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Returns the sketch of some stored registers.
+        """
+        registers = zlib.decompress(bytes(data))
+
+        return cls(len(registers).bit_length() - 1, registers)
+
+    @classmethod
+    def union(cls, sketches):
+        """
+        Returns the merged sketch of some sketches, folded to the lowest of
+        their precisions. An empty sketch if there are none.
+        """
+        merged = None
+        for sketch in sketches:
+            if merged is None:
+                merged = cls(sketch.precision, sketch.registers)
+                continue
+            if sketch.precision < merged.precision:
+                merged = merged.fold(sketch.precision)
+            elif sketch.precision > merged.precision:
+                sketch = sketch.fold(merged.precision)
+            merged.merge(sketch)
+
+        return merged if merged is not None else cls()
+
+
+class VisitorSketchQuerySet(models.QuerySet):
+    def merge(self):
+        """
+        Returns a ``HyperLogLog`` sketch of the visitors of all the sketches
+        of the queryset, with the lowest precision of the stored ones.
+        """
+        return HyperLogLog.union(
+            HyperLogLog.from_bytes(registers)
+            for registers in self.values_list(
+                'registers', flat=True).iterator())
+
+
+def get_visitor_key(user_id, ip_address):
+    """
+    Returns the string identifying the visitor of a tracker: its user if
+    authenticated, or its IP address. ``None`` if unknown.
+    """
+    if user_id is not None:
+        return 'user:{0}'.format(user_id)
+    if ip_address:
+        return 'ip:{0}'.format(ip_address)
+
+    return None
+
+
+def save_visitor_sketches(sketches, using):
+    """
+    Merges sketches into the stored ``VisitorSketch`` rows, creating the
+    missing ones.
+
+    :param sketches: A dictionary of ``HyperLogLog`` sketches keyed by
+    ``(content_type_id, object_id, day)``.
+    :param using: The database alias.
+    """
+    model = apps.get_model('tracking_analyzer', 'VisitorSketch')
+    for (content_type_id, object_id, day), sketch in sketches.items():
+        stored, _ = model.objects.using(using).select_for_update() \
+            .get_or_create(content_type_id=content_type_id,
+                           object_id=object_id, day=day)
+        if stored.registers:
+            # Stored with another precision before a settings change.
+            sketch = HyperLogLog.union(
+                [sketch, HyperLogLog.from_bytes(stored.registers)])
+        stored.registers = sketch.to_bytes()
+        stored.save(update_fields=['registers'])
+
+
+def update_visitor_sketches(batch_size=10000, lag=None, using=None):
+    """
+    Adds the visitors of the trackers saved since the last run to the
+    sketches of their object and UTC day, read with
+    ``tracking_analyzer.rollups.read_trackers``. Adding a visitor twice to a
+    sketch doesn't change it, so counting a tracker again is harmless.
+
+    :param batch_size: Number of trackers read at once.
+    :param lag: Seconds to wait before reading a tracker. Defaults to
+    ``TRACKING_ANALYZER_ROLLUPS_LAG``.
+    :param using: The database alias. Defaults to the one for writing
+    ``Tracker`` objects.
+    :return: The number of ``Tracker`` objects read.
+    """
+    model = apps.get_model('tracking_analyzer', 'Tracker')
+    using = using or router.db_for_write(model)
+
+    def save(rows):
+        sketches = {}
+        for _, timestamp, content_type_id, object_id, *visitor in rows:
+            key = get_visitor_key(*visitor)
+            if key is not None:
+                sketches.setdefault(
+                    (content_type_id, object_id,
+                     get_bucket_start(timestamp, 'day').date()),
+                    HyperLogLog()
+                ).add(key)
+
+        save_visitor_sketches(sketches, using)
+
+    return read_trackers(
+        CHECKPOINT_NAME,
+        model.objects.using(using).values_list(
+            'pk', 'timestamp', 'content_type_id', 'object_id', 'user_id',
+            'ip_address'),
+        save, batch_size, lag)
@@ -0,0 +1,194 @@
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from .records import RequestRecord
+
+
+class TrackerSpool:
+    """
+    Local, append-only spool of tracked requests.
+
+    Each process appends the raw data of the tracked requests, one JSON list
+    per line, to its own file in ``TRACKING_ANALYZER_SPOOL_DIR``. A new file is
+    started every ``TRACKING_ANALYZER_SPOOL_ROTATE_INTERVAL`` seconds. Files
+    are named after the start of their time bucket, the host and the process
+    id, so writers never share a file.
+
+    The ``load_tracker_spool`` management command loads the spooled requests
+    into the database and removes the files that are done with.
+    """
+    suffix = '.spool'
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        """
+        Sets up a spool with no open file, owned by the current process.
+        """
+        self._pid = os.getpid()
+        self._file = None
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_directory():
+        """
+        Returns the spool directory, from the current settings.
+        """
+        directory = settings.TRACKING_ANALYZER_SPOOL_DIR
+        assert directory, '`TRACKING_ANALYZER_SPOOL_DIR` setting is not set'
+
+        return directory
+
+    @staticmethod
+    def get_bucket(timestamp):
+        """
+        Returns the start of the time bucket of the given Unix timestamp.
+        """
+        interval = settings.TRACKING_ANALYZER_SPOOL_ROTATE_INTERVAL
+
+        return int(timestamp) // interval * interval
+
+    def get_path(self, bucket):
+        """
+        Returns the path of the file of the current process for the given
+        time bucket.
+        """
+        return os.path.join(
+            self.get_directory(),
+            '{0}-{1}-{2}{3}'.format(
+                bucket, socket.gethostname(), os.getpid(), self.suffix)
+        )
+
+    @staticmethod
+    def encode(record, content_type_id, object_id):
+        """
+        Serializes a tracked request into a spool line.
+        """
+        return json.dumps(
+            [record.ip_address, record.user_agent, record.referrer,
+             record.user_id, record.timestamp.isoformat(), content_type_id,
+             object_id],
+            separators=(',', ':')
+        ) + '\n'
+
+    @staticmethod
+    def decode(line):
+        """
+        Deserializes a spool line.
+
+        :return: A tuple with a ``RequestRecord`` instance, the
+        ``ContentType`` id and the primary key of the tracked object.
+        """
+        values = json.loads(line)
+        values[4] = parse_datetime(values[4])
+
+        return RequestRecord(*values[:5]), values[5], values[6]
+
+    def append(self, record, content_type_id, object_id):
+        """
+        Appends a tracked request to the spool file of the current process
+        and time bucket.
+
+        :param record: A ``RequestRecord`` instance.
+        :param content_type_id: The ``ContentType`` id of the tracked object.
+        :param object_id: The primary key of the tracked object.
+        """
+        if self._pid != os.getpid():
+            # Forked processes write to their own files.
+            self._reset()
+
+        line = self.encode(record, content_type_id, object_id)
+        bucket = self.get_bucket(time.time())
+
+        with self._lock:
+            if bucket != self._bucket:
+                if self._file is not None:
+                    self._file.close()
+
+                os.makedirs(self.get_directory(), exist_ok=True)
+                self._file = open(
+                    self.get_path(bucket), 'a', encoding='utf-8')
+                self._bucket = bucket
+
+            # A single write of a whole line, so readers never see a line
+            # from two different requests.
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """
+        Closes the current spool file, if any.
+        """
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._file = None
+            self._bucket = None
+
+    def get_files(self):
+        """
+        Lists the spool files, oldest first.
+
+        A file is finished when its time bucket ended more than one rotation
+        interval ago: no process writes to it anymore, so it can be removed
+        once loaded.
+
+        :return: A list of ``(path, finished)`` tuples.
+        """
+        directory = self.get_directory()
+        if not os.path.isdir(directory):
+            return []
+
+        current = self.get_bucket(time.time())
+        interval = settings.TRACKING_ANALYZER_SPOOL_ROTATE_INTERVAL
+
+        files = []
+        for name in os.listdir(directory):
+            if not name.endswith(self.suffix):
+                continue
+
+            bucket = int(name.split('-', 1)[0])
+            files.append((
+                bucket, os.path.join(directory, name),
+                bucket + interval < current
+            ))
+
+        return [(path, finished) for _, path, finished in sorted(files)]
+
+    def read(self, path, position, size):
+        """
+        Reads up to ``size`` tracked requests from a spool file. A trailing
+        line still being written is left for later.
+
+        :param path: The spool file path.
+        :param position: The offset in bytes where to start reading.
+        :param size: Maximum number of requests to read.
+        :return: A tuple with the list of decoded requests, as returned by
+        ``decode``, and the offset right after the last one.
+        """
+        rows = []
+        with open(path, 'rb') as spool:
+            spool.seek(position)
+            while len(rows) < size:
+                line = spool.readline()
+                if not line.endswith(b'\n'):
+                    break
+
+                rows.append(self.decode(line))
+                position += len(line)
+
+        return rows, position
+
+
+tracker_spool = TrackerSpool()
+
+atexit.register(tracker_spool.close)
@@ -1,19 +1,164 @@
-from django.db.models import Count
+from django.apps import apps
+from django.conf import settings
+from django.db import router
+from django.db.models import F, Sum
 from django.db.models.functions import TruncDate, Extract
+from django.utils import timezone
 
+from .matviews import MaterializedViews, VIEW_FIELDS
+from .rollups import get_bucket, get_rollup_requests
 
-def get_requests_count(queryset):
+
+def weighted_count():
+    """
+    Aggregation expression to count the requests of ``Tracker``s, taking into
+    account the hits coalesced in each one and its sample weight, so the
+    result estimates the real number of requests. To be used instead of
+    ``Count('pk')``.
+    """
+    return Sum(F('hits') * F('sample_weight'))
+
+
+def use_rollups(start=None, end=None):
+    """
+    Whether the requests in the given time range can be read from the
+    rollups: they are enabled and the range ends are bucket boundaries.
+    """
+    return settings.TRACKING_ANALYZER_ROLLUPS_ENABLED and \
+        get_bucket(start, end) is not None
+
+
+def use_materialized_views(field, start=None, end=None):
+    """
+    Whether the requests by a field in the given time range can be read from
+    the materialized views: they are enabled and fresh, one of them counts
+    the field and the range ends are day boundaries.
+    """
+    if not settings.TRACKING_ANALYZER_MATERIALIZED_VIEWS or \
+            field not in VIEW_FIELDS.values() or \
+            get_bucket(start, end) != 'day':
+        return False
+
+    return MaterializedViews(
+        router.db_for_read(apps.get_model('tracking_analyzer', 'Tracker'))
+    ).is_fresh()
+
+
+def get_requests_count(queryset, start=None, end=None):
     """
     This function returns a list of dictionaries containing each one the
     requests count per minute of a certain ``Tracker``s queryset.
 
+    The time range is filtered as ``start <= timestamp < end``, a predicate
+    the ``timestamp`` indexes can use, unlike ``__date`` or ``__range``
+    lookups.
+
+    With ``TRACKING_ANALYZER_ROLLUPS_ENABLED``, the requests of all the
+    trackers, from an unfiltered queryset, are read from the rollups.
+
     :param queryset: A Django QuerySet of ``Tracker``s.
+    :param start: Optional datetime of the first request counted.
+    :param end: Optional datetime, excluded, where the count stops.
     :return: List of dictionaries with the requests count per minute.
     """
+    if use_rollups(start, end) and not queryset.all().query.where:
+        totals = {}
+        for (timestamp, _), requests in get_rollup_requests(
+                'device_type', start, end, bucket='minute').items():
+            totals[timestamp] = totals.get(timestamp, 0) + requests
+
+        return [
+            {
+                'date': timestamp.date(),
+                'hour': timestamp.hour,
+                'minute': timestamp.minute,
+                'requests': requests
+            }
+            for timestamp, requests in sorted(
+                (timezone.localtime(timestamp) if timezone.is_aware(timestamp)
+                 else timestamp, requests)
+                for timestamp, requests in totals.items())
+        ]
+
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+
     return queryset.annotate(
         date=TruncDate('timestamp'),
         hour=Extract('timestamp', 'hour'),
         minute=Extract('timestamp', 'minute')
     ).values(
         'date', 'hour', 'minute'
-    ).annotate(requests=Count('pk'))
+    ).annotate(requests=weighted_count())
+
+
+def get_dimension_count(field, start=None, end=None, **filters):
+    """
+    This function returns a list of dictionaries containing each one the
+    requests count of a value of a ``Tracker`` field, like
+    ``'ip_country'``, ``'device_type'`` or ``'browser'``.
+
+    With ``TRACKING_ANALYZER_ROLLUPS_ENABLED``, the counts are read from the
+    rollups when ``start`` and ``end`` are bucket boundaries. Otherwise, with
+    ``TRACKING_ANALYZER_MATERIALIZED_VIEWS``, they are read from the
+    materialized views when these are fresh and ``start`` and ``end`` are day
+    boundaries.
+
+    :param field: The name of the ``Tracker`` field.
+    :param start: Optional datetime of the first request counted.
+    :param end: Optional datetime, excluded, where the count stops.
+    :param filters: Optional ``content_type_id`` and ``object_id`` of the
+    tracked objects.
+    :return: List of dictionaries with the field value and its requests
+    count.
+    """
+    if use_rollups(start, end):
+        return [
+            {field: value, 'requests': requests}
+            for value, requests in get_rollup_requests(
+                field, start, end, **filters).items()
+        ]
+
+    model = apps.get_model('tracking_analyzer', 'Tracker')
+    if use_materialized_views(field, start, end):
+        return [
+            {field: value, 'requests': requests}
+            for value, requests in MaterializedViews(
+                router.db_for_read(model)).get_dimension_count(
+                    field, start, end, **filters)
+        ]
+
+    queryset = model.objects.filter(**filters)
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+
+    return list(queryset.values(field).annotate(
+        requests=weighted_count()).order_by())
+
+
+def get_unique_visitors(start=None, end=None, **filters):
+    """
+    This function returns the estimated number of unique visitors, users or
+    else IP addresses, of the tracked objects, merging the daily
+    ``VisitorSketch`` of each object. Estimates have a relative standard
+    error of ``1.04 / sqrt(2 ** TRACKING_ANALYZER_SKETCH_PRECISION)``, 1.6%
+    by default.
+
+    :param start: Optional date of the first day counted.
+    :param end: Optional date, excluded, where the count stops.
+    :param filters: Optional ``content_type_id`` and ``object_id`` of the
+    tracked objects, or any other ``VisitorSketch`` lookup.
+    :return: The estimated number of unique visitors.
+    """
+    queryset = apps.get_model('tracking_analyzer', 'VisitorSketch').objects \
+        .filter(**filters)
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lt=end)
+
+    return queryset.merge().count()
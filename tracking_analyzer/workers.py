@@ -0,0 +1,197 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+logger = logging.getLogger('tracking_analyzer')
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_async_executor():
+    """
+    Returns the thread pool where ``acreate_from_request`` runs its blocking
+    work. It is created on first use, with
+    ``TRACKING_ANALYZER_ASYNC_WORKERS`` threads.
+    """
+    global _executor  # pylint: disable=global-statement
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TRACKING_ANALYZER_ASYNC_WORKERS,
+                    thread_name_prefix='tracking-analyzer-async'
+                )
+
+    return _executor
+
+
+class TrackerWorkerPool:
+    """
+    Bounded pool of background threads where tracked requests are processed
+    and saved, away from the request thread.
+
+    ``TRACKING_ANALYZER_WORKERS`` threads consume a queue of up to
+    ``TRACKING_ANALYZER_WORKERS_QUEUE_SIZE`` tasks. When the queue is full,
+    ``TRACKING_ANALYZER_WORKERS_OVERFLOW`` decides what to do:
+
+    - ``'drop'``: The task is discarded.
+    - ``'block'``: The caller waits until there is room in the queue.
+    - ``'run'``: The task runs right away in the caller thread.
+
+    Queued tasks are drained when the process exits.
+    """
+    OVERFLOW_POLICIES = ('drop', 'block', 'run')
+    #: Seconds between the checks of the stop event by idle workers.
+    POLL_INTERVAL = 1
+
+    def __init__(self):
+        self.dropped = 0
+        self._reset()
+
+    def _reset(self):
+        """
+        Sets up a brand new pool, owned by the current process. Threads are
+        started on first use.
+        """
+        self._pid = os.getpid()
+        self._queue = None
+        self._stop = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """
+        Starts the worker threads, if not running yet.
+        """
+        if self._pid != os.getpid():
+            # Forked processes don't inherit the parent threads.
+            self._reset()
+
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    tasks = queue.Queue(
+                        settings.TRACKING_ANALYZER_WORKERS_QUEUE_SIZE)
+                    stop = threading.Event()
+                    for number in range(settings.TRACKING_ANALYZER_WORKERS):
+                        thread = threading.Thread(
+                            target=self._run,
+                            args=(tasks, stop),
+                            name='tracking-analyzer-worker-{0}'.format(number),
+                            daemon=True
+                        )
+                        thread.start()
+                        self._threads.append(thread)
+                    self._stop = stop
+                    self._queue = tasks
+
+        return self._queue
+
+    def _run(self, tasks, stop):
+        """
+        Worker threads loop, until a ``None`` task is received, or the queue
+        is empty once ``stop`` is set. Database connections are taken care
+        of around each task, as Django does around each request.
+        """
+        while True:
+            try:
+                task = tasks.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                if stop.is_set():
+                    break
+                continue
+
+            try:
+                if task is None:
+                    break
+                close_old_connections()
+                self._execute(*task)
+                close_old_connections()
+            finally:
+                tasks.task_done()
+
+    @staticmethod
+    def _execute(function, args):
+        """
+        Runs a task, logging any error.
+        """
+        try:
+            function(*args)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Unable to track request in background.')
+
+    def submit(self, function, *args):
+        """
+        Queues a function to be run by the workers.
+
+        :return: ``False`` if the task was discarded, ``True`` otherwise.
+        """
+        policy = settings.TRACKING_ANALYZER_WORKERS_OVERFLOW
+        assert policy in self.OVERFLOW_POLICIES, \
+            'Invalid `TRACKING_ANALYZER_WORKERS_OVERFLOW` setting'
+
+        tasks = self._start()
+        try:
+            tasks.put((function, args), block=policy == 'block')
+        except queue.Full:
+            if policy == 'run':
+                self._execute(function, args)
+                return True
+
+            self.dropped += 1
+            logger.warning('Tracking queue is full, request discarded.')
+            return False
+
+        return True
+
+    def join(self):
+        """
+        Waits until all the queued tasks are done.
+        """
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def shutdown(self, timeout=None):
+        """
+        Stops the workers once they are done with the queued tasks.
+
+        :param timeout: Maximum seconds to wait for each worker. Defaults to
+        ``TRACKING_ANALYZER_WORKERS_SHUTDOWN_TIMEOUT``.
+        """
+        if self._queue is None or self._pid != os.getpid():
+            return
+
+        if timeout is None:
+            timeout = settings.TRACKING_ANALYZER_WORKERS_SHUTDOWN_TIMEOUT
+
+        with self._lock:
+            tasks, stop, threads = self._queue, self._stop, self._threads
+            self._queue, self._stop, self._threads = None, None, []
+
+        for _ in threads:
+            try:
+                tasks.put_nowait(None)
+            except queue.Full:
+                # Waiting for room in the queue could hang the exit: the
+                # workers stop by themselves once it is empty instead.
+                stop.set()
+                break
+        for thread in threads:
+            thread.join(timeout)
+
+
+worker_pool = TrackerWorkerPool()
+
+# Registered after the buffer flush, so it runs before it: tasks drained at
+# exit might still be buffered.
+atexit.register(worker_pool.shutdown)